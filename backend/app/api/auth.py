@@ -7,7 +7,7 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import timedelta
 from loguru import logger
 
-from app.models.user import UserLogin, Token, ChangePassword, User, TokenData
+from app.models.user import UserLogin, Token, ChangePassword, User, TokenData, UserRole
 from app.services.auth_service import (
     auth_service,
     ACCESS_TOKEN_EXPIRE_MINUTES,
@@ -47,6 +47,17 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     return user
 
 
+async def require_admin(current_user: User = Depends(get_current_user)) -> User:
+    """要求管理员权限（依赖注入）"""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="需要管理员权限",
+        )
+    
+    return current_user
+
+
 @router.post("/login", response_model=dict)
 async def login(user_login: UserLogin):
     """
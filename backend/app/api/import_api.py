@@ -2,7 +2,7 @@
 批量导入 API
 支持多种导入方式、实时进度追踪
 """
-from fastapi import APIRouter, HTTPException, UploadFile, File, BackgroundTasks
+from fastapi import APIRouter, HTTPException, UploadFile, File, BackgroundTasks, Request
 from pydantic import BaseModel, Field
 from typing import List, Optional
 from loguru import logger
@@ -11,6 +11,9 @@ from app.services.import_manager import import_manager, ImportStatus
 
 router = APIRouter()
 
+# 读取上传文件的块大小
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
 
 class CreateImportTaskRequest(BaseModel):
     """创建导入任务请求"""
@@ -52,8 +55,9 @@ async def create_import_task(
             frequency=request.frequency
         )
         
-        # 后台执行
-        background_tasks.add_task(import_manager.execute_task, task.task_id)
+        # 后台执行（采集进程独立运行时交给采集进程执行）
+        if not import_manager.hand_off(task.task_id):
+            background_tasks.add_task(import_manager.execute_task, task.task_id)
         
         return {
             "success": True,
@@ -93,8 +97,9 @@ async def import_from_text(
             frequency=request.frequency
         )
         
-        # 后台执行
-        background_tasks.add_task(import_manager.execute_task, task.task_id)
+        # 后台执行（采集进程独立运行时交给采集进程执行）
+        if not import_manager.hand_off(task.task_id):
+            background_tasks.add_task(import_manager.execute_task, task.task_id)
         
         return {
             "success": True,
@@ -113,54 +118,76 @@ async def import_from_text(
 async def import_from_file(
     file: UploadFile = File(...),
     batch_size: int = 50,
-    frequency: str = "normal",
-    background_tasks: BackgroundTasks = None
+    frequency: str = "normal"
 ):
     """
     从文件导入
     
     - 支持 CSV、TXT 文件
-    - 自动解析地址
+    - 分块解析地址，边解析边导入
     """
     try:
         # 检查文件类型
         if not file.filename.endswith(('.csv', '.txt')):
             raise HTTPException(status_code=400, detail="只支持 CSV 和 TXT 文件")
         
-        # 读取文件内容
-        content = await file.read()
+        async def chunks():
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
         
-        # 解析地址
-        if file.filename.endswith('.csv'):
-            addresses = import_manager.parse_addresses_from_csv(content)
-        else:
-            # TXT 文件
-            text = content.decode('utf-8')
-            addresses = import_manager.parse_addresses_from_text(text)
+        task, found = await import_manager.import_stream(chunks(), batch_size=batch_size, frequency=frequency)
         
-        if not addresses:
+        if task is None:
             raise HTTPException(status_code=400, detail="文件中未找到有效的钱包地址")
         
-        # 创建任务
-        task = import_manager.create_task(
-            addresses=addresses,
-            batch_size=batch_size,
-            frequency=frequency
-        )
+        return {
+            "success": True,
+            "message": f"已从文件中识别 {found} 个地址，导入任务已创建",
+            "data": task.get_progress()
+        }
         
-        # 后台执行
-        background_tasks.add_task(import_manager.execute_task, task.task_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"从文件导入失败: {e}")
+        raise HTTPException(status_code=500, detail=f"导入失败: {str(e)}")
+
+
+@router.post("/from-stream")
+async def import_from_stream(
+    request: Request,
+    batch_size: int = 50,
+    frequency: str = "normal"
+):
+    """
+    从上传流导入（大文件）
+    
+    - 请求体直接是文件内容（CSV、TXT 或其他工具导出的文本），不使用 multipart
+    - 边接收边解析，收到第一批地址即开始处理，内存占用与文件大小无关
+    - 例: curl -T wallets.csv "http://host/api/import/from-stream?batch_size=50"
+    """
+    try:
+        if not 10 <= batch_size <= 100:
+            raise HTTPException(status_code=400, detail="batch_size 取值范围 10-100")
+        
+        task, found = await import_manager.import_stream(request.stream(), batch_size=batch_size, frequency=frequency)
+        
+        if task is None:
+            raise HTTPException(status_code=400, detail="上传内容中未找到有效的钱包地址")
         
         return {
             "success": True,
-            "message": f"已从文件中识别 {len(addresses)} 个地址，导入任务已创建",
+            "message": f"已识别 {found} 个地址，导入任务已创建",
             "data": task.get_progress()
         }
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"从文件导入失败: {e}")
+        logger.error(f"从上传流导入失败: {e}")
         raise HTTPException(status_code=500, detail=f"导入失败: {str(e)}")
 
 
@@ -2,12 +2,19 @@
 系统监控 API
 提供系统资源、性能指标、健康检查等接口
 """
-from fastapi import APIRouter, Depends
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
 from loguru import logger
 
-from app.services.monitoring import system_monitor, metrics_collector
-from app.api.auth import get_current_user
+from app.services.monitoring import system_monitor, metrics_collector, sampling_profiler
+from app.api.auth import get_current_user, require_admin
 from app.models.user import User
+from app.utils.tracing import tracer
+from app.services.http_pool import http_pool
+from app.services.ws_ingest import ws_ingest
+from app.services.hyperliquid import hl_limiter
+from app.services.refresh_pipeline import refresh_pipeline
 
 router = APIRouter()
 
@@ -234,6 +241,143 @@ async def get_api_metrics(current_user: User = Depends(get_current_user)):
         }
 
 
+@router.get("/http")
+async def get_http_pool_stats(current_user: User = Depends(get_current_user)):
+    """获取共享 HTTP 连接池状态"""
+    return {
+        "success": True,
+        "data": http_pool.get_stats()
+    }
+
+
+@router.get("/collector")
+async def get_collector_concurrency(current_user: User = Depends(get_current_user)):
+    """获取采集自适应并发和熔断器状态"""
+    return {
+        "success": True,
+        "data": hl_limiter.get_stats()
+    }
+
+
+@router.get("/pipeline")
+async def get_refresh_pipeline_stats(current_user: User = Depends(get_current_user)):
+    """获取钱包刷新流水线各阶段的队列长度和利用率"""
+    return {
+        "success": True,
+        "data": refresh_pipeline.get_stats()
+    }
+
+
+@router.get("/ws-ingest")
+async def get_ws_ingest_stats(current_user: User = Depends(get_current_user)):
+    """获取 HyperLiquid 推送采集状态"""
+    return {
+        "success": True,
+        "data": ws_ingest.get_stats()
+    }
+
+
+@router.post("/profile")
+async def run_profiler(
+    seconds: float = Query(10, gt=0, le=120, description="采样时长（秒）"),
+    interval_ms: int = Query(10, ge=1, le=1000, description="采样间隔（毫秒）"),
+    stall_ms: int = Query(100, ge=10, le=10000, description="事件循环阻塞阈值（毫秒）"),
+    top: int = Query(30, ge=1, le=200, description="自耗时排行数量"),
+    format: str = Query("json", regex="^(json|collapsed)$", description="输出格式"),
+    current_user: User = Depends(require_admin)
+):
+    """
+    按需采样分析（需要管理员权限）
+    
+    对所有线程和事件循环做 N 秒统计采样，返回折叠栈（可直接生成火焰图）、
+    自耗时排行和事件循环慢回调报告。采样在独立线程中进行，不影响调度器运行。
+    """
+    if sampling_profiler.running:
+        raise HTTPException(status_code=409, detail="已有采样任务在运行")
+    
+    try:
+        report = await sampling_profiler.profile(
+            duration=seconds,
+            interval=interval_ms / 1000,
+            stall_threshold=stall_ms / 1000,
+            top_n=top
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    if format == "collapsed":
+        return PlainTextResponse(report["collapsed"])
+    
+    return {
+        "success": True,
+        "data": report
+    }
+
+
+@router.get("/profile/last")
+async def get_last_profile(current_user: User = Depends(require_admin)):
+    """获取最近一次采样报告（需要管理员权限）"""
+    if not sampling_profiler.last_report:
+        raise HTTPException(status_code=404, detail="暂无采样报告")
+    
+    return {
+        "success": True,
+        "data": sampling_profiler.last_report
+    }
+
+
+@router.get("/traces")
+async def get_traces(
+    limit: int = Query(50, ge=1, le=500, description="返回数量"),
+    min_ms: float = Query(0, ge=0, description="最小耗时（毫秒）"),
+    name: Optional[str] = Query(None, description="trace 名称，如 wallet_refresh"),
+    address: Optional[str] = Query(None, description="钱包地址"),
+    current_user: User = Depends(get_current_user)
+):
+    """获取最近的钱包刷新追踪（含各阶段耗时）"""
+    return {
+        "success": True,
+        "data": tracer.get_recent(limit=limit, min_duration_ms=min_ms, name=name, address=address)
+    }
+
+
+@router.get("/traces/slowest")
+async def get_slowest_traces(
+    limit: int = Query(20, ge=1, le=100, description="返回数量"),
+    current_user: User = Depends(get_current_user)
+):
+    """获取耗时最长的追踪"""
+    return {
+        "success": True,
+        "data": tracer.get_slowest(limit=limit)
+    }
+
+
+@router.get("/traces/stages")
+async def get_trace_stages(
+    name: Optional[str] = Query(None, description="trace 名称"),
+    current_user: User = Depends(get_current_user)
+):
+    """按阶段汇总最近追踪的耗时分布（按总耗时降序，定位热点阶段）"""
+    return {
+        "success": True,
+        "data": tracer.get_stage_summary(name=name)
+    }
+
+
+@router.get("/traces/{trace_id}")
+async def get_trace_detail(trace_id: str, current_user: User = Depends(get_current_user)):
+    """获取单条追踪的全部片段"""
+    trace = tracer.get_trace(trace_id)
+    if not trace:
+        raise HTTPException(status_code=404, detail="追踪不存在或已过期")
+    
+    return {
+        "success": True,
+        "data": trace
+    }
+
+
 # 导出
 __all__ = ["router"]
 
@@ -8,8 +8,10 @@ from typing import List, Optional, Dict, Any
 from loguru import logger
 
 from app.services.scheduler import scheduler
+from app.services.address_index import address_index
 from app.services.wallet_analyzer import WalletAnalyzer
 from app.database import db
+from app.services.monitoring.db_stats import db_stats
 
 router = APIRouter()
 
@@ -33,6 +35,12 @@ class UpdateWalletRequest(BaseModel):
     force: bool = Field(False, description="是否强制更新")
 
 
+class RefreshIntervalRequest(BaseModel):
+    """设置刷新间隔请求"""
+    address: str = Field(..., description="钱包地址")
+    interval_seconds: Optional[int] = Field(None, ge=30, description="刷新间隔（秒），为空时恢复按更新频率")
+
+
 class WalletQueryRequest(BaseModel):
     """钱包查询请求"""
     page: int = Field(1, ge=1, description="页码")
@@ -119,20 +127,17 @@ async def batch_add_wallets(
         if len(request.addresses) > 100:
             raise HTTPException(status_code=400, detail="一次最多添加 100 个钱包")
         
-        # 验证地址格式
-        invalid_addresses = [
-            addr for addr in request.addresses 
-            if not addr.startswith("0x") or len(addr) != 42
-        ]
+        # 规范化并批量去重（一次性判断哪些钱包已存在）
+        dedupe = address_index.dedupe(request.addresses)
         
-        if invalid_addresses:
+        if dedupe.invalid:
             raise HTTPException(
                 status_code=400,
-                detail=f"以下地址格式无效: {', '.join(invalid_addresses[:5])}"
+                detail=f"以下地址格式无效: {', '.join(dedupe.invalid[:5])}"
             )
         
-        # 后台任务：批量添加
-        for address in request.addresses:
+        # 后台任务：批量添加（已存在的钱包不再提交）
+        for address in dedupe.new:
             background_tasks.add_task(
                 scheduler.add_wallet,
                 address,
@@ -141,10 +146,11 @@ async def batch_add_wallets(
         
         return {
             "success": True,
-            "message": f"已提交 {len(request.addresses)} 个钱包，正在后台处理...",
+            "message": f"已提交 {len(dedupe.new)} 个钱包，正在后台处理...",
             "data": {
-                "count": len(request.addresses),
-                "frequency": request.frequency
+                "count": len(dedupe.new),
+                "frequency": request.frequency,
+                **dedupe.to_dict()
             }
         }
         
@@ -358,9 +364,8 @@ async def get_stats_summary():
     - 今日更新数
     """
     try:
-        # 总钱包数
-        total = db.fetch_one("SELECT COUNT(*) as count FROM wallets")
-        total_count = total["count"] if total else 0
+        # 总钱包数（计数器，O(1)）
+        total_count = db_stats.get_row_count("wallets")
         
         # 等级分布
         grade_stats = db.fetch_all("""
@@ -423,3 +428,27 @@ async def get_scheduler_status():
         logger.error(f"获取调度器状态失败: {e}")
         raise HTTPException(status_code=500, detail=f"获取状态失败: {str(e)}")
 
+
+@router.post("/scheduler/interval")
+async def set_refresh_interval(request: RefreshIntervalRequest):
+    """
+    设置单个钱包的刷新间隔
+    
+    - 覆盖 update_frequency 对应的默认间隔
+    - interval_seconds 为空时恢复默认
+    """
+    try:
+        scheduler.set_wallet_interval(request.address, request.interval_seconds)
+        return {
+            "success": True,
+            "message": "刷新间隔已更新",
+            "data": {
+                "address": request.address,
+                "interval_seconds": request.interval_seconds
+            }
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"设置刷新间隔失败: {e}")
+        raise HTTPException(status_code=500, detail=f"设置刷新间隔失败: {str(e)}")
@@ -77,11 +77,11 @@ async def websocket_endpoint(
     
     except WebSocketDisconnect:
         logger.info(f"客户端主动断开连接: {client_id}")
-        ws_manager.disconnect(client_id)
+        ws_manager.disconnect(client_id, websocket)
     
     except Exception as e:
         logger.error(f"WebSocket 错误 ({client_id}): {e}")
-        ws_manager.disconnect(client_id)
+        ws_manager.disconnect(client_id, websocket)
 
 
 @router.get("/ws/stats")
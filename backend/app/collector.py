@@ -0,0 +1,75 @@
+"""
+独立采集进程
+运行数据采集调度器、推送采集和 AI 调度器，不提供 HTTP 接口。
+
+配合 system.collector.run_in_api = false 使用：API 进程（可多 worker）只处理请求，
+后台任务全部在本进程运行。需要多个采集进程时开启 collector.sharding，各进程按分片租约分担钱包。
+
+用法:
+    python -m app.collector
+    python -m app.collector --worker-id collector-1 --no-ai
+"""
+import asyncio
+import argparse
+import signal
+from loguru import logger
+
+from app.config import DATA_DIR
+from app.utils.logger import setup_logger
+from app.database import db
+from app.services.scheduler import scheduler
+from app.services.background import start_background_services, stop_background_services
+from app.services.http_pool import http_pool
+
+
+async def run_collector(args: argparse.Namespace):
+    """启动后台任务并运行到收到退出信号"""
+    logger.info("🚀 采集进程启动中...")
+    logger.info(f"📁 数据目录: {DATA_DIR}")
+    
+    db.create_tables()
+    if args.worker_id:
+        scheduler.shards.worker_id = args.worker_id
+    
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            # Windows 不支持 add_signal_handler，依靠 KeyboardInterrupt 退出
+            pass
+    
+    await start_background_services(data=not args.no_data, ingest=not args.no_ingest, ai=not args.no_ai)
+    logger.info("✅ 采集进程启动完成")
+    
+    try:
+        await stop_event.wait()
+    finally:
+        logger.info("👋 采集进程正在关闭...")
+        await stop_background_services()
+        try:
+            await http_pool.close()
+        except Exception as e:
+            logger.error(f"关闭 HTTP 连接池失败: {e}")
+        db.close()
+        logger.info("✅ 采集进程已关闭")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HyperLiquid 钱包分析系统 - 独立采集进程")
+    parser.add_argument("--worker-id", default=None, help="采集进程标识（分片租约使用，默认 主机名:进程号）")
+    parser.add_argument("--no-data", action="store_true", help="不启动数据采集调度器")
+    parser.add_argument("--no-ingest", action="store_true", help="不启动推送采集")
+    parser.add_argument("--no-ai", action="store_true", help="不启动 AI 调度器")
+    args = parser.parse_args()
+    
+    setup_logger()
+    try:
+        asyncio.run(run_collector(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -68,7 +68,108 @@ class Config:
                 },
                 "cache": {
                     "api_cache_ttl": 300,
-                    "calculation_cache_ttl": 3600
+                    "calculation_cache_ttl": 3600,
+                    "api_cache_max_entries": 2000,
+                    "api_ttl_by_type": {
+                        "clearinghouseState": 5,
+                        "frontendOpenOrders": 5,
+                        "portfolio": 30,
+                        "userFills": 10,
+                        "userFillsByTime": 30,
+                        "userNonFundingLedgerUpdates": 60
+                    }
+                },
+                "http": {
+                    "max_connections": 100,
+                    "max_keepalive_connections": 20,
+                    "keepalive_expiry": 60,
+                    "connect_timeout": 10,
+                    "http2": True,
+                    "dns_ttl": 300
+                },
+                "scheduler": {
+                    "mode": "due",  # due: 按到期时间持续派发; interval: 三个固定间隔任务
+                    "update_intervals": {
+                        "active": 300,
+                        "normal": 1800,
+                        "inactive": 3600
+                    },
+                    "batch_size": 10,
+                    "max_concurrent": 5,
+                    "resync_interval": 60,
+                    "retry_delay": 60,
+                    "db_stats_interval": 3600,
+                    "activity": {
+                        "enabled": True,
+                        "alpha": 0.3,
+                        "fills_per_poll": 1.0,
+                        "burst_window": 1,
+                        "min_interval": 60,
+                        "max_interval": 21600,
+                        "frequency_update_interval": 3600
+                    },
+                    "probe": {
+                        "enabled": True,
+                        "max_skip_seconds": 21600
+                    }
+                },
+                "collector": {
+                    "run_in_api": True,  # 关闭时 API 进程不运行后台任务，由 python -m app.collector 负责
+                    "adaptive_concurrency": True,
+                    "initial_limit": 5,
+                    "min_limit": 1,
+                    "max_limit": 32,
+                    "latency_target": 2.0,
+                    "decrease_factor": 0.5,
+                    "breaker_failure_rate": 0.5,
+                    "breaker_min_requests": 20,
+                    "breaker_window": 30,
+                    "breaker_open_seconds": 30,
+                    "pipeline": {
+                        "enabled": True,
+                        "compute_workers": 2,
+                        "compute_queue": 16,
+                        "write_queue": 64,
+                        "write_batch_size": 20,
+                        "write_batch_delay": 0.2,
+                        "sample_interval": 5
+                    },
+                    "sharding": {
+                        "enabled": False,
+                        "shards": 32,
+                        "lease_seconds": 30,
+                        "heartbeat_interval": 10,
+                        "worker_id": None
+                    },
+                    "leader_election": {
+                        "enabled": False,
+                        "lease_seconds": 10,
+                        "renew_interval": 3,
+                        "safety_margin": 2
+                    }
+                },
+                "ws_ingest": {
+                    "enabled": False,
+                    "url": "wss://api.hyperliquid.xyz/ws",
+                    "max_connections": 2,
+                    "max_users": 10,  # HyperLiquid 每个 IP 最多订阅 10 个不同地址
+                    "ping_interval": 50,
+                    "reconnect_max_delay": 60,
+                    "resync_interval": 300,
+                    "rescore_delay": 10,
+                    "rescore_concurrency": 2
+                },
+                "websocket": {
+                    "send_queue_size": 256,
+                    "slow_consumer": "disconnect",
+                    "send_timeout": 10
+                },
+                "import": {
+                    "resume": True,
+                    "stale_seconds": 30,
+                    "resume_check_interval": 15,
+                    "checkpoint_interval": 5,
+                    "progress_rate": 4
                 },
                 "pagination": {
                     "default_page_size": 20,
@@ -4,72 +4,201 @@
 """
 import sqlite3
 import json
+import time
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 from loguru import logger
 
-from app.config import DATA_DIR
+from app.config import DATA_DIR, config
+from app.utils.metrics import registry
+
+# 查询耗时（按语句类型）
+DB_QUERY_SECONDS = registry.histogram(
+    "db_query_duration_seconds",
+    "SQLite 语句执行耗时（含提交）",
+    ["statement"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+)
+_STATEMENT_CLASSES = {"SELECT", "INSERT", "UPDATE", "DELETE", "CREATE", "PRAGMA", "WITH"}
+
+
+def _statement_class(sql: str) -> str:
+    """取 SQL 首个关键字作为语句类型"""
+    parts = sql.split(None, 1)
+    keyword = parts[0].upper() if parts else ""
+    return keyword if keyword in _STATEMENT_CLASSES else "OTHER"
 
 # 数据库文件路径
 DB_PATH = DATA_DIR / "hyperliquid_analyzer.db"
 
+# 由触发器维护行数计数器的表
+STATS_TABLES = [
+    'wallets', 'trades', 'positions', 'transfers',
+    'leaderboards', 'system_configs', 'notifications',
+    'ai_analysis_cache', 'ai_usage_stats', 'users', 'system_logs'
+]
+
 
 class Database:
     """数据库管理类"""
     
     def __init__(self, db_path: Path = None):
         self.db_path = db_path or DB_PATH
-        self.conn: Optional[sqlite3.Connection] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        # batch() 嵌套深度（大于 0 时语句不单独提交）
+        self._depth = 0
+        # 绑定了专用连接的线程（如流水线写库线程）的连接和 batch 深度
+        self._local = threading.local()
         self._init_database()
     
+    @property
+    def conn(self) -> Optional[sqlite3.Connection]:
+        """当前线程使用的连接：绑定了专用连接的线程用自己的连接，其余共用主连接"""
+        return getattr(self._local, "conn", None) or self._conn
+    
+    @property
+    def _batch_depth(self) -> int:
+        if getattr(self._local, "conn", None) is not None:
+            return self._local.depth
+        return self._depth
+    
+    @_batch_depth.setter
+    def _batch_depth(self, value: int):
+        if getattr(self._local, "conn", None) is not None:
+            self._local.depth = value
+        else:
+            self._depth = value
+    
     def _init_database(self):
         """初始化数据库连接"""
         # 确保目录存在
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
         
-        # 连接数据库
-        self.conn = sqlite3.connect(
+        self._conn = self._connect()
+        logger.info(f"数据库连接成功: {self.db_path}")
+    
+    def _connect(self) -> sqlite3.Connection:
+        """打开一个连接并设置连接级参数"""
+        conn = sqlite3.connect(
             str(self.db_path),
             check_same_thread=False,
             timeout=30.0
         )
         # 启用外键约束
-        self.conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute("PRAGMA foreign_keys = ON")
+        # INSERT OR REPLACE 删除旧行时也触发 DELETE 触发器（保持行数计数器准确）
+        conn.execute("PRAGMA recursive_triggers = ON")
+        # 多个进程共用数据库（分片采集、选主）时使用 WAL：读写互不阻塞，租约续约不会被长读卡住
+        collector_config = config.get_config("system").get("collector", {})
+        if ((collector_config.get("sharding") or {}).get("enabled")
+                or (collector_config.get("leader_election") or {}).get("enabled")):
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
         # 设置行工厂，返回字典格式
-        self.conn.row_factory = sqlite3.Row
+        conn.row_factory = sqlite3.Row
+        return conn
+    
+    def open_thread_connection(self):
+        """
+        为当前线程打开专用连接，之后本线程的语句都走这个连接
         
-        logger.info(f"数据库连接成功: {self.db_path}")
+        供在线程中长时间写库的组件使用（如刷新流水线的写库线程），
+        写库事务不会与事件循环上的语句混在同一个连接里。
+        """
+        if getattr(self._local, "conn", None) is None:
+            self._local.depth = 0
+            self._local.conn = self._connect()
+    
+    def close_thread_connection(self):
+        """关闭当前线程的专用连接（之后回到主连接）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.conn = None
+            conn.close()
     
     def close(self):
         """关闭数据库连接"""
-        if self.conn:
-            self.conn.close()
+        if self._conn:
+            self._conn.close()
             logger.info("数据库连接已关闭")
     
     def execute(self, sql: str, params: tuple = None) -> sqlite3.Cursor:
         """执行 SQL 语句"""
+        start = time.perf_counter()
         try:
             if params:
                 cursor = self.conn.execute(sql, params)
             else:
                 cursor = self.conn.execute(sql)
-            self.conn.commit()
+            if not self._batch_depth:
+                self.conn.commit()
             return cursor
         except sqlite3.Error as e:
             logger.error(f"SQL 执行错误: {e}, SQL: {sql}")
-            self.conn.rollback()
+            if not self._batch_depth:
+                self.conn.rollback()
             raise
+        finally:
+            DB_QUERY_SECONDS.labels(_statement_class(sql)).observe(time.perf_counter() - start)
     
     def execute_many(self, sql: str, params_list: List[tuple]):
         """批量执行 SQL"""
+        start = time.perf_counter()
         try:
             self.conn.executemany(sql, params_list)
-            self.conn.commit()
+            if not self._batch_depth:
+                self.conn.commit()
         except sqlite3.Error as e:
             logger.error(f"批量 SQL 执行错误: {e}")
-            self.conn.rollback()
+            if not self._batch_depth:
+                self.conn.rollback()
             raise
+        finally:
+            DB_QUERY_SECONDS.labels(_statement_class(sql)).observe(time.perf_counter() - start)
+    
+    @contextmanager
+    def batch(self):
+        """
+        把多条写入合并为一次提交
+        
+        块内 execute 不再逐条提交，正常退出时统一提交，异常时整体回滚。
+        块内不要 await（同一连接上的其他协程语句会混进本事务）。
+        """
+        if self._batch_depth == 0 and not self.conn.in_transaction:
+            self.conn.execute("BEGIN")
+        self._batch_depth += 1
+        try:
+            yield
+        except Exception:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.conn.rollback()
+            raise
+        self._batch_depth -= 1
+        if self._batch_depth == 0:
+            start = time.perf_counter()
+            self.conn.commit()
+            DB_QUERY_SECONDS.labels("COMMIT").observe(time.perf_counter() - start)
+    
+    @contextmanager
+    def savepoint(self, name: str = "sp"):
+        """
+        在 batch() 内隔离一组写入：失败时只回滚这一组，不影响同批其他写入
+        
+        Args:
+            name: 保存点名称
+        """
+        self.conn.execute(f"SAVEPOINT {name}")
+        try:
+            yield
+        except Exception:
+            self.conn.execute(f"ROLLBACK TO {name}")
+            self.conn.execute(f"RELEASE {name}")
+            raise
+        self.conn.execute(f"RELEASE {name}")
     
     def fetch_one(self, sql: str, params: tuple = None) -> Optional[Dict[str, Any]]:
         """查询单条记录"""
@@ -192,6 +321,7 @@ class Database:
         self.execute("CREATE INDEX IF NOT EXISTS idx_trades_timestamp ON trades(timestamp DESC)")
         self.execute("CREATE INDEX IF NOT EXISTS idx_trades_symbol ON trades(symbol)")
         self.execute("CREATE INDEX IF NOT EXISTS idx_trades_pnl ON trades(pnl DESC)")
+        self._ensure_trade_hash_index()
         
         # 3. 持仓表
         self.execute("""
@@ -355,14 +485,204 @@ class Database:
         self.execute("CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)")
         self.execute("CREATE INDEX IF NOT EXISTS idx_users_role ON users(role)")
         
+        # 11. 表统计信息（行数由触发器实时维护，页/碎片信息定期刷新）
+        self.execute("""
+            CREATE TABLE IF NOT EXISTS table_stats (
+                table_name VARCHAR(64) PRIMARY KEY,
+                row_count INTEGER NOT NULL DEFAULT 0,
+                page_count INTEGER DEFAULT 0,
+                total_bytes INTEGER DEFAULT 0,
+                payload_bytes INTEGER DEFAULT 0,
+                unused_bytes INTEGER DEFAULT 0,
+                fragmentation DECIMAL(5, 4) DEFAULT 0,
+                counted_at TIMESTAMP,
+                analyzed_at TIMESTAMP
+            )
+        """)
+        
+        # 12. 钱包刷新计划（单个钱包的刷新间隔设置）
+        self.execute("""
+            CREATE TABLE IF NOT EXISTS wallet_schedule (
+                wallet_address VARCHAR(42) PRIMARY KEY,
+                refresh_interval INTEGER,  -- 秒，NULL 表示按 update_frequency
+                updated_at TIMESTAMP,
+                FOREIGN KEY (wallet_address) REFERENCES wallets(address) ON DELETE CASCADE
+            )
+        """)
+        
+        # 13. 钱包交易活跃度（成交到达间隔 EWMA）
+        self.execute("""
+            CREATE TABLE IF NOT EXISTS wallet_activity (
+                wallet_address VARCHAR(42) PRIMARY KEY,
+                last_fill_time INTEGER,  -- 最近一次成交时间（epoch 秒）
+                ewma_gap_seconds REAL,
+                fills_seen INTEGER DEFAULT 0,
+                updated_at TIMESTAMP,
+                FOREIGN KEY (wallet_address) REFERENCES wallets(address) ON DELETE CASCADE
+            )
+        """)
+        
+        # 14. 钱包变化指纹（上次完整刷新时的成交游标）
+        self.execute("""
+            CREATE TABLE IF NOT EXISTS wallet_fingerprint (
+                wallet_address VARCHAR(42) PRIMARY KEY,
+                cursor_ms INTEGER DEFAULT 0,
+                fingerprint VARCHAR(40),
+                refreshed_at REAL,  -- 上次完整刷新时间（epoch 秒）
+                FOREIGN KEY (wallet_address) REFERENCES wallets(address) ON DELETE CASCADE
+            )
+        """)
+        
+        # 15. 采集分片租约（多个采集进程分片刷新钱包）
+        self.execute("""
+            CREATE TABLE IF NOT EXISTS collector_shards (
+                shard INTEGER PRIMARY KEY,
+                worker_id VARCHAR(128),  -- 持有者；NULL 表示空闲
+                lease_expires REAL DEFAULT 0  -- 租约到期时间（epoch 秒）
+            )
+        """)
+        
+        # 16. 采集进程心跳
+        self.execute("""
+            CREATE TABLE IF NOT EXISTS collector_workers (
+                worker_id VARCHAR(128) PRIMARY KEY,
+                hostname VARCHAR(255),
+                pid INTEGER,
+                started_at REAL,
+                heartbeat_at REAL
+            )
+        """)
+        
+        # 17. 后台任务选主租约
+        self.execute("""
+            CREATE TABLE IF NOT EXISTS leader_leases (
+                name VARCHAR(64) PRIMARY KEY,
+                holder VARCHAR(128),  -- 主进程标识；NULL 表示空闲
+                token INTEGER DEFAULT 0,  -- fencing token，每次易主递增
+                lease_expires REAL DEFAULT 0,  -- 租约到期时间（epoch 秒）
+                acquired_at REAL
+            )
+        """)
+        
+        # 18. 导入任务（断点续传）
+        self.execute("""
+            CREATE TABLE IF NOT EXISTS import_tasks (
+                task_id VARCHAR(36) PRIMARY KEY,
+                status VARCHAR(20) NOT NULL,
+                batch_size INTEGER DEFAULT 50,
+                frequency VARCHAR(20) DEFAULT 'normal',
+                total INTEGER DEFAULT 0,
+                processed INTEGER DEFAULT 0,
+                success INTEGER DEFAULT 0,
+                failed INTEGER DEFAULT 0,
+                skipped INTEGER DEFAULT 0,
+                created_at TIMESTAMP,
+                started_at TIMESTAMP,
+                completed_at TIMESTAMP,
+                updated_at REAL,  -- 执行进程心跳（epoch 秒），过期的未完成任务可被接管
+                receiving INTEGER DEFAULT 0  -- 上传仍在接收中（接收方可能与执行方不是同一进程）
+            )
+        """)
+        self._ensure_column("import_tasks", "receiving", "INTEGER DEFAULT 0")
+        
+        # 19. 导入任务中每个地址的处理状态
+        self.execute("""
+            CREATE TABLE IF NOT EXISTS import_task_items (
+                task_id VARCHAR(36) NOT NULL,
+                seq INTEGER NOT NULL,  -- 导入顺序
+                address VARCHAR(42) NOT NULL,
+                status VARCHAR(20) DEFAULT 'pending',  -- pending/success/failed/skipped
+                error TEXT,
+                PRIMARY KEY (task_id, address),
+                FOREIGN KEY (task_id) REFERENCES import_tasks(task_id) ON DELETE CASCADE
+            )
+        """)
+        self.execute("CREATE INDEX IF NOT EXISTS idx_import_items_pending ON import_task_items(task_id, status, seq)")
+        
         logger.info("数据库表创建完成")
         
+        # 初始化行数计数器
+        self._init_table_stats()
+        
         # 初始化预设榜单
         self._init_preset_leaderboards()
         
         # 初始化默认管理员
         self._init_default_admin()
     
+    def _ensure_column(self, table: str, column: str, definition: str):
+        """旧库中的表缺少后来新增的列时补上"""
+        columns = {row["name"] for row in self.fetch_all(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            self.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            logger.info(f"已为 {table} 表添加列: {column}")
+    
+    def _ensure_trade_hash_index(self):
+        """
+        同一钱包的成交按哈希唯一（写入用 INSERT OR IGNORE 去重）
+        
+        旧库首次建索引前先删除重复的成交，只保留最早写入的一条。
+        """
+        exists = self.fetch_one(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_trades_wallet_hash'"
+        )
+        if exists:
+            return
+        
+        with self.batch():
+            cursor = self.execute("""
+                DELETE FROM trades
+                WHERE hash IS NOT NULL AND id NOT IN (
+                    SELECT MIN(id) FROM trades WHERE hash IS NOT NULL GROUP BY wallet_address, hash
+                )
+            """)
+            if cursor.rowcount > 0:
+                logger.warning(f"⚠️ 已删除 {cursor.rowcount} 条重复成交记录")
+            self.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_trades_wallet_hash
+                ON trades(wallet_address, hash)
+            """)
+    
+    def _init_table_stats(self):
+        """
+        初始化行数计数器
+        
+        为每张统计表创建 INSERT/DELETE 触发器，并在首次创建时用 COUNT(*) 填充初始值。
+        之后行数查询为 O(1)，无需再扫描整张表。
+        """
+        existing_tables = {
+            row["name"] for row in self.fetch_all(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            )
+        }
+        
+        for table in STATS_TABLES:
+            if table not in existing_tables:
+                continue
+            
+            self.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_stats_insert
+                AFTER INSERT ON {table}
+                BEGIN
+                    UPDATE table_stats SET row_count = row_count + 1
+                    WHERE table_name = '{table}';
+                END
+            """)
+            self.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_stats_delete
+                AFTER DELETE ON {table}
+                BEGIN
+                    UPDATE table_stats SET row_count = row_count - 1
+                    WHERE table_name = '{table}';
+                END
+            """)
+            
+            # 首次初始化：全表计数一次
+            self.execute(f"""
+                INSERT OR IGNORE INTO table_stats (table_name, row_count, counted_at)
+                SELECT '{table}', COUNT(*), ? FROM {table}
+            """, (datetime.now().isoformat(),))
+    
     def _init_preset_leaderboards(self):
         """初始化预设榜单"""
         preset_leaderboards = [
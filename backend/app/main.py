@@ -1,6 +1,9 @@
 """FastAPI 应用入口"""
-from fastapi import FastAPI
+import time
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from fastapi.staticfiles import StaticFiles
 from loguru import logger
 import uvicorn
@@ -11,6 +14,10 @@ from app.utils.logger import setup_logger
 from app.database import db
 from app.services.scheduler import scheduler
 from app.services.ai.ai_scheduler import ai_scheduler
+from app.services.background import run_in_api, start_background_services, stop_background_services
+from app.services.leader import leader_election
+from app.services.http_pool import http_pool, HTTP2_AVAILABLE
+from app.utils.metrics import registry, CONTENT_TYPE_LATEST
 
 # 设置日志
 setup_logger()
@@ -31,6 +38,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# HTTP 请求指标（按路由模板统计，避免路径参数导致标签爆炸）
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds",
+    "HTTP 请求处理耗时",
+    ["method", "route", "status"]
+)
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """记录 HTTP 请求耗时"""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", "unmatched")
+        HTTP_REQUEST_SECONDS.labels(request.method, route_path, status).observe(
+            time.perf_counter() - start
+        )
+
+
 # 注册路由
 app.include_router(auth.router, prefix="/api/auth", tags=["认证"])
 app.include_router(websocket.router, prefix="/api", tags=["WebSocket"])
@@ -61,29 +93,14 @@ async def startup_event():
         logger.error(f"❌ 数据库初始化失败: {e}")
         raise
     
-    # 启动数据采集调度器
-    try:
-        scheduler_enabled = config.get_config("system").get("scheduler", {}).get("enabled", True)
-        if scheduler_enabled:
-            logger.info("⏰ 启动数据采集调度器...")
-            scheduler.start()
-        else:
-            logger.info("⏰ 调度器已禁用")
-    except Exception as e:
-        logger.error(f"❌ 调度器启动失败: {e}")
-        # 调度器失败不影响主程序
+    # 共享 HTTP 连接池（客户端按需创建，各子系统复用连接）
+    logger.info(f"🔌 共享 HTTP 连接池: HTTP/2 {'可用' if HTTP2_AVAILABLE else '不可用（未安装 h2）'}")
     
-    # 启动 AI 调度器
-    try:
-        ai_enabled = config.get_config("ai", {}).get("enabled", False)
-        if ai_enabled:
-            logger.info("🤖 启动 AI 调度器...")
-            await ai_scheduler.start()
-        else:
-            logger.info("🤖 AI 调度器已禁用")
-    except Exception as e:
-        logger.error(f"❌ AI 调度器启动失败: {e}")
-        # AI 调度器失败不影响主程序
+    # 后台任务（采集调度、推送采集、AI 调度）；关闭 run_in_api 时由独立采集进程运行
+    if run_in_api():
+        await start_background_services()
+    else:
+        logger.info("⏰ 后台任务由独立采集进程运行（python -m app.collector），API 进程不启动调度器")
     
     logger.info("✅ 系统启动完成")
 
@@ -93,18 +110,14 @@ async def shutdown_event():
     """关闭事件"""
     logger.info("👋 系统正在关闭...")
     
-    # 停止调度器
-    try:
-        if scheduler.is_running:
-            scheduler.stop()
-    except Exception as e:
-        logger.error(f"停止调度器失败: {e}")
+    # 停止后台任务
+    await stop_background_services()
     
-    # 停止 AI 调度器
+    # 释放共享 HTTP 连接池
     try:
-        ai_scheduler.stop()
+        await http_pool.close()
     except Exception as e:
-        logger.error(f"停止 AI 调度器失败: {e}")
+        logger.error(f"关闭 HTTP 连接池失败: {e}")
     
     # 关闭数据库连接
     db.close()
@@ -130,10 +143,18 @@ async def health():
         "version": "2.0.0",
         "database": "connected" if db.conn else "disconnected",
         "data_scheduler": "running" if scheduler.is_running else "stopped",
-        "ai_scheduler": "running" if ai_scheduler.running else "stopped"
+        "ai_scheduler": "running" if ai_scheduler.running else "stopped",
+        "background": "api" if run_in_api() else "collector",
+        "leader": leader_election.is_leader if leader_election.enabled else None
     }
 
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 指标导出"""
+    return Response(content=registry.render(), media_type=CONTENT_TYPE_LATEST)
+
+
 if __name__ == "__main__":
     uvicorn.run(
         "app.main:app",
@@ -0,0 +1,328 @@
+"""
+紧凑交易记录
+- TradeRecord: 单笔交易（__slots__，无实例字典）
+- TradeBatch: 列式存储的一批交易（数值列用 array，币种/方向按编号存储并驻留字符串）
+
+两者都支持 trade["pnl"] / trade.get("pnl") 这种按字典方式读取，
+原来按字典处理交易记录的代码无需修改即可使用；热点路径可直接读取列。
+"""
+import sys
+from array import array
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Tuple, Union
+
+# 交易字段（顺序即 to_dict 输出顺序）
+TRADE_FIELDS = (
+    "timestamp", "symbol", "side", "size", "entry_price", "exit_price",
+    "pnl", "holding_time_minutes", "fees", "trade_count", "hash"
+)
+
+# 字段 -> 列名
+_COLUMNS = {
+    "timestamp": "timestamps",
+    "size": "sizes",
+    "entry_price": "entry_prices",
+    "exit_price": "exit_prices",
+    "pnl": "pnls",
+    "holding_time_minutes": "holding_times",
+    "fees": "fees",
+    "trade_count": "trade_counts",
+    "hash": "hashes",
+}
+
+
+class TradeRecord:
+    """单笔交易"""
+    
+    __slots__ = TRADE_FIELDS
+    
+    def __init__(
+        self,
+        timestamp: int = 0,
+        symbol: str = "",
+        side: str = "",
+        size: float = 0.0,
+        entry_price: float = 0.0,
+        exit_price: float = 0.0,
+        pnl: float = 0.0,
+        holding_time_minutes: float = 0,
+        fees: float = 0.0,
+        trade_count: int = 1,
+        hash: str = ""
+    ):
+        self.timestamp = timestamp
+        self.symbol = symbol
+        self.side = side
+        self.size = size
+        self.entry_price = entry_price
+        self.exit_price = exit_price
+        self.pnl = pnl
+        self.holding_time_minutes = holding_time_minutes
+        self.fees = fees
+        self.trade_count = trade_count
+        self.hash = hash
+    
+    def __getitem__(self, key: str) -> Any:
+        if key not in TRADE_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        """按字典方式读取字段，未知字段返回默认值"""
+        if key not in TRADE_FIELDS:
+            return default
+        return getattr(self, key)
+    
+    def keys(self) -> Tuple[str, ...]:
+        return TRADE_FIELDS
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in TRADE_FIELDS}
+    
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, TradeRecord):
+            return all(getattr(self, f) == getattr(other, f) for f in TRADE_FIELDS)
+        if isinstance(other, dict):
+            return self.to_dict() == {f: other.get(f) for f in TRADE_FIELDS}
+        return NotImplemented
+    
+    def __repr__(self) -> str:
+        return f"TradeRecord({self.symbol} {self.side} {self.size}@{self.entry_price} pnl={self.pnl} t={self.timestamp})"
+
+
+class TradeBatch:
+    """
+    列式交易集合
+    
+    每笔交易约 60 字节（6 个 float64 + 时间戳 + 编号 + 哈希引用），
+    而同样内容的字典约 1 KB。币种和方向各自只保存一份字符串。
+    """
+    
+    __slots__ = (
+        "timestamps", "sizes", "entry_prices", "exit_prices", "pnls", "holding_times",
+        "fees", "trade_counts", "symbol_ids", "side_ids", "hashes",
+        "symbols", "sides", "_symbol_index", "_side_index"
+    )
+    
+    def __init__(self):
+        self.timestamps = array("q")
+        self.sizes = array("d")
+        self.entry_prices = array("d")
+        self.exit_prices = array("d")
+        self.pnls = array("d")
+        self.holding_times = array("d")
+        self.fees = array("d")
+        self.trade_counts = array("l")
+        self.symbol_ids = array("H")
+        self.side_ids = array("B")
+        self.hashes: List[str] = []
+        
+        # 编号 -> 字符串
+        self.symbols: List[str] = []
+        self.sides: List[str] = []
+        self._symbol_index: Dict[str, int] = {}
+        self._side_index: Dict[str, int] = {}
+    
+    @classmethod
+    def from_trades(cls, trades: Iterable[Any]) -> "TradeBatch":
+        """从交易字典（或 TradeRecord）列表构建"""
+        if isinstance(trades, TradeBatch):
+            return trades
+        batch = cls()
+        for trade in trades:
+            batch.append(
+                int(trade.get("timestamp") or 0),
+                trade.get("symbol") or "",
+                trade.get("side") or "",
+                float(trade.get("size") or 0),
+                float(trade.get("entry_price") or 0),
+                float(trade.get("exit_price") or 0),
+                float(trade.get("pnl") or 0),
+                float(trade.get("fees") or 0),
+                trade.get("hash") or "",
+                float(trade.get("holding_time_minutes") or 0),
+                int(trade.get("trade_count") or 1)
+            )
+        return batch
+    
+    def _intern(self, value: str, table: List[str], index: Dict[str, int]) -> int:
+        code = index.get(value)
+        if code is None:
+            code = len(table)
+            table.append(sys.intern(value))
+            index[value] = code
+        return code
+    
+    def append(
+        self,
+        timestamp: int,
+        symbol: str,
+        side: str,
+        size: float,
+        entry_price: float,
+        exit_price: float,
+        pnl: float,
+        fees: float,
+        hash: str = "",
+        holding_time_minutes: float = 0,
+        trade_count: int = 1
+    ):
+        """追加一笔交易"""
+        self.timestamps.append(timestamp)
+        self.symbol_ids.append(self._intern(symbol, self.symbols, self._symbol_index))
+        self.side_ids.append(self._intern(side, self.sides, self._side_index))
+        self.sizes.append(size)
+        self.entry_prices.append(entry_price)
+        self.exit_prices.append(exit_price)
+        self.pnls.append(pnl)
+        self.holding_times.append(holding_time_minutes)
+        self.fees.append(fees)
+        self.trade_counts.append(trade_count)
+        self.hashes.append(hash)
+    
+    def extend(self, other: "TradeBatch"):
+        """追加另一批交易（编号按本批的字符串表重新映射）"""
+        symbol_map = [self._intern(s, self.symbols, self._symbol_index) for s in other.symbols]
+        side_map = [self._intern(s, self.sides, self._side_index) for s in other.sides]
+        self.timestamps.extend(other.timestamps)
+        self.symbol_ids.extend(symbol_map[code] for code in other.symbol_ids)
+        self.side_ids.extend(side_map[code] for code in other.side_ids)
+        self.sizes.extend(other.sizes)
+        self.entry_prices.extend(other.entry_prices)
+        self.exit_prices.extend(other.exit_prices)
+        self.pnls.extend(other.pnls)
+        self.holding_times.extend(other.holding_times)
+        self.fees.extend(other.fees)
+        self.trade_counts.extend(other.trade_counts)
+        self.hashes.extend(other.hashes)
+    
+    def sort_by_time(self):
+        """按时间升序排列（已有序时不做任何事）"""
+        ts = self.timestamps
+        if all(ts[i] <= ts[i + 1] for i in range(len(ts) - 1)):
+            return
+        
+        order = sorted(range(len(ts)), key=ts.__getitem__)
+        for name in ("timestamps", "sizes", "entry_prices", "exit_prices", "pnls",
+                     "holding_times", "fees", "trade_counts", "symbol_ids", "side_ids"):
+            column = getattr(self, name)
+            setattr(self, name, array(column.typecode, [column[i] for i in order]))
+        self.hashes = [self.hashes[i] for i in order]
+    
+    def column(self, field: str) -> Sequence[Any]:
+        """读取一列（币种/方向列解码为字符串）"""
+        if field == "symbol":
+            symbols = self.symbols
+            return [symbols[code] for code in self.symbol_ids]
+        if field == "side":
+            sides = self.sides
+            return [sides[code] for code in self.side_ids]
+        return getattr(self, _COLUMNS[field])
+    
+    def value_counts(self, field: str) -> Dict[str, int]:
+        """按币种或方向计数（在编号上计数，不展开字符串）"""
+        if field == "symbol":
+            table, codes = self.symbols, self.symbol_ids
+        elif field == "side":
+            table, codes = self.sides, self.side_ids
+        else:
+            return dict(Counter(self.column(field)))
+        return {table[code]: count for code, count in Counter(codes).items()}
+    
+    def record(self, i: int) -> TradeRecord:
+        return TradeRecord(
+            self.timestamps[i],
+            self.symbols[self.symbol_ids[i]],
+            self.sides[self.side_ids[i]],
+            self.sizes[i],
+            self.entry_prices[i],
+            self.exit_prices[i],
+            self.pnls[i],
+            self.holding_times[i],
+            self.fees[i],
+            self.trade_counts[i],
+            self.hashes[i]
+        )
+    
+    def __len__(self) -> int:
+        return len(self.timestamps)
+    
+    def __iter__(self) -> Iterator[TradeRecord]:
+        for i in range(len(self.timestamps)):
+            yield self.record(i)
+    
+    def __getitem__(self, index: Union[int, slice]) -> Union[TradeRecord, List[TradeRecord]]:
+        if isinstance(index, slice):
+            return [self.record(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("TradeBatch index out of range")
+        return self.record(index)
+    
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """转换为交易字典列表（用于 JSON 输出）"""
+        return [record.to_dict() for record in self]
+    
+    def __repr__(self) -> str:
+        return f"TradeBatch({len(self)} trades, {len(self.symbols)} symbols)"
+
+
+def trade_column(trades: Union[TradeBatch, Sequence[Dict[str, Any]]], field: str, default: Any = 0) -> Sequence[Any]:
+    """
+    读取交易集合的一列
+    
+    Args:
+        trades: TradeBatch 或交易字典列表
+        field: 字段名
+        default: 字典缺少该字段时的默认值
+    
+    Returns:
+        该字段的值序列
+    """
+    if isinstance(trades, TradeBatch):
+        return trades.column(field)
+    return [t.get(field, default) for t in trades]
+
+
+def trade_value_counts(trades: Union[TradeBatch, Sequence[Dict[str, Any]]], field: str) -> Dict[Any, int]:
+    """按字段值计数（TradeBatch 直接在编号上计数）"""
+    if isinstance(trades, TradeBatch):
+        return trades.value_counts(field)
+    return dict(Counter(t.get(field, "") for t in trades))
+
+
+def iter_trade_rows(
+    trades: Union[TradeBatch, Sequence[Dict[str, Any]]],
+    fields: Sequence[str]
+) -> Iterator[Tuple[Any, ...]]:
+    """
+    按给定字段顺序逐行产出元组（用于批量写库）
+    
+    TradeBatch 没有的字段（如 oid、tid）输出 None。
+    """
+    if isinstance(trades, TradeBatch):
+        columns = [
+            trades.column(field) if field in _COLUMNS or field in ("symbol", "side") else None
+            for field in fields
+        ]
+        count = len(trades)
+        columns = [column if column is not None else [None] * count for column in columns]
+        return zip(*columns)
+    return (tuple(t.get(field) for field in fields) for t in trades)
+
+
+def trades_to_json(value: Any) -> Any:
+    """json.dump 的 default 钩子：把交易容器转换为普通列表/字典"""
+    if isinstance(value, TradeBatch):
+        return value.to_dicts()
+    if isinstance(value, TradeRecord):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+# 导出
+__all__ = [
+    'TradeRecord', 'TradeBatch', 'TRADE_FIELDS',
+    'trade_column', 'trade_value_counts', 'iter_trade_rows', 'trades_to_json'
+]
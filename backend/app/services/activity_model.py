@@ -0,0 +1,190 @@
+"""
+钱包交易活跃度模型
+根据成交时间学习每个钱包的成交到达间隔（EWMA），据此决定刷新间隔：
+经常交易的钱包刷新更勤，长期不交易的钱包少刷新，把 API 额度留给真正在交易的钱包。
+"""
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Sequence
+
+from app.database import db
+from app.config import config
+from app.utils.metrics import registry
+
+# 活跃度指标
+FILL_DETECTION_LAG = registry.histogram(
+    "wallet_fill_detection_lag_seconds",
+    "新成交从发生到被轮询发现的延迟",
+    buckets=(10.0, 30.0, 60.0, 300.0, 900.0, 1800.0, 3600.0, 7200.0, 21600.0, 86400.0)
+)
+ACTIVITY_POLLS = registry.counter(
+    "activity_polls",
+    "刷新次数（actual 为实际次数，baseline 为按固定频率时同一时段内应有的次数）",
+    ["kind"]
+)
+
+# 每次完整刷新的 info 请求数（clearinghouseState / userFills / portfolio / 资金流水 / 挂单）
+REQUESTS_PER_REFRESH = 5
+
+DEFAULT_ACTIVITY_CONFIG = {
+    "enabled": True,
+    "alpha": 0.3,             # EWMA 平滑系数（越大越看重最近的间隔）
+    "fills_per_poll": 1.0,    # 目标：平均每次刷新发现约这么多次成交
+    "burst_window": 1,        # 间隔小于该秒数的成交视为同一次（拆单成交）
+    "min_interval": 60,
+    "max_interval": 21600,
+    "frequency_update_interval": 3600
+}
+
+
+class ActivityState:
+    """单个钱包的活跃度状态"""
+    
+    __slots__ = ("last_fill_time", "ewma_gap", "fills_seen")
+    
+    def __init__(self, last_fill_time: int = 0, ewma_gap: Optional[float] = None, fills_seen: int = 0):
+        self.last_fill_time = last_fill_time
+        self.ewma_gap = ewma_gap
+        self.fills_seen = fills_seen
+
+
+class ActivityTracker:
+    """成交到达间隔 EWMA 与刷新间隔计算"""
+    
+    def __init__(self, settings: Optional[Dict[str, Any]] = None):
+        settings = {**DEFAULT_ACTIVITY_CONFIG, **(settings or {})}
+        self.enabled = settings["enabled"]
+        self.alpha = float(settings["alpha"])
+        self.fills_per_poll = float(settings["fills_per_poll"])
+        self.burst_window = float(settings["burst_window"])
+        self.min_interval = float(settings["min_interval"])
+        self.max_interval = float(settings["max_interval"])
+        self.frequency_update_interval = settings["frequency_update_interval"]
+        
+        self._states: Dict[str, ActivityState] = {}
+        self._polls = {"actual": 0, "baseline": 0.0}
+        self._lag_sum = 0.0
+        self._lag_count = 0
+    
+    def _load(self, address: str) -> Optional[ActivityState]:
+        state = self._states.get(address)
+        if state is not None:
+            return state
+        row = db.fetch_one(
+            "SELECT last_fill_time, ewma_gap_seconds, fills_seen FROM wallet_activity WHERE wallet_address = ?",
+            (address,)
+        )
+        if row:
+            state = ActivityState(row["last_fill_time"] or 0, row["ewma_gap_seconds"], row["fills_seen"] or 0)
+            self._states[address] = state
+        return state
+    
+    def load_all(self):
+        """一次性载入全部钱包的活跃度状态（避免启动时逐个查询）"""
+        rows = db.fetch_all("SELECT wallet_address, last_fill_time, ewma_gap_seconds, fills_seen FROM wallet_activity")
+        for row in rows:
+            self._states[row["wallet_address"]] = ActivityState(
+                row["last_fill_time"] or 0, row["ewma_gap_seconds"], row["fills_seen"] or 0
+            )
+    
+    def _fold(self, state: ActivityState, times: Sequence[int]):
+        """按时间顺序把成交并入 EWMA"""
+        previous = state.last_fill_time
+        for t in times:
+            if previous:
+                gap = t - previous
+                if gap < self.burst_window:
+                    continue
+                if state.ewma_gap is None:
+                    state.ewma_gap = float(gap)
+                else:
+                    state.ewma_gap = self.alpha * gap + (1 - self.alpha) * state.ewma_gap
+            previous = t
+            state.fills_seen += 1
+        state.last_fill_time = previous
+    
+    def observe(self, address: str, fill_times: Sequence[int]):
+        """
+        记录一次刷新看到的成交时间
+        
+        Args:
+            address: 钱包地址
+            fill_times: 成交时间（秒；可以是全部历史成交，已见过的会被跳过）
+        """
+        now = time.time()
+        state = self._load(address)
+        first_seen = state is None
+        if first_seen:
+            state = ActivityState()
+        
+        new_times = sorted(t for t in fill_times if t > state.last_fill_time)
+        if not first_seen and not new_times:
+            return
+        
+        if new_times and state.last_fill_time:
+            # 之前没见过成交时历史成交都算"新"，不计入发现延迟
+            lag = max(0.0, now - new_times[0])
+            FILL_DETECTION_LAG.observe(lag)
+            self._lag_sum += lag
+            self._lag_count += 1
+        
+        self._fold(state, new_times)
+        self._states[address] = state
+        
+        db.execute("""
+            INSERT INTO wallet_activity (wallet_address, last_fill_time, ewma_gap_seconds, fills_seen, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(wallet_address) DO UPDATE SET
+                last_fill_time = excluded.last_fill_time,
+                ewma_gap_seconds = excluded.ewma_gap_seconds,
+                fills_seen = excluded.fills_seen,
+                updated_at = excluded.updated_at
+        """, (address, state.last_fill_time, state.ewma_gap, state.fills_seen, datetime.now().isoformat()))
+    
+    def interval_for(self, address: str, baseline: float) -> float:
+        """
+        钱包刷新间隔（秒）
+        
+        有效间隔取 EWMA 间隔与距上次成交时长的较大者（长时间不交易说明到达率已下降），
+        刷新间隔 = 有效间隔 × fills_per_poll，限制在 [min_interval, max_interval]。
+        没有成交历史的钱包沿用 baseline。
+        """
+        state = self._load(address)
+        if state is None or not state.last_fill_time:
+            return baseline
+        
+        silence = max(0.0, time.time() - state.last_fill_time)
+        gap = max(state.ewma_gap or silence, silence)
+        return min(self.max_interval, max(self.min_interval, gap * self.fills_per_poll))
+    
+    def account(self, interval: float, baseline: float):
+        """记录一次刷新：按固定频率在同样时长内需要 interval / baseline 次"""
+        equivalent = interval / baseline if baseline > 0 else 1.0
+        self._polls["actual"] += 1
+        self._polls["baseline"] += equivalent
+        ACTIVITY_POLLS.labels("actual").inc()
+        ACTIVITY_POLLS.labels("baseline").inc(equivalent)
+    
+    def forget(self, address: str):
+        self._states.pop(address, None)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        saved = self._polls["baseline"] - self._polls["actual"]
+        return {
+            "enabled": self.enabled,
+            "wallets_modeled": len(self._states),
+            "polls": self._polls["actual"],
+            "baseline_polls": round(self._polls["baseline"], 1),
+            "polls_saved": round(saved, 1),
+            "requests_saved": round(saved * REQUESTS_PER_REFRESH),
+            "avg_detection_lag_s": round(self._lag_sum / self._lag_count, 1) if self._lag_count else None,
+            "detections": self._lag_count
+        }
+
+
+# 全局活跃度模型实例
+activity_tracker = ActivityTracker(config.get_config("system").get("scheduler", {}).get("activity"))
+
+
+# 导出
+__all__ = ['ActivityTracker', 'ActivityState', 'activity_tracker', 'REQUESTS_PER_REFRESH']
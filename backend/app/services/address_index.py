@@ -0,0 +1,174 @@
+"""
+钱包地址索引
+内存中保存 wallets 表全部地址（小写），导入前批量去重时无需逐个查询数据库。
+
+- 进程内新增/删除钱包时同步更新；其他进程的改动按 max_age 定期整表重新载入
+- 不在索引中的地址按块（IN 列表）再向数据库确认一次，避免索引过期导致重复导入
+"""
+import re
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+from loguru import logger
+
+from app.database import db
+
+ADDRESS_PATTERN = re.compile(r"^0x[0-9a-fA-F]{40}$")
+
+
+def normalize_address(address: Any) -> Optional[str]:
+    """
+    规范化钱包地址（去空白、转小写）
+    
+    Returns:
+        小写地址；格式无效时返回 None
+    """
+    if not isinstance(address, str):
+        return None
+    address = address.strip()
+    if not ADDRESS_PATTERN.match(address):
+        return None
+    return address.lower()
+
+
+class DedupeResult:
+    """批量去重结果（地址保持输入时的写法和顺序）"""
+    
+    __slots__ = ("new", "existing", "duplicates", "invalid")
+    
+    def __init__(self):
+        self.new: List[str] = []
+        self.existing: List[str] = []
+        self.duplicates = 0
+        self.invalid: List[str] = []
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "new": len(self.new),
+            "existing": len(self.existing),
+            "duplicates": self.duplicates,
+            "invalid": len(self.invalid)
+        }
+
+
+class AddressIndex:
+    """wallets 表地址的内存索引"""
+    
+    def __init__(self, max_age: float = 300, chunk_size: int = 400):
+        """
+        Args:
+            max_age: 整表重新载入的间隔（秒）
+            chunk_size: 向数据库确认时每条 IN 查询的地址数
+        """
+        self.max_age = max_age
+        self.chunk_size = chunk_size
+        self._addresses: Set[str] = set()
+        self._loaded_at: Optional[float] = None
+        self._queries = 0
+    
+    def _ensure_loaded(self):
+        if self._loaded_at is not None and time.time() - self._loaded_at < self.max_age:
+            return
+        rows = db.fetch_all("SELECT address FROM wallets")
+        self._addresses = {row["address"].lower() for row in rows if row["address"]}
+        self._loaded_at = time.time()
+        self._queries += 1
+        logger.debug(f"地址索引已载入: {len(self._addresses)} 个钱包")
+    
+    def invalidate(self):
+        """下次使用时整表重新载入"""
+        self._loaded_at = None
+    
+    def add(self, address: str):
+        self._addresses.add(address.lower())
+    
+    def discard(self, address: str):
+        self._addresses.discard(address.lower())
+    
+    def contains(self, address: str) -> bool:
+        """地址是否已在 wallets 表中（只查内存）"""
+        self._ensure_loaded()
+        return address.lower() in self._addresses
+    
+    def existing(self, addresses: Iterable[str]) -> Set[str]:
+        """
+        批量判断地址是否已存在
+        
+        Args:
+            addresses: 钱包地址（任意大小写）
+        
+        Returns:
+            已存在地址的小写形式
+        """
+        self._ensure_loaded()
+        found: Set[str] = set()
+        misses: List[str] = []
+        for address in addresses:
+            key = address.lower()
+            if key in self._addresses:
+                found.add(key)
+            else:
+                misses.append(address)
+        
+        # 索引之外的地址按块确认（其他进程刚写入的钱包）；同时查原写法和小写
+        for i in range(0, len(misses), self.chunk_size):
+            chunk = misses[i:i + self.chunk_size]
+            candidates = list({form for address in chunk for form in (address, address.lower())})
+            placeholders = ", ".join("?" * len(candidates))
+            rows = db.fetch_all(
+                f"SELECT address FROM wallets WHERE address IN ({placeholders})",
+                tuple(candidates)
+            )
+            self._queries += 1
+            for row in rows:
+                key = row["address"].lower()
+                self._addresses.add(key)
+                found.add(key)
+        return found
+    
+    def dedupe(self, addresses: Iterable[Any]) -> DedupeResult:
+        """
+        规范化、去除重复地址并区分新地址和已存在的地址
+        
+        Args:
+            addresses: 原始地址列表
+        
+        Returns:
+            DedupeResult
+        """
+        result = DedupeResult()
+        seen: Dict[str, str] = {}
+        invalid_seen: Set[Any] = set()
+        for address in addresses:
+            key = normalize_address(address)
+            if key is None:
+                if address and address not in invalid_seen:
+                    invalid_seen.add(address)
+                    result.invalid.append(address)
+                continue
+            if key in seen:
+                result.duplicates += 1
+                continue
+            seen[key] = address.strip()
+        
+        existing = self.existing(seen.values())
+        for key, address in seen.items():
+            if key in existing:
+                result.existing.append(address)
+            else:
+                result.new.append(address)
+        return result
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._addresses),
+            "loaded_at": self._loaded_at,
+            "queries": self._queries
+        }
+
+
+# 全局地址索引实例
+address_index = AddressIndex()
+
+
+# 导出
+__all__ = ['AddressIndex', 'DedupeResult', 'address_index', 'normalize_address']
@@ -4,11 +4,27 @@ DeepSeek API 服务
 """
 import httpx
 import json
+import time
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 from loguru import logger
 
 from app.database import db
+from app.utils.metrics import registry
+from app.services.http_pool import http_pool
+
+# AI 调用指标
+AI_CALL_SECONDS = registry.histogram(
+    "ai_call_duration_seconds",
+    "AI 接口调用耗时",
+    ["model", "status"],
+    buckets=(0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+)
+AI_TOKENS = registry.counter(
+    "ai_tokens",
+    "AI 接口消耗的 token 数",
+    ["model", "kind"]
+)
 
 
 class DeepSeekService:
@@ -16,7 +32,6 @@ class DeepSeekService:
     
     def __init__(self):
         self.config = self._load_config()
-        self.client = httpx.AsyncClient(timeout=30.0)
         
         # 定价（元/1K tokens）
         self.pricing = {
@@ -24,6 +39,11 @@ class DeepSeekService:
             'output': 0.002   # 输出 token 价格
         }
     
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """共享连接池中的 DeepSeek 客户端"""
+        return http_pool.get_client("deepseek", timeout=30.0)
+    
     def _load_config(self) -> Dict[str, Any]:
         """加载配置"""
         try:
@@ -111,6 +131,10 @@ class DeepSeekService:
             'stream': stream
         }
         
+        model = payload['model']
+        status = "error"
+        start = time.perf_counter()
+        
         try:
             logger.info(f"调用 DeepSeek API: {len(messages)} 条消息")
             
@@ -118,6 +142,12 @@ class DeepSeekService:
             response.raise_for_status()
             
             result = response.json()
+            status = "success"
+            
+            # 记录 token 消耗
+            usage = result.get('usage', {})
+            AI_TOKENS.labels(model, "prompt").inc(usage.get('prompt_tokens', 0))
+            AI_TOKENS.labels(model, "completion").inc(usage.get('completion_tokens', 0))
             
             # 记录使用情况
             self._record_usage(result)
@@ -137,6 +167,9 @@ class DeepSeekService:
         except Exception as e:
             logger.error(f"DeepSeek API 调用失败: {e}")
             raise
+        
+        finally:
+            AI_CALL_SECONDS.labels(model, status).observe(time.perf_counter() - start)
     
     def _check_daily_limit(self) -> bool:
         """检查每日调用限制"""
@@ -290,8 +323,8 @@ class DeepSeekService:
             }
     
     async def close(self):
-        """关闭客户端"""
-        await self.client.aclose()
+        """关闭客户端（连接属于共享连接池，由应用关闭时统一释放）"""
+        pass
 
 
 # 全局 DeepSeek 服务实例
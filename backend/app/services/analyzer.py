@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 from loguru import logger
 
 from app.config import config
+from app.models.trade import trade_column, trade_value_counts
 
 
 class AnalyzerService:
@@ -32,7 +33,7 @@ class AnalyzerService:
             wallet_data["metrics"]["smart_money_score"] = score
             
             return wallet_data
-            
+        
         except Exception as e:
             logger.error(f"分析钱包失败: {e}")
             return wallet_data
@@ -49,18 +50,18 @@ class AnalyzerService:
         initial_capital = total_deposits - total_withdrawals
         
         # 计算总盈亏
-        total_pnl = sum(t.get("pnl", 0) for t in trades)
+        pnls = trade_column(trades, "pnl")
+        total_pnl = sum(pnls)
         
         # 计算 ROI
         roi = (total_pnl / initial_capital * 100) if initial_capital > 0 else 0
         
-        # 计算胜率
-        winning_trades = [t for t in trades if t.get("pnl", 0) > 0]
-        win_rate = len(winning_trades) / len(trades) if trades else 0
-        
         # 计算盈亏比
-        profits = [t.get("pnl", 0) for t in winning_trades]
-        losses = [abs(t.get("pnl", 0)) for t in trades if t.get("pnl", 0) < 0]
+        profits = [pnl for pnl in pnls if pnl > 0]
+        losses = [-pnl for pnl in pnls if pnl < 0]
+        
+        # 计算胜率
+        win_rate = len(profits) / len(trades) if trades else 0
         
         avg_profit = sum(profits) / len(profits) if profits else 0
         avg_loss = sum(losses) / len(losses) if losses else 0
@@ -90,7 +91,7 @@ class AnalyzerService:
             }
         
         # 计算收益序列
-        pnls = [t.get("pnl", 0) for t in trades]
+        pnls = trade_column(trades, "pnl")
         
         # 计算波动率（标准差）
         import statistics
@@ -125,10 +126,8 @@ class AnalyzerService:
             return {}
         
         # 多空偏好
-        long_trades = [t for t in trades if t.get("side") == "long"]
-        short_trades = [t for t in trades if t.get("side") == "short"]
-        
-        long_ratio = len(long_trades) / len(trades) if trades else 0
+        side_counts = trade_value_counts(trades, "side")
+        long_ratio = side_counts.get("long", 0) / len(trades) if trades else 0
         
         if long_ratio > 0.6:
             preference = "long"
@@ -146,7 +145,7 @@ class AnalyzerService:
             frequency = "low"
         
         # 持仓周期
-        holding_times = [t.get("holding_time_minutes", 0) for t in trades]
+        holding_times = trade_column(trades, "holding_time_minutes")
         avg_holding = sum(holding_times) / len(holding_times) if holding_times else 0
         
         if avg_holding < 60:
@@ -157,10 +156,7 @@ class AnalyzerService:
             holding_period = "long"
         
         # 币种偏好
-        symbols = {}
-        for t in trades:
-            symbol = t.get("symbol", "")
-            symbols[symbol] = symbols.get(symbol, 0) + 1
+        symbols = trade_value_counts(trades, "symbol")
         
         coin_preference = sorted(symbols.items(), key=lambda x: x[1], reverse=True)[:5]
         coin_preference = [c[0] for c in coin_preference]
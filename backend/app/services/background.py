@@ -0,0 +1,145 @@
+"""
+后台任务启停
+数据采集调度器、推送采集、导入任务接管、AI 调度器的统一启停，API 进程（collector.run_in_api 开启时）
+和独立采集进程（python -m app.collector）共用；开启选主时只有主进程运行。
+"""
+from loguru import logger
+
+from app.config import config
+from app.services.scheduler import scheduler
+from app.services.ws_ingest import ws_ingest
+from app.services.ai.ai_scheduler import ai_scheduler
+from app.services.leader import leader_election
+from app.services.import_manager import import_manager
+from app.services.hyperliquid import cancel_inflight_requests
+
+
+def run_in_api() -> bool:
+    """后台任务是否在 API 进程内运行（关闭时由独立采集进程负责）"""
+    return config.get_config("system").get("collector", {}).get("run_in_api", True)
+
+
+async def start_background_services(data: bool = True, ingest: bool = True, ai: bool = True):
+    """
+    启动后台任务
+    
+    开启 collector.leader_election 时先参与选主，只有当选的进程运行后台任务，
+    失去主进程身份时停止，其他进程接管。
+    同时开启 collector.sharding 时数据采集调度器不参与选主：每个进程都刷新自己的分片，
+    单例定时任务在调度器内按主进程租约执行。
+    
+    Args:
+        data: 是否启动数据采集调度器
+        ingest: 是否启动推送采集
+        ai: 是否启动 AI 调度器
+    """
+    if leader_election.enabled:
+        sharded = data and scheduler.shards.enabled
+        if sharded:
+            logger.warning("⚠️ 同时开启了分片采集和选主：各进程都刷新自己的分片，推送采集、导入接管、AI 调度和单例定时任务只在主进程运行")
+            _start_scheduler()
+        await leader_election.start(
+            on_elected=lambda: _start_services(data and not sharded, ingest, ai),
+            on_demoted=lambda: _stop_services(data=not sharded)
+        )
+    else:
+        await _start_services(data, ingest, ai)
+
+
+async def stop_background_services():
+    """停止后台任务（选主时同时释放租约），并取消仍在进行的 HyperLiquid 请求"""
+    await leader_election.stop()
+    await _stop_services()
+    try:
+        await cancel_inflight_requests()
+    except Exception as e:
+        logger.error(f"取消进行中的请求失败: {e}")
+
+
+def _start_scheduler():
+    """启动数据采集调度器（配置关闭时跳过）"""
+    try:
+        scheduler_enabled = config.get_config("system").get("scheduler", {}).get("enabled", True)
+        if scheduler_enabled:
+            logger.info("⏰ 启动数据采集调度器...")
+            scheduler.start()
+        else:
+            logger.info("⏰ 调度器已禁用")
+    except Exception as e:
+        logger.error(f"❌ 调度器启动失败: {e}")
+
+
+async def _start_services(data: bool, ingest: bool, ai: bool):
+    """
+    启动各项后台任务（各项按配置开关，单项失败不影响其他项）
+    
+    Args:
+        data: 是否启动数据采集调度器
+        ingest: 是否启动推送采集
+        ai: 是否启动 AI 调度器
+    """
+    # 启动数据采集调度器
+    if data:
+        _start_scheduler()
+    
+    # 启动推送采集（轮询调度器保留，用于对账）
+    try:
+        if ingest and ws_ingest.is_enabled():
+            logger.info("📡 启动 HyperLiquid 推送采集...")
+            await ws_ingest.start()
+    except Exception as e:
+        logger.error(f"❌ 推送采集启动失败: {e}")
+    
+    # 继续未完成的导入任务
+    try:
+        import_manager.start()
+    except Exception as e:
+        logger.error(f"❌ 导入任务接管启动失败: {e}")
+    
+    # 启动 AI 调度器
+    try:
+        ai_enabled = config.get_config("ai").get("enabled", False)
+        if ai and ai_enabled:
+            logger.info("🤖 启动 AI 调度器...")
+            await ai_scheduler.start()
+        else:
+            logger.info("🤖 AI 调度器已禁用")
+    except Exception as e:
+        logger.error(f"❌ AI 调度器启动失败: {e}")
+
+
+async def _stop_services(data: bool = True):
+    """
+    停止各项后台任务（未启动的项跳过）
+    
+    Args:
+        data: 是否停止数据采集调度器（分片采集时降级不停止）
+    """
+    # 停止调度器
+    try:
+        if data and scheduler.is_running:
+            scheduler.stop()
+    except Exception as e:
+        logger.error(f"停止调度器失败: {e}")
+    
+    # 停止推送采集
+    try:
+        await ws_ingest.stop()
+    except Exception as e:
+        logger.error(f"停止推送采集失败: {e}")
+    
+    # 中断导入任务（进度已保存，下次启动继续）
+    try:
+        await import_manager.stop()
+    except Exception as e:
+        logger.error(f"停止导入任务失败: {e}")
+    
+    # 停止 AI 调度器
+    try:
+        ai_scheduler.stop()
+    except Exception as e:
+        logger.error(f"停止 AI 调度器失败: {e}")
+
+
+# 导出
+__all__ = ['run_in_api', 'start_background_services', 'stop_background_services']
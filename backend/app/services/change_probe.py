@@ -0,0 +1,151 @@
+"""
+钱包变化探测
+完整刷新前先发一个小请求（游标之后的成交）与上次完整刷新时记录的指纹比较，
+没有变化就跳过完整刷新（5 个 info 请求 + 指标/评分/入库）。
+
+有未平仓持仓的钱包不跳过：不交易时标记价格、未实现盈亏、强平价、账户价值也在变化。
+"""
+import time
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Sequence
+
+from app.database import db
+from app.config import config
+from app.models.trade import trade_column
+from app.utils.metrics import registry
+
+# 探测指标
+PROBE_RESULTS = registry.counter(
+    "scheduler_refresh_probes",
+    "刷新前变化探测结果（unchanged 表示跳过了完整刷新）",
+    ["result"]
+)
+
+# 每次完整刷新的 info 请求数，探测本身占 1 个
+_FULL_REFRESH_REQUESTS = 5
+
+DEFAULT_PROBE_CONFIG = {
+    "enabled": True,
+    "max_skip_seconds": 21600  # 超过该时长未完整刷新时不再探测，直接完整刷新（兜底资金流水等探测不到的变化）
+}
+
+
+def fills_fingerprint(hashes: Iterable[str]) -> str:
+    """成交哈希集合的指纹（与顺序无关）"""
+    digest = hashlib.sha1()
+    for fill_hash in sorted(hashes):
+        digest.update((fill_hash or "").encode())
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+class ChangeProbe:
+    """
+    基于成交游标的变化探测
+    
+    完整刷新后记录：游标 = 最后一笔成交所在秒（毫秒），指纹 = 该秒内所有成交的哈希。
+    探测时请求游标之后的成交（userFillsByTime，通常为空或只有游标那一秒的几笔），
+    结果指纹与记录一致说明没有新成交。
+    
+    跳过完整刷新时把 wallets.last_updated 更新为探测时间（数据已确认是最新的），
+    界面显示的更新时间和派发器重启后计算的到期时间都以此为准。
+    """
+    
+    def __init__(self, settings: Optional[Dict[str, Any]] = None):
+        settings = {**DEFAULT_PROBE_CONFIG, **(settings or {})}
+        self.enabled = settings["enabled"]
+        self.max_skip_seconds = settings["max_skip_seconds"]
+        self._counts = {
+            "unchanged": 0, "changed": 0, "forced": 0, "open_positions": 0, "no_fingerprint": 0, "error": 0
+        }
+    
+    def remember(self, address: str, trades: Any):
+        """
+        完整刷新后记录游标和指纹
+        
+        Args:
+            address: 钱包地址
+            trades: 本次获取的全部交易（TradeBatch 或交易字典列表，时间为秒）
+        """
+        timestamps: Sequence[int] = trade_column(trades, "timestamp")
+        if len(timestamps):
+            last_second = max(timestamps)
+            hashes = trade_column(trades, "hash", "")
+            fingerprint = fills_fingerprint(
+                h for t, h in zip(timestamps, hashes) if t == last_second
+            )
+            cursor = int(last_second) * 1000
+        else:
+            fingerprint = fills_fingerprint([])
+            cursor = 0
+        
+        db.execute("""
+            INSERT INTO wallet_fingerprint (wallet_address, cursor_ms, fingerprint, refreshed_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(wallet_address) DO UPDATE SET
+                cursor_ms = excluded.cursor_ms,
+                fingerprint = excluded.fingerprint,
+                refreshed_at = excluded.refreshed_at
+        """, (address, cursor, fingerprint, time.time()))
+    
+    def _result(self, result: str) -> bool:
+        self._counts[result] += 1
+        PROBE_RESULTS.labels(result).inc()
+        return result == "unchanged"
+    
+    async def unchanged(self, address: str, client) -> bool:
+        """
+        探测钱包自上次完整刷新后是否没有变化
+        
+        Args:
+            address: 钱包地址
+            client: HyperLiquidClient
+        
+        Returns:
+            True 表示可以跳过完整刷新
+        """
+        row = db.fetch_one(
+            "SELECT cursor_ms, fingerprint, refreshed_at FROM wallet_fingerprint WHERE wallet_address = ?",
+            (address,)
+        )
+        if not row:
+            return self._result("no_fingerprint")
+        
+        if time.time() - (row["refreshed_at"] or 0) >= self.max_skip_seconds:
+            return self._result("forced")
+        
+        # 上次完整刷新时有持仓：盈亏、强平价随价格变化，必须完整刷新
+        if db.fetch_one("SELECT 1 FROM positions WHERE wallet_address = ? LIMIT 1", (address,)):
+            return self._result("open_positions")
+        
+        fills = await client.get_fills_since(address, row["cursor_ms"] or 0)
+        if fills is None:
+            return self._result("error")
+        
+        if fills_fingerprint(f.get("hash", "") for f in fills) == row["fingerprint"]:
+            db.execute(
+                "UPDATE wallets SET last_updated = ? WHERE address = ?",
+                (datetime.now().isoformat(), address)
+            )
+            return self._result("unchanged")
+        return self._result("changed")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        total = sum(self._counts.values())
+        skipped = self._counts["unchanged"]
+        return {
+            "enabled": self.enabled,
+            "probes": total,
+            "results": dict(self._counts),
+            "skip_rate": round(skipped / total, 4) if total else 0,
+            "requests_saved": skipped * (_FULL_REFRESH_REQUESTS - 1)
+        }
+
+
+# 全局变化探测实例
+change_probe = ChangeProbe(config.get_config("system").get("scheduler", {}).get("probe"))
+
+
+# 导出
+__all__ = ['ChangeProbe', 'change_probe', 'fills_fingerprint']
@@ -0,0 +1,294 @@
+"""
+进程级共享 HTTP 连接池
+所有外部 API（HyperLiquid、DeepSeek 等）共用按名称管理的 httpx.AsyncClient，
+连接在各子系统之间复用，并在应用关闭时统一释放。
+
+特性：
+- 可配置连接池上限和 keep-alive 过期时间
+- 安装了 h2 时启用 HTTP/2 多路复用（否则回退 HTTP/1.1）
+- 新建连接时的 DNS 解析结果按 TTL 缓存
+"""
+import time
+import socket
+import asyncio
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, Any, Iterator, Optional, Tuple, List
+
+import httpx
+import httpcore
+from loguru import logger
+
+from app.config import config
+from app.utils.metrics import registry
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# 连接指标
+HTTP_CONNECTIONS_OPENED = registry.counter(
+    "http_connections_opened",
+    "共享连接池新建的 TCP 连接数",
+    ["host"]
+)
+HTTP_DNS_LOOKUPS = registry.counter(
+    "http_dns_lookups",
+    "共享连接池 DNS 解析次数",
+    ["result"]
+)
+
+# 默认连接池配置（可在 system.json 的 http 段覆盖）
+DEFAULT_HTTP_CONFIG = {
+    "max_connections": 100,
+    "max_keepalive_connections": 20,
+    "keepalive_expiry": 60,
+    "connect_timeout": 10,
+    "http2": True,
+    "dns_ttl": 300
+}
+
+
+class CachingDNSBackend(httpcore.AsyncNetworkBackend):
+    """带 DNS 缓存的网络后端（只影响新建连接，TLS 仍按原主机名校验）"""
+    
+    def __init__(self, ttl: float = 300):
+        self.ttl = ttl
+        self._backend = httpcore.AnyIOBackend()
+        self._cache: Dict[Tuple[str, int], Tuple[float, List[str]]] = {}
+    
+    async def _resolve(self, host: str, port: int) -> List[str]:
+        """解析主机名（命中缓存直接返回）"""
+        key = (host, port)
+        cached = self._cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            HTTP_DNS_LOOKUPS.labels("hit").inc()
+            return cached[1]
+        
+        HTTP_DNS_LOOKUPS.labels("miss").inc()
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        self._cache[key] = (time.monotonic() + self.ttl, addresses)
+        return addresses
+    
+    async def connect_tcp(
+        self,
+        host: str,
+        port: int,
+        timeout: Optional[float] = None,
+        local_address: Optional[str] = None,
+        socket_options=None
+    ) -> httpcore.AsyncNetworkStream:
+        HTTP_CONNECTIONS_OPENED.labels(host).inc()
+        
+        try:
+            addresses = await self._resolve(host, port) if self.ttl > 0 else [host]
+        except OSError:
+            addresses = [host]
+        
+        last_error = None
+        for address in addresses:
+            try:
+                return await self._backend.connect_tcp(
+                    address, port,
+                    timeout=timeout,
+                    local_address=local_address,
+                    socket_options=socket_options
+                )
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                last_error = e
+        
+        # 所有地址都连不上，丢弃缓存以便下次重新解析
+        self._cache.pop((host, port), None)
+        raise last_error
+    
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self._backend.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+    
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+
+# httpcore 异常 -> httpx 异常（调用方只处理 httpx 异常）
+_EXCEPTION_MAP = [
+    (httpcore.ConnectTimeout, httpx.ConnectTimeout),
+    (httpcore.ReadTimeout, httpx.ReadTimeout),
+    (httpcore.WriteTimeout, httpx.WriteTimeout),
+    (httpcore.PoolTimeout, httpx.PoolTimeout),
+    (httpcore.TimeoutException, httpx.TimeoutException),
+    (httpcore.ConnectError, httpx.ConnectError),
+    (httpcore.ReadError, httpx.ReadError),
+    (httpcore.WriteError, httpx.WriteError),
+    (httpcore.NetworkError, httpx.NetworkError),
+    (httpcore.ProxyError, httpx.ProxyError),
+    (httpcore.UnsupportedProtocol, httpx.UnsupportedProtocol),
+    (httpcore.LocalProtocolError, httpx.LocalProtocolError),
+    (httpcore.RemoteProtocolError, httpx.RemoteProtocolError),
+    (httpcore.ProtocolError, httpx.ProtocolError),
+]
+
+
+@contextmanager
+def _map_exceptions() -> Iterator[None]:
+    try:
+        yield
+    except Exception as e:
+        for source, target in _EXCEPTION_MAP:
+            if isinstance(e, source):
+                raise target(str(e)) from e
+        raise
+
+
+class _ResponseStream(httpx.AsyncByteStream):
+    def __init__(self, stream: AsyncIterator[bytes]):
+        self._stream = stream
+    
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        with _map_exceptions():
+            async for part in self._stream:
+                yield part
+    
+    async def aclose(self):
+        if hasattr(self._stream, "aclose"):
+            await self._stream.aclose()
+
+
+class PooledTransport(httpx.AsyncBaseTransport):
+    """
+    基于 httpcore.AsyncConnectionPool 的 httpx 传输层
+    
+    httpx.AsyncHTTPTransport 不能指定网络后端，这里直接用 httpcore 的公开接口创建连接池，
+    DNS 缓存后端通过 network_backend 参数传入。
+    """
+    
+    def __init__(
+        self,
+        limits: httpx.Limits,
+        http2: bool,
+        network_backend: Optional[httpcore.AsyncNetworkBackend] = None
+    ):
+        self.pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            http1=True,
+            http2=http2,
+            network_backend=network_backend
+        )
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        core_request = httpcore.Request(
+            method=request.method,
+            url=httpcore.URL(
+                scheme=request.url.raw_scheme,
+                host=request.url.raw_host,
+                port=request.url.port,
+                target=request.url.raw_path
+            ),
+            headers=request.headers.raw,
+            content=request.stream,
+            extensions=request.extensions
+        )
+        with _map_exceptions():
+            response = await self.pool.handle_async_request(core_request)
+        return httpx.Response(
+            status_code=response.status,
+            headers=response.headers,
+            stream=_ResponseStream(response.stream),
+            extensions=response.extensions
+        )
+    
+    async def aclose(self):
+        await self.pool.aclose()
+
+
+class HttpClientPool:
+    """共享 HTTP 客户端管理器"""
+    
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._transports: Dict[str, PooledTransport] = {}
+        self._dns_backend: Optional[CachingDNSBackend] = None
+    
+    def _get_settings(self) -> Dict[str, Any]:
+        """读取连接池配置"""
+        settings = dict(DEFAULT_HTTP_CONFIG)
+        settings.update(config.get_config("system").get("http", {}))
+        return settings
+    
+    def get_client(self, name: str = "default", timeout: float = 30.0) -> httpx.AsyncClient:
+        """
+        获取共享客户端（不存在或已关闭时创建）
+        
+        Args:
+            name: 客户端名称（同名共用一个连接池）
+            timeout: 读写超时（秒），只在首次创建时生效
+        
+        Returns:
+            httpx.AsyncClient
+        """
+        client = self._clients.get(name)
+        if client is not None and not client.is_closed:
+            return client
+        
+        client, transport = self._create_client(timeout)
+        self._clients[name] = client
+        self._transports[name] = transport
+        return client
+    
+    def _create_client(self, timeout: float) -> Tuple[httpx.AsyncClient, PooledTransport]:
+        """按配置创建客户端"""
+        settings = self._get_settings()
+        http2 = bool(settings["http2"]) and HTTP2_AVAILABLE
+        if settings["http2"] and not HTTP2_AVAILABLE:
+            logger.warning("未安装 h2，共享连接池回退到 HTTP/1.1（pip install 'httpx[http2]'）")
+        
+        limits = httpx.Limits(
+            max_connections=settings["max_connections"],
+            max_keepalive_connections=settings["max_keepalive_connections"],
+            keepalive_expiry=settings["keepalive_expiry"]
+        )
+        if self._dns_backend is None:
+            self._dns_backend = CachingDNSBackend(ttl=settings["dns_ttl"])
+        transport = PooledTransport(limits, http2, network_backend=self._dns_backend)
+        
+        client = httpx.AsyncClient(
+            transport=transport,
+            timeout=httpx.Timeout(timeout, connect=settings["connect_timeout"]),
+            http2=http2
+        )
+        return client, transport
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """连接池状态"""
+        stats = {}
+        for name, client in self._clients.items():
+            connections = self._transports[name].pool.connections
+            stats[name] = {
+                'closed': client.is_closed,
+                'connections': len(connections),
+                'idle': sum(1 for c in connections if c.is_idle()),
+                'http2': any(c.info().startswith("HTTP/2") for c in connections)
+            }
+        return stats
+    
+    async def close(self):
+        """关闭所有共享客户端"""
+        for name, client in list(self._clients.items()):
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.error(f"关闭 HTTP 客户端失败 ({name}): {e}")
+        self._clients.clear()
+        self._transports.clear()
+        logger.info("🔌 共享 HTTP 连接池已关闭")
+
+
+# 全局共享连接池
+http_pool = HttpClientPool()
+
+
+# 导出
+__all__ = ['http_pool', 'HttpClientPool', 'HTTP2_AVAILABLE']
@@ -1,11 +1,98 @@
 """HyperLiquid API 客户端"""
+import json
 import httpx
 import asyncio
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Callable, Awaitable, AsyncIterator
 from datetime import datetime, timedelta
 from loguru import logger
 
 from app.config import config
+from app.services.http_pool import http_pool
+from app.utils.metrics import registry
+from app.utils.tracing import tracer
+from app.utils.cache import TTLCache, SingleFlight, MISSING
+from app.utils.concurrency import AdaptiveLimiter, CircuitBreaker, SUCCESS, RATE_LIMITED, TIMEOUT, ERROR
+from app.utils.json_stream import iter_json_array
+from app.models.trade import TradeBatch, trade_column
+
+# info 请求的短期缓存 TTL（秒，0 为不缓存）；可在 system.json 的 cache.api_ttl_by_type 覆盖
+DEFAULT_CACHE_TTLS = {
+    "clearinghouseState": 5,
+    "frontendOpenOrders": 5,
+    "portfolio": 30,
+    "userFills": 10,
+    "userFillsByTime": 30,
+    "userNonFundingLedgerUpdates": 60
+}
+
+# HyperLiquid 请求指标（按 info type）
+HL_REQUEST_SECONDS = registry.histogram(
+    "hyperliquid_request_duration_seconds",
+    "HyperLiquid info 请求耗时",
+    ["type"]
+)
+HL_REQUESTS = registry.counter(
+    "hyperliquid_requests",
+    "HyperLiquid info 请求数",
+    ["type", "status"]
+)
+HL_RESPONSE_BYTES = registry.counter(
+    "hyperliquid_response_bytes",
+    "HyperLiquid info 响应字节数",
+    ["type"]
+)
+HL_RATE_LIMITED = registry.counter(
+    "hyperliquid_rate_limited",
+    "HyperLiquid 返回 429 的次数",
+    ["type"]
+)
+
+HL_CACHE_REQUESTS = registry.counter(
+    "hyperliquid_cache_requests",
+    "HyperLiquid info 请求缓存结果（hit / miss / coalesced）",
+    ["type", "result"]
+)
+HL_CACHE_ENTRIES = registry.gauge(
+    "hyperliquid_cache_entries",
+    "HyperLiquid 响应缓存条目数"
+)
+
+# 进程内共享的响应缓存和请求合并（所有客户端实例共用）
+_cache_config = config.get_config("system").get("cache", {})
+_response_cache = TTLCache(max_entries=_cache_config.get("api_cache_max_entries", 2000))
+_single_flight = SingleFlight()
+
+
+async def cancel_inflight_requests():
+    """取消所有合并中的 info 请求（关闭时调用，避免请求对已关闭的连接池继续重试）"""
+    cancelled = await _single_flight.cancel_all()
+    if cancelled:
+        logger.info(f"已取消 {cancelled} 个进行中的 HyperLiquid 请求")
+
+
+# 采集并发控制（所有请求的结果都会反馈给它；批量采集按它的上限派发钱包）
+_collector_config = config.get_config("system").get("collector", {})
+hl_limiter = AdaptiveLimiter(
+    "hyperliquid",
+    initial_limit=_collector_config.get("initial_limit", 5),
+    min_limit=_collector_config.get("min_limit", 1),
+    max_limit=_collector_config.get("max_limit", 32),
+    latency_target=_collector_config.get("latency_target", 2.0),
+    decrease_factor=_collector_config.get("decrease_factor", 0.5),
+    breaker=CircuitBreaker(
+        "hyperliquid",
+        failure_rate=_collector_config.get("breaker_failure_rate", 0.5),
+        min_requests=_collector_config.get("breaker_min_requests", 20),
+        window_seconds=_collector_config.get("breaker_window", 30),
+        open_seconds=_collector_config.get("breaker_open_seconds", 30)
+    )
+)
+
+
+def _cache_ttl(request_type: str) -> float:
+    """获取请求类型的缓存 TTL"""
+    ttls = config.get_config("system").get("cache", {}).get("api_ttl_by_type", {})
+    return ttls.get(request_type, DEFAULT_CACHE_TTLS.get(request_type, 0))
 
 
 class HyperLiquidClient:
@@ -23,12 +110,6 @@ class HyperLiquidClient:
         self.retry_times = config.get_config("system").get("api", {}).get("retry_times", 3)
         self.rate_limit_delay = config.get_config("system").get("api", {}).get("rate_limit_delay", 0.2)  # 限流延迟
         
-        # 禁用代理
-        self.client = httpx.AsyncClient(
-            timeout=self.timeout,
-            proxies=None  # 明确禁用代理
-        )
-        
         # 是否使用 Mock 数据
         if use_mock is not None:
             self.use_mock = use_mock
@@ -39,15 +120,39 @@ class HyperLiquidClient:
         self._request_count = 0
         self._last_request_time = 0
     
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """共享连接池中的 HyperLiquid 客户端（各子系统复用连接）"""
+        return http_pool.get_client("hyperliquid", timeout=self.timeout)
+    
     async def get_wallet_data(self, address: str) -> Dict[str, Any]:
         """获取钱包完整数据"""
+        raw = await self.fetch_wallet_raw(address)
+        try:
+            wallet_data = self.build_wallet_data(address, raw)
+        except Exception as e:
+            logger.error(f"❌ 处理钱包数据失败 {address}: {e}")
+            logger.warning(f"⚠️ 回退到 Mock 数据")
+            return self._generate_mock_wallet_data(address)
+        
+        if "wallet_data" not in raw:
+            logger.info(f"✅ 成功获取钱包数据: {address}")
+        return wallet_data
+    
+    async def fetch_wallet_raw(self, address: str) -> Dict[str, Any]:
+        """
+        获取钱包原始数据（只做网络请求，处理交给 build_wallet_data，可在其他进程中执行）
+        
+        Returns:
+            原始数据字典；Mock 模式或获取失败时为 {"wallet_data": 已处理的 Mock 数据}
+        """
         if self.use_mock:
             logger.warning(f"⚠️ 使用 Mock 数据获取钱包: {address}")
-            return self._generate_mock_wallet_data(address)
+            return {"wallet_data": self._generate_mock_wallet_data(address)}
         
         try:
-            # 获取所有交易历史（处理分页）
-            fills = await self.get_user_fills_all(address)
+            # 获取所有交易历史（处理分页，流式解码为交易记录）
+            trades = await self.get_user_trades_all(address)
             
             # 获取账户价值历史
             portfolio = await self.get_user_portfolio(address)
@@ -61,28 +166,88 @@ class HyperLiquidClient:
             # 获取转账记录（存款/取款）
             transfers = await self.get_user_transfers(address)
             
-            # 处理数据
-            wallet_data = self._process_wallet_data(
-                address, fills, portfolio, open_orders, clearinghouse_state, transfers
-            )
-            
-            logger.info(f"✅ 成功获取钱包数据: {address}")
-            return wallet_data
-            
+            return {
+                "trades": trades,
+                "portfolio": portfolio,
+                "open_orders": open_orders,
+                "clearinghouse_state": clearinghouse_state,
+                "transfers": transfers
+            }
+        
         except Exception as e:
             logger.error(f"❌ 获取钱包数据失败 {address}: {e}")
             # 失败时返回 Mock 数据
             logger.warning(f"⚠️ 回退到 Mock 数据")
-            return self._generate_mock_wallet_data(address)
+            return {"wallet_data": self._generate_mock_wallet_data(address)}
+    
+    def build_wallet_data(self, address: str, raw: Dict[str, Any]) -> Dict[str, Any]:
+        """把 fetch_wallet_raw 的结果处理为钱包数据"""
+        if "wallet_data" in raw:
+            return raw["wallet_data"]
+        
+        trades = raw["trades"]
+        with tracer.span("parse", fills=len(trades)):
+            return self._process_wallet_data(
+                address, [], raw["portfolio"], raw["open_orders"], raw["clearinghouse_state"], raw["transfers"],
+                trades=trades
+            )
     
-    async def _make_request(self, request_data: Dict[str, Any], retry_count: int = 0) -> Any:
+    async def _make_request(
+        self,
+        request_data: Dict[str, Any],
+        parser: Optional[Callable[[AsyncIterator[bytes]], Awaitable[Any]]] = None
+    ) -> Any:
+        """
+        发起 API 请求（先查短期缓存，并合并并发的相同请求）
+        
+        缓存的响应在多个调用方之间共享，调用方不应修改返回值。
+        
+        Args:
+            request_data: 请求数据
+            parser: 流式解析函数（接收响应字节流），不传则整体 json 解析
+        
+        Returns:
+            API 响应数据（或 parser 的返回值）
+        """
+        request_type = request_data.get("type", "unknown")
+        ttl = _cache_ttl(request_type)
+        key = json.dumps(request_data, sort_keys=True)
+        if parser is not None:
+            key += "|" + parser.__name__
+        
+        if ttl > 0:
+            cached = _response_cache.get(key)
+            if cached is not MISSING:
+                HL_CACHE_REQUESTS.labels(request_type, "hit").inc()
+                return cached
+        
+        if _single_flight.is_inflight(key):
+            HL_CACHE_REQUESTS.labels(request_type, "coalesced").inc()
+        else:
+            HL_CACHE_REQUESTS.labels(request_type, "miss").inc()
+        
+        async def fetch():
+            result = await self._send_request(request_data, parser=parser)
+            _response_cache.set(key, result, ttl)
+            HL_CACHE_ENTRIES.set(len(_response_cache))
+            return result
+        
+        return await _single_flight.do(key, fetch)
+    
+    async def _send_request(
+        self,
+        request_data: Dict[str, Any],
+        retry_count: int = 0,
+        parser: Optional[Callable[[AsyncIterator[bytes]], Awaitable[Any]]] = None
+    ) -> Any:
         """
         发起 API 请求（带重试和限流）
         
         Args:
             request_data: 请求数据
             retry_count: 当前重试次数
-            
+            parser: 流式解析函数，传入时边接收边解析，不缓存完整响应体
+        
         Returns:
             API 响应数据
         """
@@ -92,39 +257,64 @@ class HyperLiquidClient:
         if current_time - self._last_request_time < self.rate_limit_delay:
             await asyncio.sleep(self.rate_limit_delay)
         
+        request_type = request_data.get("type", "unknown")
+        start = time.perf_counter()
+        
         try:
-            response = await self.client.post(
-                self.base_url,
-                json=request_data,
-                headers={"Content-Type": "application/json"}
-            )
-            
-            self._last_request_time = time.time()
-            self._request_count += 1
-            
-            response.raise_for_status()
-            return response.json()
-            
+            with tracer.span(f"hyperliquid.{request_type}", attempt=retry_count, streamed=parser is not None) as span:
+                if parser is None:
+                    response = await self.client.post(
+                        self.base_url,
+                        json=request_data,
+                        headers={"Content-Type": "application/json"}
+                    )
+                    self._record_response(request_type, response, len(response.content), start, span)
+                    response.raise_for_status()
+                    hl_limiter.record(SUCCESS, time.perf_counter() - start)
+                    return response.json()
+                
+                async with self.client.stream(
+                    "POST",
+                    self.base_url,
+                    json=request_data,
+                    headers={"Content-Type": "application/json"}
+                ) as response:
+                    if response.status_code >= 400:
+                        await response.aread()
+                        self._record_response(request_type, response, len(response.content), start, span)
+                        response.raise_for_status()
+                    
+                    result = await parser(response.aiter_bytes())
+                    self._record_response(request_type, response, response.num_bytes_downloaded, start, span)
+                    hl_limiter.record(SUCCESS, time.perf_counter() - start)
+                    return result
+        
         except httpx.HTTPStatusError as e:
             if e.response.status_code == 429:  # 限流
+                HL_RATE_LIMITED.labels(request_type).inc()
+                hl_limiter.record(RATE_LIMITED)
                 if retry_count < self.retry_times:
                     wait_time = (retry_count + 1) * 2  # 指数退避
                     logger.warning(f"触发限流，等待 {wait_time} 秒后重试...")
                     await asyncio.sleep(wait_time)
-                    return await self._make_request(request_data, retry_count + 1)
+                    return await self._send_request(request_data, retry_count + 1, parser)
                 else:
                     logger.error(f"达到最大重试次数，请求失败")
                     raise
             else:
+                if e.response.status_code >= 500:
+                    hl_limiter.record(ERROR)
                 logger.error(f"HTTP 错误: {e.response.status_code}")
                 raise
-                
+        
         except httpx.RequestError as e:
+            HL_REQUESTS.labels(request_type, "error").inc()
+            hl_limiter.record(TIMEOUT if isinstance(e, httpx.TimeoutException) else ERROR)
             if retry_count < self.retry_times:
                 wait_time = (retry_count + 1) * 1
                 logger.warning(f"请求错误，{wait_time} 秒后重试: {e}")
                 await asyncio.sleep(wait_time)
-                return await self._make_request(request_data, retry_count + 1)
+                return await self._send_request(request_data, retry_count + 1, parser)
             else:
                 logger.error(f"达到最大重试次数，请求失败: {e}")
                 raise
@@ -133,6 +323,18 @@ class HyperLiquidClient:
             logger.error(f"未知错误: {e}")
             raise
     
+    def _record_response(self, request_type: str, response: httpx.Response, size: int, start: float, span):
+        """记录请求指标"""
+        import time
+        self._last_request_time = time.time()
+        self._request_count += 1
+        
+        HL_REQUEST_SECONDS.labels(request_type).observe(time.perf_counter() - start)
+        HL_REQUESTS.labels(request_type, response.status_code).inc()
+        HL_RESPONSE_BYTES.labels(request_type).inc(size)
+        if span:
+            span.set(status=response.status_code, bytes=size)
+    
     async def get_user_fills(self, address: str, start_time: Optional[int] = None) -> List[Dict[str, Any]]:
         """获取用户成交记录"""
         try:
@@ -152,11 +354,35 @@ class HyperLiquidClient:
             
             result = await self._make_request(request_data)
             return result if isinstance(result, list) else []
-            
+        
         except Exception as e:
             logger.error(f"获取成交记录失败: {e}")
             return []
     
+    async def get_fills_since(self, address: str, start_time: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        获取某时间之后的成交（用于变化探测）
+        
+        Args:
+            address: 钱包地址
+            start_time: 起始时间（毫秒，包含）
+        
+        Returns:
+            成交列表；请求失败返回 None（与"没有新成交"区分）
+        """
+        try:
+            request_data = {
+                "type": "userFillsByTime",
+                "user": address,
+                "startTime": start_time
+            }
+            result = await self._make_request(request_data)
+            return result if isinstance(result, list) else None
+        
+        except Exception as e:
+            logger.warning(f"变化探测请求失败 {address}: {e}")
+            return None
+    
     async def get_user_portfolio(self, address: str) -> Dict[str, Any]:
         """获取用户账户价值历史"""
         try:
@@ -167,7 +393,7 @@ class HyperLiquidClient:
             
             result = await self._make_request(request_data)
             return result if isinstance(result, dict) or isinstance(result, list) else {}
-            
+        
         except Exception as e:
             logger.error(f"获取账户价值历史失败: {e}")
             return {}
@@ -182,7 +408,7 @@ class HyperLiquidClient:
             
             result = await self._make_request(request_data)
             return result if isinstance(result, list) else []
-            
+        
         except Exception as e:
             logger.error(f"获取挂单失败: {e}")
             return []
@@ -197,7 +423,7 @@ class HyperLiquidClient:
             
             result = await self._make_request(request_data)
             return result if isinstance(result, dict) else {}
-            
+        
         except Exception as e:
             logger.error(f"获取清算所状态失败: {e}")
             return {}
@@ -222,7 +448,7 @@ class HyperLiquidClient:
                 return result["transfers"]
             else:
                 return []
-            
+        
         except Exception as e:
             logger.error(f"获取转账记录失败: {e}")
             return []
@@ -234,32 +460,31 @@ class HyperLiquidClient:
         portfolio: Dict[str, Any],
         open_orders: List[Dict[str, Any]],
         clearinghouse_state: Dict[str, Any],
-        transfers: List[Dict[str, Any]]
+        transfers: List[Dict[str, Any]],
+        trades: Optional[List[Dict[str, Any]]] = None
     ) -> Dict[str, Any]:
-        """处理钱包数据，转换为标准格式"""
-        # 处理交易记录
-        trades = []
-        for fill in fills:
-            trade = {
-                "timestamp": fill.get("time", 0) // 1000,  # 转换为秒
-                "symbol": fill.get("coin", ""),
-                "side": self._parse_side(fill.get("dir", "")),
-                "size": float(fill.get("sz", 0)),
-                "entry_price": float(fill.get("px", 0)),
-                "exit_price": float(fill.get("px", 0)),  # Fills 中只有成交价
-                "pnl": float(fill.get("closedPnl", 0)),
-                "holding_time_minutes": 0,  # 需要计算
-                "fees": float(fill.get("fee", 0)),
-                "trade_count": 1,
-                "hash": fill.get("hash", "")
-            }
-            trades.append(trade)
+        """
+        处理钱包数据，转换为标准格式
+        
+        Args:
+            trades: 已转换的交易记录（流式解码得到），传入时忽略 fills
+        
+        Returns:
+            标准格式的钱包数据，其中 trades 为 TradeBatch
+        """
+        # 处理交易记录（流式获取时已在解码阶段转换）
+        if trades is None:
+            trades = TradeBatch()
+            for fill in fills:
+                self._append_fill(trades, fill)
+        elif not isinstance(trades, TradeBatch):
+            trades = TradeBatch.from_trades(trades)
         
         # 按时间排序
-        trades.sort(key=lambda x: x["timestamp"])
+        trades.sort_by_time()
         
         # 计算第一笔交易时间
-        first_trade_time = datetime.fromtimestamp(trades[0]["timestamp"]) if trades else datetime.now()
+        first_trade_time = datetime.fromtimestamp(trades.timestamps[0]) if trades else datetime.now()
         
         # 处理账户价值历史
         equity_curve = self._process_portfolio(portfolio)
@@ -298,7 +523,7 @@ class HyperLiquidClient:
             "metrics": {
                 "total_pnl": total_pnl,
                 "roi": (total_pnl / initial_capital * 100) if initial_capital > 0 else 0,
-                "win_rate": len([t for t in trades if t["pnl"] > 0]) / len(trades) if trades else 0,
+                "win_rate": sum(1 for pnl in trades.pnls if pnl > 0) / len(trades) if trades else 0,
                 "profit_loss_ratio": self._calculate_profit_loss_ratio(trades),
                 "max_drawdown": 0,  # 需要计算
                 "current_balance": current_balance,
@@ -334,6 +559,35 @@ class HyperLiquidClient:
             "equity_curve": equity_curve
         }
     
+    def _append_fill(self, batch: TradeBatch, fill: Dict[str, Any]):
+        """把单条成交转换为交易记录追加到 batch"""
+        px = float(fill.get("px", 0))
+        batch.append(
+            fill.get("time", 0) // 1000,  # 转换为秒
+            fill.get("coin", ""),
+            self._parse_side(fill.get("dir", "")),
+            float(fill.get("sz", 0)),
+            px,
+            px,  # Fills 中只有成交价
+            float(fill.get("closedPnl", 0)),
+            float(fill.get("fee", 0)),
+            fill.get("hash", "")
+        )
+    
+    async def _decode_fills(self, chunks: AsyncIterator[bytes]) -> Tuple[TradeBatch, int, int]:
+        """
+        从响应字节流逐条解码成交并直接追加为交易记录（不保留原始成交列表）
+        
+        Returns:
+            (交易记录, 成交条数, 最后一条成交时间毫秒)
+        """
+        trades = TradeBatch()
+        last_time = 0
+        async for fill in iter_json_array(chunks):
+            self._append_fill(trades, fill)
+            last_time = fill.get("time", last_time)
+        return trades, len(trades), last_time
+    
     def _parse_side(self, direction: str) -> str:
         """解析交易方向"""
         direction_lower = direction.lower()
@@ -700,8 +954,9 @@ class HyperLiquidClient:
     
     def _calculate_profit_loss_ratio(self, trades: List[Dict]) -> float:
         """计算盈亏比"""
-        profits = [t["pnl"] for t in trades if t["pnl"] > 0]
-        losses = [abs(t["pnl"]) for t in trades if t["pnl"] < 0]
+        pnls = trade_column(trades, "pnl")
+        profits = [pnl for pnl in pnls if pnl > 0]
+        losses = [-pnl for pnl in pnls if pnl < 0]
         
         if not profits or not losses:
             return 1.0
@@ -740,7 +995,57 @@ class HyperLiquidClient:
         
         return all_fills
     
+    async def get_user_trades(
+        self,
+        address: str,
+        start_time: Optional[int] = None
+    ) -> Tuple[TradeBatch, int, int]:
+        """
+        流式获取一页成交并转换为交易记录
+        
+        Returns:
+            (交易记录, 成交条数, 最后一条成交时间毫秒)
+        """
+        if start_time:
+            request_data = {"type": "userFillsByTime", "user": address, "startTime": start_time}
+        else:
+            request_data = {"type": "userFills", "user": address}
+        
+        try:
+            return await self._make_request(request_data, parser=self._decode_fills)
+        except Exception as e:
+            logger.error(f"获取成交记录失败: {e}")
+            return TradeBatch(), 0, 0
+    
+    async def get_user_trades_all(self, address: str) -> TradeBatch:
+        """获取所有交易记录（分页方式同 get_user_fills_all，边下载边解码）"""
+        all_trades = TradeBatch()
+        start_time = None
+        
+        # 最多获取10000条（API限制）
+        max_iterations = 5  # 每次2000条，最多5次
+        
+        for i in range(max_iterations):
+            trades, count, last_time = await self.get_user_trades(address, start_time)
+            
+            if not count:
+                break
+            
+            all_trades.extend(trades)
+            
+            # 如果返回的数据少于2000条，说明已经获取完所有数据
+            if count < 2000:
+                break
+            
+            # 使用最后一条的时间戳作为下一次的 startTime
+            if last_time <= start_time if start_time else False:
+                break
+            
+            start_time = last_time
+        
+        return all_trades
+    
     async def close(self):
-        """关闭客户端"""
-        await self.client.aclose()
+        """关闭客户端（连接属于共享连接池，由应用关闭时统一释放）"""
+        pass
 
@@ -1,18 +1,32 @@
 """
 批量导入管理服务
 支持大批量钱包导入、实时进度追踪、失败重试
+
+任务和每个地址的处理状态保存在 import_tasks / import_task_items 表中，
+进程重启后未完成的任务从断点继续（只处理尚未完成的地址）。
+
+执行时按导入顺序分页读取尚未处理的地址，内存占用与任务大小无关；
+上传的文件边接收边解析、边写入任务，收到第一批地址即开始处理。
+
+采集进程独立运行时（collector.run_in_api 关闭），API 进程只创建任务和接收上传，
+任务交给采集进程的接管循环执行；计数按增量写库，接收方和执行方各自的计数不会互相覆盖。
 """
 import asyncio
+import time
 import uuid
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, AsyncIterator, Set, Tuple
 from datetime import datetime, timedelta
 from enum import Enum
 from loguru import logger
 import json
 
 from app.services.wallet_analyzer import WalletAnalyzer
+from app.services.address_index import address_index, DedupeResult
+from app.utils.address_stream import AddressScanner, find_addresses, iter_addresses
 from app.database import db
+from app.config import config
 from app.services.websocket_manager import ws_manager
+from app.services.progress_publisher import progress_publisher
 from app.services.notification import notification_manager
 
 
@@ -25,34 +39,49 @@ class ImportStatus(str, Enum):
     CANCELLED = "cancelled"      # 已取消
 
 
+# 单个地址的处理状态（import_task_items.status）
+ITEM_PENDING = "pending"
+ITEM_SUCCESS = "success"
+ITEM_FAILED = "failed"
+ITEM_SKIPPED = "skipped"
+
+# 执行时每次从数据库读取的待处理地址数
+ITEM_PAGE_SIZE = 500
+
+DEFAULT_IMPORT_CONFIG = {
+    "resume": True,              # 重启后继续未完成的任务
+    "stale_seconds": 30,         # 任务超过该时长没有心跳视为执行进程已退出，可被接管
+    "resume_check_interval": 15,
+    "checkpoint_interval": 5,    # 进度写库的最长间隔（秒）；另外每处理 batch_size 个地址写一次
+    "progress_rate": 4           # 每个任务每秒最多推送几次进度（合并推送，最终状态总会推送）
+}
+
+
 class ImportTask:
     """导入任务"""
     
     def __init__(
         self,
         task_id: str,
-        addresses: List[str],
+        total: int = 0,
         batch_size: int = 50,
         frequency: str = "normal"
     ):
         self.task_id = task_id
-        self.addresses = addresses
         self.batch_size = batch_size
         self.frequency = frequency
         
-        # 状态
+        # 状态（每个地址的处理结果只保存在 import_task_items 表中）
         self.status = ImportStatus.PENDING
-        self.total = len(addresses)
+        self.total = total
         self.processed = 0
         self.success = 0
         self.failed = 0
         self.skipped = 0
         
-        # 结果
-        self.success_addresses = []
-        self.failed_addresses = []
-        self.skipped_addresses = []
-        self.error_messages = {}
+        # 仍在接收上传的地址（total 还会增加，保存在 import_tasks.receiving）；新地址写入后通知本进程的执行协程
+        self.receiving = False
+        self._arrived = asyncio.Event()
         
         # 时间
         self.created_at = datetime.now()
@@ -61,25 +90,68 @@ class ImportTask:
         
         # 进度回调
         self.progress_callbacks = []
+        
+        # 吞吐量（本次运行开始后的处理速度，断点续传时不含之前的进度）
+        self._run_started: Optional[float] = None
+        self._run_base = 0
+        
+        # 尚未写库的地址状态 [(状态, 错误信息, 地址)]
+        self._dirty: List[tuple] = []
+        self._last_checkpoint = 0.0
+        
+        # 本次运行已读取到的最大 seq
+        self._cursor = -1
+    
+    def record(self, address: str, status: str, error: Optional[str] = None):
+        """记录一个地址的处理结果（下次检查点写库）"""
+        if status == ITEM_SUCCESS:
+            self.success += 1
+        elif status == ITEM_SKIPPED:
+            self.skipped += 1
+        else:
+            self.failed += 1
+        self.processed += 1
+        self._dirty.append((status, error, address))
+    
+    def throughput(self) -> Optional[float]:
+        """本次运行的处理速度（钱包/分钟）"""
+        if self._run_started is None:
+            return None
+        elapsed = time.perf_counter() - self._run_started
+        if elapsed <= 0:
+            return None
+        return (self.processed - self._run_base) / elapsed * 60
     
     def add_progress_callback(self, callback):
         """添加进度回调函数"""
         self.progress_callbacks.append(callback)
     
-    async def notify_progress(self):
-        """通知进度更新"""
-        progress_data = self.get_progress()
+    def notify_progress(self):
+        """通知进度更新（合并后限速推送，推送时才计算进度）"""
+        progress_publisher.publish(self.task_id, self.get_progress, self._deliver_progress)
+    
+    async def notify_final(self):
+        """立即推送最终状态"""
+        await progress_publisher.close(self.task_id, self.get_progress, self._deliver_progress)
+    
+    async def _deliver_progress(self, progress: Dict[str, Any], final: bool):
+        """
+        推送一次合并后的进度
         
+        Args:
+            progress: 完整进度（只有计数，不含地址列表）
+            final: 是否为最终状态
+        """
         # 调用回调函数
         for callback in self.progress_callbacks:
             try:
-                await callback(progress_data)
+                await callback(progress)
             except Exception as e:
                 logger.error(f"进度回调失败: {e}")
         
         # 通过 WebSocket 推送进度
         try:
-            await ws_manager.send_import_progress(self.task_id, progress_data)
+            await ws_manager.send_import_progress(self.task_id, progress, final=final)
         except Exception as e:
             logger.error(f"WebSocket 推送进度失败: {e}")
     
@@ -92,8 +164,11 @@ class ImportTask:
             elapsed = (datetime.now() - self.started_at).total_seconds()
             elapsed_time = int(elapsed)
         
+        throughput = self.throughput()
         eta = None
-        if self.processed > 0 and elapsed_time:
+        if throughput:
+            eta = int((self.total - self.processed) / throughput * 60)
+        elif self.processed > 0 and elapsed_time:
             avg_time = elapsed_time / self.processed
             remaining = self.total - self.processed
             eta = int(avg_time * remaining)
@@ -109,19 +184,32 @@ class ImportTask:
             "progress": round(progress, 2),
             "elapsed_time": elapsed_time,
             "eta": eta,
+            "throughput_per_min": round(throughput, 1) if throughput is not None else None,
+            "receiving": self.receiving,
             "created_at": self.created_at.isoformat(),
             "started_at": self.started_at.isoformat() if self.started_at else None,
             "completed_at": self.completed_at.isoformat() if self.completed_at else None
         }
     
     def get_result(self) -> Dict[str, Any]:
-        """获取完整结果"""
+        """获取完整结果（从 import_task_items 读取每个地址的状态）"""
+        addresses = {ITEM_SUCCESS: [], ITEM_FAILED: [], ITEM_SKIPPED: []}
+        error_messages = {}
+        rows = db.fetch_all(
+            "SELECT address, status, error FROM import_task_items WHERE task_id = ? AND status != ? ORDER BY seq",
+            (self.task_id, ITEM_PENDING)
+        )
+        for row in rows:
+            addresses[row["status"]].append(row["address"])
+            if row["status"] == ITEM_FAILED:
+                error_messages[row["address"]] = row["error"]
+        
         return {
             **self.get_progress(),
-            "success_addresses": self.success_addresses,
-            "failed_addresses": self.failed_addresses,
-            "skipped_addresses": self.skipped_addresses,
-            "error_messages": self.error_messages
+            "success_addresses": addresses[ITEM_SUCCESS],
+            "failed_addresses": addresses[ITEM_FAILED],
+            "skipped_addresses": addresses[ITEM_SKIPPED],
+            "error_messages": error_messages
         }
 
 
@@ -132,6 +220,39 @@ class ImportManager:
         self.tasks: Dict[str, ImportTask] = {}
         self.analyzer = WalletAnalyzer(use_mock=False)
         self._lock = asyncio.Lock()
+        
+        settings = {**DEFAULT_IMPORT_CONFIG, **config.get_config("system").get("import", {})}
+        self.resume_enabled = settings["resume"]
+        self.stale_seconds = settings["stale_seconds"]
+        self.resume_check_interval = settings["resume_check_interval"]
+        self.checkpoint_interval = settings["checkpoint_interval"]
+        
+        # 本进程正在执行的任务
+        self._running: Dict[str, asyncio.Task] = {}
+        self._resume_task: Optional[asyncio.Task] = None
+    
+    @staticmethod
+    def runs_locally() -> bool:
+        """新任务是否在本进程执行（collector.run_in_api 关闭时由独立采集进程执行）"""
+        return config.get_config("system").get("collector", {}).get("run_in_api", True)
+    
+    def hand_off(self, task_id: str) -> bool:
+        """
+        把新任务交给采集进程：心跳置 0，采集进程的接管循环（resume_check_interval 秒内）领取执行
+        
+        Args:
+            task_id: 任务 ID
+        
+        Returns:
+            是否已交出；False 表示应在本进程执行
+        """
+        if self.runs_locally():
+            return False
+        db.execute("UPDATE import_tasks SET updated_at = 0 WHERE task_id = ?", (task_id,))
+        # 之后的进度以数据库为准（由执行进程写入）
+        self.tasks.pop(task_id, None)
+        logger.info(f"导入任务已交给采集进程执行: {task_id}")
+        return True
     
     def create_task(
         self,
@@ -144,7 +265,7 @@ class ImportManager:
         
         Args:
             addresses: 钱包地址列表
-            batch_size: 每批处理数量
+            batch_size: 每批处理数量（每处理这么多个地址保存一次进度）
             frequency: 更新频率
             
         Returns:
@@ -153,75 +274,204 @@ class ImportManager:
         # 生成任务 ID
         task_id = str(uuid.uuid4())
         
-        # 去重
-        unique_addresses = list(set(addresses))
+        # 批量去重：规范化、去掉重复地址，已存在的钱包直接记为跳过（不逐个查询数据库）
+        dedupe = address_index.dedupe(addresses)
         
         # 创建任务
         task = ImportTask(
             task_id=task_id,
-            addresses=unique_addresses,
             batch_size=batch_size,
             frequency=frequency
         )
         
         # 保存任务
         self.tasks[task_id] = task
+        now = time.time()
+        with db.batch():
+            db.execute("""
+                INSERT INTO import_tasks (task_id, status, batch_size, frequency, total, created_at, updated_at)
+                VALUES (?, ?, ?, ?, 0, ?, ?)
+            """, (task_id, task.status.value, batch_size, frequency, task.created_at.isoformat(), now))
+            self._append_items(task, dedupe)
         
-        logger.info(f"创建导入任务: {task_id}, 总数: {len(unique_addresses)}")
+        logger.info(
+            f"创建导入任务: {task_id}, 总数: {task.total}, 新地址: {len(dedupe.new)}, "
+            f"已存在: {len(dedupe.existing)}, 重复: {dedupe.duplicates}, 无效: {len(dedupe.invalid)}"
+        )
         
         return task
     
+    def _append_items(self, task: ImportTask, dedupe: DedupeResult):
+        """
+        把去重后的地址追加到任务（已存在的钱包记为跳过，无效地址记为失败），需在 db.batch() 内调用
+        
+        Args:
+            task: 导入任务
+            dedupe: 去重结果
+        """
+        items = (
+            [(address, ITEM_PENDING, None) for address in dedupe.new]
+            + [(address, ITEM_SKIPPED, None) for address in dedupe.existing]
+            + [(address, ITEM_FAILED, "地址格式无效") for address in dedupe.invalid]
+        )
+        if not items:
+            return
+        
+        seq = task.total
+        db.execute_many(
+            "INSERT INTO import_task_items (task_id, seq, address, status, error) VALUES (?, ?, ?, ?, ?)",
+            [(task.task_id, seq + i, address, status, error) for i, (address, status, error) in enumerate(items)]
+        )
+        task.total += len(items)
+        task.skipped += len(dedupe.existing)
+        task.failed += len(dedupe.invalid)
+        task.processed += len(dedupe.existing) + len(dedupe.invalid)
+        # 增量更新：执行方可能在其他进程同时写入处理进度
+        db.execute("""
+            UPDATE import_tasks SET
+                total = total + ?, processed = processed + ?, failed = failed + ?, skipped = skipped + ?
+            WHERE task_id = ?
+        """, (
+            len(items), len(dedupe.existing) + len(dedupe.invalid), len(dedupe.invalid), len(dedupe.existing),
+            task.task_id
+        ))
+    
+    def _set_receiving(self, task: ImportTask, receiving: bool):
+        """更新任务是否仍在接收上传（执行方可能在其他进程，通过数据库读取）"""
+        task.receiving = receiving
+        db.execute("UPDATE import_tasks SET receiving = ? WHERE task_id = ?", (int(receiving), task.task_id))
+        if not receiving:
+            task._arrived.set()
+    
+    async def import_stream(
+        self,
+        chunks: AsyncIterator[bytes],
+        batch_size: int = 50,
+        frequency: str = "normal"
+    ) -> Tuple[Optional[ImportTask], int]:
+        """
+        边接收边导入（上传的 CSV/TXT 等任意文本）
+        
+        逐块提取地址、去重后写入任务，收到第一批地址就开始执行，不等上传结束；
+        内存占用与文件大小无关。上传中断时已收到的地址照常处理。
+        采集进程独立运行时本进程只接收，任务交给采集进程执行。
+        
+        Args:
+            chunks: 字节块异步迭代器（如 Request.stream()）
+            batch_size: 每批处理数量
+            frequency: 更新频率
+        
+        Returns:
+            (导入任务, 识别到的地址数)；没有识别到任何地址时任务为 None
+        """
+        task = self.create_task([], batch_size=batch_size, frequency=frequency)
+        self._set_receiving(task, True)
+        runner = None
+        if not self.hand_off(task.task_id):
+            runner = asyncio.create_task(self.execute_task(task.task_id))
+        scanner = AddressScanner()
+        duplicates = 0
+        
+        try:
+            async for addresses in iter_addresses(chunks, scanner):
+                dedupe = address_index.dedupe(addresses)
+                # 与之前各块重复的地址（任务内地址统一为小写）
+                known = self._known_items(task.task_id, dedupe.new + dedupe.existing)
+                if known:
+                    dedupe.new = [address for address in dedupe.new if address not in known]
+                    dedupe.existing = [address for address in dedupe.existing if address not in known]
+                duplicates += dedupe.duplicates + len(known)
+                
+                with db.batch():
+                    self._append_items(task, dedupe)
+                task._arrived.set()
+                task.notify_progress()
+                
+                # 让出事件循环，执行协程和其他请求不被长时间的解析阻塞
+                await asyncio.sleep(0)
+        finally:
+            self._set_receiving(task, False)
+            if task.total == 0:
+                # 没有任何地址：停止执行并删除空任务（其他进程的执行方读不到任务后结束）
+                if runner is not None:
+                    runner.cancel()
+                    await asyncio.gather(runner, return_exceptions=True)
+                self.tasks.pop(task.task_id, None)
+                db.execute("DELETE FROM import_tasks WHERE task_id = ?", (task.task_id,))
+        
+        logger.info(
+            f"上传导入接收完成: {task.task_id}, {scanner.bytes_read / 1024 / 1024:.1f} MB, "
+            f"识别地址 {scanner.found} 个, 重复 {duplicates}, 任务总数 {task.total}"
+        )
+        
+        if task.total == 0:
+            return None, 0
+        return task, scanner.found
+    
+    def _known_items(self, task_id: str, addresses: List[str]) -> Set[str]:
+        """任务中已有的地址（按块 IN 查询）"""
+        known = set()
+        chunk_size = address_index.chunk_size
+        for i in range(0, len(addresses), chunk_size):
+            chunk = addresses[i:i + chunk_size]
+            rows = db.fetch_all(
+                f"SELECT address FROM import_task_items WHERE task_id = ? AND address IN ({', '.join('?' * len(chunk))})",
+                (task_id, *chunk)
+            )
+            known.update(row["address"] for row in rows)
+        return known
+    
     async def execute_task(self, task_id: str):
         """
-        执行导入任务
+        执行导入任务（断点续传时只处理尚未完成的地址）
         
         Args:
             task_id: 任务 ID
         """
-        task = self.tasks.get(task_id)
+        task = self.get_task(task_id)
         if not task:
             logger.error(f"任务不存在: {task_id}")
             return
         
+        self._running[task_id] = asyncio.current_task()
+        heartbeat = asyncio.create_task(self._heartbeat_loop(task))
         try:
             # 更新状态
+            resumed = task.started_at is not None
             task.status = ImportStatus.PROCESSING
-            task.started_at = datetime.now()
-            await task.notify_progress()
-            
-            logger.info(f"开始执行导入任务: {task_id}")
+            task.started_at = task.started_at or datetime.now()
+            task._run_started = time.perf_counter()
+            task._run_base = task.processed
+            task._cursor = -1
+            await self._checkpoint(task, force=True)
             
-            # 分批处理
-            batches = [
-                task.addresses[i:i + task.batch_size]
-                for i in range(0, len(task.addresses), task.batch_size)
-            ]
+            if resumed:
+                logger.info(f"继续导入任务: {task_id}, 已处理 {task.processed}/{task.total}")
+            else:
+                logger.info(f"开始执行导入任务: {task_id}, 共 {task.total - task.processed} 个地址")
             
-            logger.info(f"总共 {len(batches)} 批，每批 {task.batch_size} 个")
-            
-            for batch_idx, batch in enumerate(batches):
-                logger.info(f"处理第 {batch_idx + 1}/{len(batches)} 批...")
-                
-                # 检查是否取消
+            while True:
+                # 上传仍在进行时，处理完已收到的地址后等待新地址
+                task._arrived.clear()
+                receiving = task.receiving
+                await self._run_pending(task)
                 if task.status == ImportStatus.CANCELLED:
                     logger.info(f"任务已取消: {task_id}")
                     break
-                
-                # 处理当前批次
-                await self._process_batch(task, batch)
-                
-                # 通知进度
-                await task.notify_progress()
-                
-                # 批次间延迟（避免过载）
-                if batch_idx < len(batches) - 1:
-                    await asyncio.sleep(1)
+                if not receiving:
+                    break
+                # 本进程接收时收到新地址即被唤醒；其他进程接收时定期读取数据库中的接收状态
+                try:
+                    await asyncio.wait_for(task._arrived.wait(), timeout=self.checkpoint_interval)
+                except asyncio.TimeoutError:
+                    self._flush(task)
             
             # 完成
             if task.status != ImportStatus.CANCELLED:
                 task.status = ImportStatus.COMPLETED
             task.completed_at = datetime.now()
-            await task.notify_progress()
+            await self._checkpoint(task, force=True)
+            await task.notify_final()
             
             # 保存导入记录到数据库
             self._save_import_record(task)
@@ -229,78 +479,250 @@ class ImportManager:
             # 发送完成通知
             await self._send_completion_notification(task)
             
-            logger.info(f"导入任务完成: {task_id}, 成功: {task.success}, 失败: {task.failed}, 跳过: {task.skipped}")
+            logger.info(
+                f"导入任务完成: {task_id}, 成功: {task.success}, 失败: {task.failed}, 跳过: {task.skipped}, "
+                f"速度: {task.throughput() or 0:.1f} 个/分钟"
+            )
             
+        except asyncio.CancelledError:
+            # 进程退出：保存进度，任务保持处理中，由下次启动（或其他进程）继续
+            self._flush(task, heartbeat_at=0)
+            progress_publisher.discard(task_id)
+            logger.info(f"导入任务中断，已保存进度: {task_id}, {task.processed}/{task.total}")
+            raise
         except Exception as e:
             logger.error(f"导入任务失败: {task_id}, 错误: {e}")
             task.status = ImportStatus.FAILED
             task.completed_at = datetime.now()
-            await task.notify_progress()
+            await self._checkpoint(task, force=True)
+            await task.notify_final()
+        finally:
+            heartbeat.cancel()
+            self._running.pop(task_id, None)
     
-    async def _process_batch(self, task: ImportTask, addresses: List[str]):
-        """
-        处理一批地址
-        
-        Args:
-            task: 导入任务
-            addresses: 地址列表
-        """
-        for address in addresses:
+    async def _run_pending(self, task: ImportTask):
+        """处理任务中目前已有的待处理地址"""
+        # 所有地址走同一个有界并发流（与采集共用 hl_limiter 自适应并发）
+        stream = self.analyzer.iter_analyze_wallets(self._candidates(task))
+        try:
+            async for item in stream:
+                if item.ok:
+                    # 更新频率
+                    db.execute(
+                        "UPDATE wallets SET update_frequency = ? WHERE address = ?",
+                        (task.frequency, item.address)
+                    )
+                    task.record(item.address, ITEM_SUCCESS)
+                    logger.debug(f"钱包分析成功: {item.address}, 评分: {item.result.get('score', 0)}")
+                else:
+                    task.record(item.address, ITEM_FAILED, item.error)
+                    logger.warning(f"钱包分析失败: {item.address}, {item.error}")
+                
+                task.notify_progress()
+                await self._checkpoint(task)
+                
+                # 检查是否取消（包括其他进程通过接口取消）
+                if task.status == ImportStatus.CANCELLED:
+                    break
+        finally:
+            await stream.aclose()
+    
+    def _pending_items(self, task: ImportTask) -> Iterator[str]:
+        """按导入顺序分页读取尚未处理的地址（从上次读到的位置继续）"""
+        while True:
+            rows = db.fetch_all("""
+                SELECT seq, address FROM import_task_items
+                WHERE task_id = ? AND status = ? AND seq > ?
+                ORDER BY seq
+                LIMIT ?
+            """, (task.task_id, ITEM_PENDING, task._cursor, ITEM_PAGE_SIZE))
+            if not rows:
+                return
+            for row in rows:
+                task._cursor = row["seq"]
+                yield row["address"]
+    
+    def _candidates(self, task: ImportTask) -> Iterator[str]:
+        """过滤无效和已存在的地址，其余交给分析流（惰性，随分析进度逐页读取；存在性只查内存索引）"""
+        for address in self._pending_items(task):
+            if task.status == ImportStatus.CANCELLED:
+                return
             try:
                 # 验证地址格式
                 if not self._validate_address(address):
-                    task.failed += 1
-                    task.failed_addresses.append(address)
-                    task.error_messages[address] = "地址格式无效"
-                    task.processed += 1
+                    task.record(address, ITEM_FAILED, "地址格式无效")
                     continue
                 
-                # 检查是否已存在
-                existing = db.fetch_one(
-                    "SELECT id, smart_money_score FROM wallets WHERE address = ?",
-                    (address,)
-                )
-                
-                if existing:
+                # 检查是否已存在（创建任务后才加入的钱包，如断点续传前已分析完成的）
+                if address_index.contains(address):
                     # 已存在，跳过
-                    task.skipped += 1
-                    task.skipped_addresses.append(address)
-                    task.processed += 1
+                    task.record(address, ITEM_SKIPPED)
                     logger.debug(f"钱包已存在，跳过: {address}")
                     continue
-                
-                # 分析钱包
-                logger.debug(f"分析钱包: {address}")
-                result = await self.analyzer.analyze_wallet(address)
-                
-                if result:
-                    # 成功
-                    task.success += 1
-                    task.success_addresses.append(address)
-                    
-                    # 更新频率
-                    db.execute(
-                        "UPDATE wallets SET update_frequency = ? WHERE address = ?",
-                        (task.frequency, address)
-                    )
-                    
-                    logger.debug(f"钱包分析成功: {address}, 评分: {result.get('score', 0)}")
-                else:
-                    # 失败
-                    task.failed += 1
-                    task.failed_addresses.append(address)
-                    task.error_messages[address] = "分析失败"
-                    logger.warning(f"钱包分析失败: {address}")
-                
-                task.processed += 1
-                
             except Exception as e:
-                # 异常
-                task.failed += 1
-                task.failed_addresses.append(address)
-                task.error_messages[address] = str(e)
-                task.processed += 1
+                task.record(address, ITEM_FAILED, str(e))
                 logger.error(f"处理钱包异常: {address}, 错误: {e}")
+                continue
+            
+            yield address
+    
+    # ==================== 进度持久化 ====================
+    
+    async def _checkpoint(self, task: ImportTask, force: bool = False):
+        """每 batch_size 个地址或 checkpoint_interval 秒保存一次进度"""
+        now = time.perf_counter()
+        if not force and len(task._dirty) < task.batch_size and now - task._last_checkpoint < self.checkpoint_interval:
+            return
+        task._last_checkpoint = now
+        self._flush(task)
+        task.notify_progress()
+    
+    async def _heartbeat_loop(self, task: ImportTask):
+        """长时间没有地址完成时也定期写库，表明任务仍在执行"""
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            try:
+                await self._checkpoint(task)
+            except Exception as e:
+                logger.error(f"保存导入进度失败: {task.task_id}, {e}")
+    
+    def _flush(self, task: ImportTask, heartbeat_at: Optional[float] = None):
+        """
+        把进度增量写入数据库，并读回计数和状态
+        （其他进程接收的上传地址、其他进程取消任务在这里生效）
+        
+        Args:
+            heartbeat_at: 写入的心跳时间；默认当前时间，0 表示可立即被接管
+        """
+        dirty, task._dirty = task._dirty, []
+        counts = {ITEM_SUCCESS: 0, ITEM_FAILED: 0, ITEM_SKIPPED: 0}
+        for status, _, _ in dirty:
+            counts[status] += 1
+        now = time.time()
+        with db.batch():
+            if dirty:
+                db.execute_many(
+                    "UPDATE import_task_items SET status = ?, error = ? WHERE task_id = ? AND address = ?",
+                    [(status, error, task.task_id, address) for status, error, address in dirty]
+                )
+            db.execute("""
+                UPDATE import_tasks SET
+                    status = CASE WHEN status = 'cancelled' THEN status ELSE ? END,
+                    processed = processed + ?, success = success + ?, failed = failed + ?, skipped = skipped + ?,
+                    started_at = ?, completed_at = ?, updated_at = ?
+                WHERE task_id = ?
+            """, (
+                task.status.value, len(dirty), counts[ITEM_SUCCESS], counts[ITEM_FAILED], counts[ITEM_SKIPPED],
+                task.started_at.isoformat() if task.started_at else None,
+                task.completed_at.isoformat() if task.completed_at else None,
+                now if heartbeat_at is None else heartbeat_at,
+                task.task_id
+            ))
+        
+        row = db.fetch_one(
+            "SELECT status, total, processed, success, failed, skipped, receiving FROM import_tasks WHERE task_id = ?",
+            (task.task_id,)
+        )
+        if row is None:
+            # 任务已被删除（如上传中没有识别到任何地址）
+            task.receiving = False
+            if task.status == ImportStatus.PROCESSING:
+                task.status = ImportStatus.CANCELLED
+            return
+        task.total = row["total"]
+        task.processed = row["processed"]
+        task.success = row["success"]
+        task.failed = row["failed"]
+        task.skipped = row["skipped"]
+        task.receiving = bool(row["receiving"])
+        if row["status"] == ImportStatus.CANCELLED.value and task.status == ImportStatus.PROCESSING:
+            task.status = ImportStatus.CANCELLED
+    
+    def _load_task(self, task_id: str) -> Optional[ImportTask]:
+        """从数据库恢复任务（只读取进度概要，待处理的地址执行时分页读取）"""
+        row = db.fetch_one("SELECT * FROM import_tasks WHERE task_id = ?", (task_id,))
+        if not row:
+            return None
+        
+        task = ImportTask(
+            task_id=task_id,
+            total=row["total"],
+            batch_size=row["batch_size"],
+            frequency=row["frequency"]
+        )
+        task.status = ImportStatus(row["status"])
+        task.created_at = datetime.fromisoformat(row["created_at"])
+        task.started_at = datetime.fromisoformat(row["started_at"]) if row["started_at"] else None
+        task.completed_at = datetime.fromisoformat(row["completed_at"]) if row["completed_at"] else None
+        task.processed = row["processed"]
+        task.success = row["success"]
+        task.failed = row["failed"]
+        task.skipped = row["skipped"]
+        task.receiving = bool(row["receiving"])
+        return task
+    
+    # ==================== 断点续传 ====================
+    
+    def start(self):
+        """定期接管未完成的任务（本进程重启前的、或执行进程已退出的）"""
+        if not self.resume_enabled or self._resume_task is not None:
+            return
+        self._resume_task = asyncio.create_task(self._resume_loop())
+    
+    async def stop(self):
+        """停止接管并中断本进程正在执行的任务（进度已保存，之后可继续）"""
+        if self._resume_task is not None:
+            self._resume_task.cancel()
+            self._resume_task = None
+        
+        running = list(self._running.values())
+        for runner in running:
+            runner.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+    
+    async def _resume_loop(self):
+        while True:
+            try:
+                self.resume_tasks()
+            except Exception as e:
+                logger.error(f"接管导入任务失败: {e}")
+            await asyncio.sleep(self.resume_check_interval)
+    
+    def resume_tasks(self) -> List[str]:
+        """
+        接管心跳过期的未完成任务
+        
+        Returns:
+            本次接管的任务 ID
+        """
+        now = time.time()
+        rows = db.fetch_all("""
+            SELECT task_id, updated_at FROM import_tasks
+            WHERE status IN ('pending', 'processing') AND updated_at < ?
+        """, (now - self.stale_seconds,))
+        
+        resumed = []
+        for row in rows:
+            task_id = row["task_id"]
+            if task_id in self._running:
+                continue
+            # 条件更新：多个进程同时接管时只有一个成功
+            cursor = db.execute(
+                "UPDATE import_tasks SET updated_at = ? WHERE task_id = ? AND updated_at = ?",
+                (now, task_id, row["updated_at"])
+            )
+            if cursor.rowcount != 1:
+                continue
+            
+            task = self._load_task(task_id)
+            self.tasks[task_id] = task
+            asyncio.create_task(self.execute_task(task_id))
+            resumed.append(task_id)
+        
+        if resumed:
+            logger.info(f"继续 {len(resumed)} 个未完成的导入任务")
+        return resumed
     
     def _validate_address(self, address: str) -> bool:
         """验证地址格式"""
@@ -343,17 +765,25 @@ class ImportManager:
             logger.error(f"发送完成通知失败: {e}")
     
     def get_task(self, task_id: str) -> Optional[ImportTask]:
-        """获取任务"""
-        return self.tasks.get(task_id)
+        """获取任务（本进程没有时从数据库读取）"""
+        task = self.tasks.get(task_id)
+        if task is None:
+            task = self._load_task(task_id)
+            if task is not None and task.status not in (ImportStatus.PENDING, ImportStatus.PROCESSING):
+                self.tasks[task_id] = task
+        return task
     
     def cancel_task(self, task_id: str) -> bool:
-        """取消任务"""
+        """取消任务（在其他进程执行的任务下次保存进度时停止）"""
         task = self.tasks.get(task_id)
-        if not task:
-            return False
-        
-        if task.status == ImportStatus.PROCESSING:
+        if task and task.status == ImportStatus.PROCESSING:
             task.status = ImportStatus.CANCELLED
+        
+        cursor = db.execute(
+            "UPDATE import_tasks SET status = 'cancelled', completed_at = ? WHERE task_id = ? AND status IN ('pending', 'processing')",
+            (datetime.now().isoformat(), task_id)
+        )
+        if cursor.rowcount == 1:
             logger.info(f"任务已取消: {task_id}")
             return True
         
@@ -361,7 +791,13 @@ class ImportManager:
     
     def get_all_tasks(self) -> List[Dict[str, Any]]:
         """获取所有任务"""
-        return [task.get_progress() for task in self.tasks.values()]
+        rows = db.fetch_all("SELECT task_id FROM import_tasks ORDER BY created_at DESC")
+        tasks = []
+        for row in rows:
+            task = self.tasks.get(row["task_id"]) or self._load_task(row["task_id"])
+            if task is not None:
+                tasks.append(task.get_progress())
+        return tasks
     
     def cleanup_old_tasks(self, days: int = 7):
         """清理旧任务"""
@@ -375,61 +811,26 @@ class ImportManager:
         for task_id in to_remove:
             del self.tasks[task_id]
         
-        if to_remove:
-            logger.info(f"清理了 {len(to_remove)} 个旧任务")
+        cursor = db.execute(
+            "DELETE FROM import_tasks WHERE completed_at IS NOT NULL AND completed_at < ?",
+            (cutoff.isoformat(),)
+        )
+        
+        if to_remove or cursor.rowcount:
+            logger.info(f"清理了 {max(len(to_remove), cursor.rowcount)} 个旧任务")
     
     @staticmethod
     def parse_addresses_from_text(text: str) -> List[str]:
         """
         从文本解析地址
-        支持多种分隔符：换行、逗号、分号、空格
+        支持任意分隔符（换行、逗号、分号、空格等）
         """
-        import re
-        
-        # 替换所有分隔符为换行
-        text = text.replace(',', '\n').replace(';', '\n').replace(' ', '\n')
-        
-        # 按行分割
-        lines = text.split('\n')
-        
-        # 提取地址
-        addresses = []
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            
-            # 查找 0x 开头的地址
-            matches = re.findall(r'0x[a-fA-F0-9]{40}', line)
-            addresses.extend(matches)
-        
-        return addresses
+        return find_addresses(text.encode("utf-8"))
     
     @staticmethod
     def parse_addresses_from_csv(file_content: bytes) -> List[str]:
-        """从 CSV 文件解析地址"""
-        import csv
-        import io
-        
-        addresses = []
-        
-        try:
-            # 解码
-            text = file_content.decode('utf-8')
-            
-            # 读取 CSV
-            reader = csv.reader(io.StringIO(text))
-            
-            for row in reader:
-                for cell in row:
-                    cell = cell.strip()
-                    if cell.startswith("0x") and len(cell) == 42:
-                        addresses.append(cell)
-            
-        except Exception as e:
-            logger.error(f"解析 CSV 失败: {e}")
-        
-        return addresses
+        """从 CSV 文件解析地址（不区分列，提取所有单元格中的地址）"""
+        return find_addresses(file_content)
 
 
 # 全局导入管理器实例
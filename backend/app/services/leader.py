@@ -0,0 +1,223 @@
+"""
+后台任务选主
+多个 API worker（或多个采集进程）通过 leader_leases 表中的一行租约选出唯一的主进程，
+只有主进程运行后台任务（采集调度、推送采集、AI 调度）。
+
+- 主进程每 renew_interval 秒续约；续约失败或本地租约即将到期（如数据库长时间被锁）时立即降级
+- 每次易主 token 加一：续约时带上 token，旧主进程恢复后续约失败并降级
+- 降级回调执行前仍有短暂窗口，采集调度在每次派发钱包刷新（未开启分片时）、运行单例定时任务前再检查 is_leader，租约失效即跳过
+- 同时开启分片采集时各进程都运行采集调度器，只有单例定时任务和其他后台任务跟随选主
+- 主进程退出时主动释放租约，其他进程在下一次轮询（renew_interval 秒内）接管
+"""
+import os
+import time
+import socket
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+from loguru import logger
+
+from app.database import db
+from app.config import config
+from app.utils.metrics import registry
+
+# 选主指标
+LEADER_STATE = registry.gauge(
+    "leader_election_is_leader",
+    "本进程是否为主进程（1 是，0 否）",
+    ["name"]
+)
+LEADER_TRANSITIONS = registry.counter(
+    "leader_election_transitions",
+    "主进程身份变化次数",
+    ["name", "event"]
+)
+
+DEFAULT_LEADER_CONFIG = {
+    "enabled": False,
+    "lease_seconds": 10,
+    "renew_interval": 3,
+    "safety_margin": 2  # 本地租约剩余不足该秒数且续约未成功时主动降级
+}
+
+
+class LeaderElection:
+    """基于 SQLite 租约行的选主"""
+    
+    def __init__(self, name: str = "background", settings: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            name: 租约名称（不同的后台任务组可以各自选主）
+            settings: 选主配置（collector.leader_election）
+        """
+        settings = {**DEFAULT_LEADER_CONFIG, **(settings or {})}
+        self.name = name
+        self.enabled = settings["enabled"]
+        self.lease_seconds = float(settings["lease_seconds"])
+        self.renew_interval = float(settings["renew_interval"])
+        self.safety_margin = float(settings["safety_margin"])
+        self.holder_id = f"{socket.gethostname()}:{os.getpid()}"
+        
+        self.token: Optional[int] = None
+        self._lease_expires = 0.0
+        self._on_elected: Optional[Callable[[], Awaitable[Any]]] = None
+        self._on_demoted: Optional[Callable[[], Awaitable[Any]]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._elected_at: Optional[float] = None
+        self._counts = {"elected": 0, "demoted": 0}
+        self.is_running = False
+    
+    @property
+    def is_leader(self) -> bool:
+        """本进程当前是否持有有效租约"""
+        return self.token is not None and time.time() < self._lease_expires - self.safety_margin
+    
+    # ==================== 生命周期 ====================
+    
+    async def start(
+        self,
+        on_elected: Callable[[], Awaitable[Any]],
+        on_demoted: Callable[[], Awaitable[Any]]
+    ):
+        """
+        参与选主（需在事件循环内调用）
+        
+        Args:
+            on_elected: 成为主进程时调用（启动后台任务）
+            on_demoted: 失去主进程身份时调用（停止后台任务）
+        """
+        if self.is_running:
+            return
+        self.is_running = True
+        self._on_elected = on_elected
+        self._on_demoted = on_demoted
+        db.execute(
+            "INSERT OR IGNORE INTO leader_leases (name, holder, token, lease_expires) VALUES (?, NULL, 0, 0)",
+            (self.name,)
+        )
+        await self._tick()
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"✅ 选主已启动: {self.name} ({self.holder_id}), {'主进程' if self.is_leader else '备用进程'}")
+    
+    async def stop(self):
+        """退出选主；是主进程时先停止后台任务再释放租约"""
+        if not self.is_running:
+            return
+        self.is_running = False
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        
+        if self.token is not None:
+            token = self.token
+            await self._demote("released")
+            try:
+                db.execute(
+                    "UPDATE leader_leases SET holder = NULL, lease_expires = 0 WHERE name = ? AND holder = ? AND token = ?",
+                    (self.name, self.holder_id, token)
+                )
+            except Exception as e:
+                logger.error(f"❌ 释放主进程租约失败: {e}")
+    
+    async def _loop(self):
+        while self.is_running:
+            await asyncio.sleep(self.renew_interval)
+            await self._tick()
+    
+    async def _tick(self):
+        """主进程续约，备用进程尝试接管"""
+        try:
+            if self.token is not None:
+                if not self._renew():
+                    await self._demote("lost")
+            elif self._acquire():
+                await self._elect()
+        except Exception as e:
+            logger.error(f"❌ 选主失败: {e}")
+            # 数据库不可用时无法确认租约，本地租约将到期则降级
+            if self.token is not None and not self.is_leader:
+                await self._demote("expired")
+    
+    # ==================== 租约 ====================
+    
+    def _acquire(self) -> bool:
+        """租约空闲或已过期时抢占，token 加一"""
+        now = time.time()
+        expires = now + self.lease_seconds
+        cursor = db.execute("""
+            UPDATE leader_leases
+            SET holder = ?, token = token + 1, lease_expires = ?, acquired_at = ?
+            WHERE name = ? AND (holder IS NULL OR lease_expires < ?)
+        """, (self.holder_id, expires, now, self.name, now))
+        if cursor.rowcount != 1:
+            return False
+        
+        row = db.fetch_one("SELECT token FROM leader_leases WHERE name = ?", (self.name,))
+        self.token = row["token"]
+        self._lease_expires = expires
+        return True
+    
+    def _renew(self) -> bool:
+        """续约（持有者和 token 都一致才成功）"""
+        expires = time.time() + self.lease_seconds
+        cursor = db.execute(
+            "UPDATE leader_leases SET lease_expires = ? WHERE name = ? AND holder = ? AND token = ?",
+            (expires, self.name, self.holder_id, self.token)
+        )
+        if cursor.rowcount != 1:
+            return False
+        self._lease_expires = expires
+        return True
+    
+    async def _elect(self):
+        self._elected_at = time.time()
+        self._counts["elected"] += 1
+        LEADER_STATE.labels(self.name).set(1)
+        LEADER_TRANSITIONS.labels(self.name, "elected").inc()
+        logger.info(f"👑 成为主进程: {self.name}, token={self.token}")
+        try:
+            await self._on_elected()
+        except Exception as e:
+            logger.error(f"❌ 启动后台任务失败: {e}")
+    
+    async def _demote(self, reason: str):
+        token = self.token
+        self.token = None
+        self._lease_expires = 0.0
+        self._elected_at = None
+        self._counts["demoted"] += 1
+        LEADER_STATE.labels(self.name).set(0)
+        LEADER_TRANSITIONS.labels(self.name, reason).inc()
+        logger.warning(f"⚠️ 不再是主进程: {self.name}, token={token}, 原因: {reason}")
+        try:
+            await self._on_demoted()
+        except Exception as e:
+            logger.error(f"❌ 停止后台任务失败: {e}")
+    
+    # ==================== 查询 ====================
+    
+    def get_stats(self) -> Dict[str, Any]:
+        row = db.fetch_one(
+            "SELECT holder, token, lease_expires, acquired_at FROM leader_leases WHERE name = ?",
+            (self.name,)
+        )
+        return {
+            "enabled": self.enabled,
+            "name": self.name,
+            "holder_id": self.holder_id,
+            "is_leader": self.is_leader,
+            "token": self.token,
+            "leader_for_s": round(time.time() - self._elected_at, 1) if self._elected_at else None,
+            "transitions": dict(self._counts),
+            "lease": row
+        }
+
+
+# 全局选主实例（后台任务组）
+leader_election = LeaderElection(
+    "background",
+    config.get_config("system").get("collector", {}).get("leader_election")
+)
+
+
+# 导出
+__all__ = ['LeaderElection', 'leader_election']
@@ -3,11 +3,17 @@
 """
 from .system_monitor import system_monitor, SystemMonitor
 from .metrics_collector import metrics_collector, MetricsCollector
+from .db_stats import db_stats, DatabaseStats
+from .profiler import sampling_profiler, SamplingProfiler
 
 __all__ = [
     'system_monitor',
     'SystemMonitor',
     'metrics_collector',
-    'MetricsCollector'
+    'MetricsCollector',
+    'db_stats',
+    'DatabaseStats',
+    'sampling_profiler',
+    'SamplingProfiler'
 ]
 
@@ -0,0 +1,236 @@
+"""
+数据库统计信息
+维护各表行数、页数、碎片率等统计，避免每次监控请求都做全表 COUNT(*)
+"""
+import os
+import asyncio
+import sqlite3
+from typing import Dict, Any, List, Optional
+from datetime import datetime
+from loguru import logger
+
+from app.database import db, STATS_TABLES
+
+
+class DatabaseStats:
+    """数据库统计信息"""
+    
+    def get_row_counts(self) -> Dict[str, int]:
+        """
+        获取各表行数（由触发器实时维护，O(1)）
+        
+        Returns:
+            {表名: 行数}
+        """
+        try:
+            rows = db.fetch_all("SELECT table_name, row_count FROM table_stats")
+            counts = {row['table_name']: row['row_count'] for row in rows}
+            return {table: counts.get(table, 0) for table in STATS_TABLES}
+        except sqlite3.Error as e:
+            logger.error(f"获取表行数失败: {e}")
+            return {table: 0 for table in STATS_TABLES}
+    
+    def get_row_count(self, table: str) -> int:
+        """
+        获取单表行数
+        
+        Args:
+            table: 表名
+        
+        Returns:
+            行数
+        """
+        try:
+            row = db.fetch_one(
+                "SELECT row_count FROM table_stats WHERE table_name = ?",
+                (table,)
+            )
+            return row['row_count'] if row else 0
+        except sqlite3.Error as e:
+            logger.error(f"获取表行数失败 ({table}): {e}")
+            return 0
+    
+    def reconcile_row_counts(self) -> Dict[str, int]:
+        """
+        全表重新计数，校正触发器计数器（定期低频执行）
+        
+        Returns:
+            校正前后不一致的表及其偏差 {表名: 实际值 - 计数值}
+        """
+        drift = {}
+        existing_tables = self._get_existing_tables()
+        counted = self.get_row_counts()
+        now = datetime.now().isoformat()
+        
+        for table in STATS_TABLES:
+            if table not in existing_tables:
+                continue
+            
+            try:
+                result = db.fetch_one(f"SELECT COUNT(*) as count FROM {table}")
+                actual = result['count'] if result else 0
+                
+                if actual != counted.get(table, 0):
+                    drift[table] = actual - counted.get(table, 0)
+                
+                db.execute("""
+                    UPDATE table_stats SET row_count = ?, counted_at = ?
+                    WHERE table_name = ?
+                """, (actual, now, table))
+            except sqlite3.Error as e:
+                logger.error(f"校正表行数失败 ({table}): {e}")
+        
+        if drift:
+            logger.warning(f"表行数计数器已校正: {drift}")
+        
+        return drift
+    
+    def _scan_storage(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        用 dbstat 扫描各表页信息（全库扫描，在线程中执行，使用单独的只读连接）
+        
+        Returns:
+            每张表一行；dbstat 不可用时返回 None
+        """
+        try:
+            conn = sqlite3.connect(f"file:{db.db_path}?mode=ro", uri=True, timeout=30.0)
+        except sqlite3.Error as e:
+            logger.warning(f"打开只读连接失败，跳过表级存储统计: {e}")
+            return None
+        try:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute("""
+                SELECT m.tbl_name AS table_name,
+                       COUNT(*) AS page_count,
+                       SUM(s.pgsize) AS total_bytes,
+                       SUM(s.payload) AS payload_bytes,
+                       SUM(s.unused) AS unused_bytes
+                FROM dbstat s
+                JOIN sqlite_master m ON m.name = s.name
+                GROUP BY m.tbl_name
+            """).fetchall()
+            return [dict(row) for row in rows]
+        except sqlite3.Error as e:
+            logger.warning(f"dbstat 不可用，跳过表级存储统计: {e}")
+            return None
+        finally:
+            conn.close()
+    
+    async def refresh_storage_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        刷新各表页数、空间占用和碎片率
+        
+        优先使用 dbstat 虚拟表（需要 SQLITE_ENABLE_DBSTAT_VTAB），
+        不可用时只保留库级别的页信息。扫描在线程中进行，不阻塞事件循环。
+        
+        Returns:
+            {表名: 存储统计}
+        """
+        rows = await asyncio.to_thread(self._scan_storage)
+        if rows is None:
+            return {}
+        
+        now = datetime.now().isoformat()
+        storage = {}
+        
+        for row in rows:
+            total_bytes = row['total_bytes'] or 0
+            unused_bytes = row['unused_bytes'] or 0
+            fragmentation = (unused_bytes / total_bytes) if total_bytes > 0 else 0
+            
+            storage[row['table_name']] = {
+                'page_count': row['page_count'],
+                'total_bytes': total_bytes,
+                'payload_bytes': row['payload_bytes'] or 0,
+                'unused_bytes': unused_bytes,
+                'fragmentation': round(fragmentation, 4)
+            }
+            
+            if row['table_name'] in STATS_TABLES:
+                db.execute("""
+                    UPDATE table_stats
+                    SET page_count = ?, total_bytes = ?, payload_bytes = ?,
+                        unused_bytes = ?, fragmentation = ?, analyzed_at = ?
+                    WHERE table_name = ?
+                """, (
+                    row['page_count'],
+                    total_bytes,
+                    row['payload_bytes'] or 0,
+                    unused_bytes,
+                    round(fragmentation, 4),
+                    now,
+                    row['table_name']
+                ))
+        
+        logger.info(f"存储统计刷新完成: {len(storage)} 张表")
+        return storage
+    
+    def get_storage_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        获取最近一次刷新的表级存储统计
+        
+        Returns:
+            {表名: 存储统计}
+        """
+        try:
+            rows = db.fetch_all("""
+                SELECT table_name, page_count, total_bytes, payload_bytes,
+                       unused_bytes, fragmentation, analyzed_at
+                FROM table_stats
+            """)
+            return {
+                row['table_name']: {
+                    'page_count': row['page_count'] or 0,
+                    'total_bytes': row['total_bytes'] or 0,
+                    'payload_bytes': row['payload_bytes'] or 0,
+                    'unused_bytes': row['unused_bytes'] or 0,
+                    'fragmentation': row['fragmentation'] or 0,
+                    'analyzed_at': row['analyzed_at']
+                }
+                for row in rows
+            }
+        except sqlite3.Error as e:
+            logger.error(f"获取存储统计失败: {e}")
+            return {}
+    
+    def get_database_summary(self) -> Dict[str, Any]:
+        """
+        获取库级别的页信息（PRAGMA 读取，O(1)）
+        
+        Returns:
+            文件大小、页大小、页数、空闲页数
+        """
+        page_size = self._pragma("page_size")
+        page_count = self._pragma("page_count")
+        freelist_count = self._pragma("freelist_count")
+        size = os.path.getsize(db.db_path) if db.db_path.exists() else 0
+        
+        return {
+            'size': size,
+            'size_mb': round(size / 1024 / 1024, 2),
+            'page_size': page_size,
+            'page_count': page_count,
+            'freelist_count': freelist_count,
+            'freelist_ratio': round(freelist_count / page_count, 4) if page_count else 0
+        }
+    
+    def _pragma(self, name: str) -> int:
+        """读取整数型 PRAGMA"""
+        try:
+            row = db.get_connection().execute(f"PRAGMA {name}").fetchone()
+            return row[0] if row else 0
+        except sqlite3.Error:
+            return 0
+    
+    def _get_existing_tables(self) -> set:
+        """获取已存在的表"""
+        rows = db.fetch_all("SELECT name FROM sqlite_master WHERE type = 'table'")
+        return {row['name'] for row in rows}
+
+
+# 全局数据库统计实例
+db_stats = DatabaseStats()
+
+
+# 导出
+__all__ = ['DatabaseStats', 'db_stats']
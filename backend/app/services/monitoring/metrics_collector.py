@@ -10,6 +10,7 @@ import json
 
 from app.database import db
 from app.services.monitoring.system_monitor import system_monitor
+from app.services.monitoring.db_stats import db_stats
 
 
 class MetricsCollector:
@@ -98,28 +99,27 @@ class MetricsCollector:
             业务指标字典
         """
         try:
+            # 总数来自触发器维护的计数器（O(1)），不再全表 COUNT(*)
+            row_counts = db_stats.get_row_counts()
+            
             # 钱包统计
-            wallets_total = db.fetch_one("SELECT COUNT(*) as count FROM wallets")
             wallets_active = db.fetch_one("""
                 SELECT COUNT(*) as count FROM wallets 
                 WHERE last_updated > datetime('now', '-1 day')
             """)
             
             # 交易统计
-            trades_total = db.fetch_one("SELECT COUNT(*) as count FROM trades")
             trades_today = db.fetch_one("""
                 SELECT COUNT(*) as count FROM trades 
                 WHERE DATE(timestamp) = DATE('now')
             """)
             
             # 通知统计
-            notifications_total = db.fetch_one("SELECT COUNT(*) as count FROM notifications")
             notifications_unread = db.fetch_one("""
                 SELECT COUNT(*) as count FROM notifications WHERE is_read = 0
             """)
             
             # 用户统计
-            users_total = db.fetch_one("SELECT COUNT(*) as count FROM users")
             users_active = db.fetch_one("""
                 SELECT COUNT(*) as count FROM users 
                 WHERE last_login > datetime('now', '-7 day')
@@ -127,19 +127,19 @@ class MetricsCollector:
             
             return {
                 'wallets': {
-                    'total': wallets_total['count'] if wallets_total else 0,
+                    'total': row_counts.get('wallets', 0),
                     'active': wallets_active['count'] if wallets_active else 0
                 },
                 'trades': {
-                    'total': trades_total['count'] if trades_total else 0,
+                    'total': row_counts.get('trades', 0),
                     'today': trades_today['count'] if trades_today else 0
                 },
                 'notifications': {
-                    'total': notifications_total['count'] if notifications_total else 0,
+                    'total': row_counts.get('notifications', 0),
                     'unread': notifications_unread['count'] if notifications_unread else 0
                 },
                 'users': {
-                    'total': users_total['count'] if users_total else 0,
+                    'total': row_counts.get('users', 0),
                     'active': users_active['count'] if users_active else 0
                 }
             }
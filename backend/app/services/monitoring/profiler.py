@@ -0,0 +1,269 @@
+"""
+采样分析器
+在线上按需对所有线程做统计采样，输出折叠栈（火焰图）、自耗时排行和事件循环阻塞报告
+
+原理：
+- 后台线程按固定间隔读取 sys._current_frames()，不注入任何追踪钩子，开销与采样频率成正比
+- 事件循环上挂一个心跳回调，采样线程发现心跳超时即认为循环被某个回调阻塞，
+  记录此时事件循环线程的调用栈，作为慢回调报告
+"""
+import os
+import sys
+import time
+import asyncio
+import threading
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime
+from loguru import logger
+
+# 单帧描述：(函数名, 文件, 首行号)
+Frame = Tuple[str, str, int]
+
+
+def _short_path(filename: str) -> str:
+    """缩短文件路径（保留最后两级）"""
+    parts = filename.replace("\\", "/").split("/")
+    return "/".join(parts[-2:])
+
+
+def _frame_label(frame: Frame) -> str:
+    """折叠栈中的帧标签"""
+    name, filename, lineno = frame
+    return f"{name} ({filename}:{lineno})"
+
+
+class SamplingProfiler:
+    """统计采样分析器"""
+    
+    MAX_STACK_DEPTH = 64
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.running = False
+        self.last_report: Optional[Dict[str, Any]] = None
+    
+    async def profile(
+        self,
+        duration: float = 10.0,
+        interval: float = 0.01,
+        stall_threshold: float = 0.1,
+        top_n: int = 30
+    ) -> Dict[str, Any]:
+        """
+        采样指定时长并返回报告
+        
+        Args:
+            duration: 采样时长（秒）
+            interval: 采样间隔（秒）
+            stall_threshold: 事件循环阻塞判定阈值（秒）
+            top_n: 自耗时排行返回数量
+        
+        Returns:
+            分析报告
+        """
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("已有采样任务在运行")
+        
+        try:
+            self.running = True
+            loop = asyncio.get_running_loop()
+            session = _ProfileSession(
+                loop=loop,
+                loop_thread_id=threading.get_ident(),
+                interval=interval,
+                stall_threshold=stall_threshold
+            )
+            
+            logger.info(f"开始采样分析: {duration} 秒, 间隔 {interval * 1000:.0f} ms")
+            session.start()
+            try:
+                await asyncio.sleep(duration)
+            finally:
+                session.stop()
+            
+            report = session.build_report(top_n)
+            self.last_report = report
+            logger.info(f"采样分析完成: {report['samples']} 个样本, {len(report['loop_stalls'])} 次循环阻塞")
+            return report
+        finally:
+            self.running = False
+            self._lock.release()
+
+
+class _ProfileSession:
+    """一次采样会话"""
+    
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        loop_thread_id: int,
+        interval: float,
+        stall_threshold: float
+    ):
+        self.loop = loop
+        self.loop_thread_id = loop_thread_id
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        
+        self.stacks: Counter = Counter()  # {(线程名, 帧...): 次数}
+        self.samples = 0
+        self.stalls: List[Dict[str, Any]] = []
+        
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._heartbeat = time.monotonic()
+        self._heartbeat_handle: Optional[asyncio.TimerHandle] = None
+        self._current_stall: Optional[Dict[str, Any]] = None
+        self._started_at = None
+        self._ended_at = None
+    
+    def start(self):
+        """启动采样线程和事件循环心跳"""
+        self._started_at = datetime.now()
+        self._beat()
+        self._thread = threading.Thread(
+            target=self._run,
+            name="sampling-profiler",
+            daemon=True
+        )
+        self._thread.start()
+    
+    def stop(self):
+        """停止采样"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        if self._heartbeat_handle:
+            self._heartbeat_handle.cancel()
+        self._finish_stall(time.monotonic())
+        self._ended_at = datetime.now()
+    
+    def _beat(self):
+        """事件循环心跳（在循环线程中执行）"""
+        self._heartbeat = time.monotonic()
+        if not self._stop.is_set():
+            self._heartbeat_handle = self.loop.call_later(self.interval, self._beat)
+    
+    def _run(self):
+        """采样线程主循环"""
+        own_id = threading.get_ident()
+        
+        while not self._stop.wait(self.interval):
+            now = time.monotonic()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            frames = sys._current_frames()
+            
+            for thread_id, frame in frames.items():
+                if thread_id == own_id:
+                    continue
+                
+                stack = self._extract_stack(frame)
+                thread_name = "event-loop" if thread_id == self.loop_thread_id else names.get(thread_id, str(thread_id))
+                self.stacks[(thread_name,) + stack] += 1
+                
+                if thread_id == self.loop_thread_id:
+                    self._check_stall(now, stack)
+            
+            self.samples += 1
+            del frames
+    
+    def _extract_stack(self, frame) -> Tuple[Frame, ...]:
+        """提取调用栈（根 -> 叶）"""
+        stack = []
+        while frame is not None and len(stack) < SamplingProfiler.MAX_STACK_DEPTH:
+            code = frame.f_code
+            stack.append((code.co_name, _short_path(code.co_filename), code.co_firstlineno))
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+    
+    def _check_stall(self, now: float, stack: Tuple[Frame, ...]):
+        """检查事件循环是否被阻塞"""
+        blocked_for = now - self._heartbeat - self.interval
+        
+        if blocked_for >= self.stall_threshold:
+            if self._current_stall is None:
+                self._current_stall = {
+                    'started_at': datetime.now().isoformat(),
+                    'heartbeat': self._heartbeat,
+                    'stacks': Counter()
+                }
+            self._current_stall['stacks'][stack] += 1
+        else:
+            self._finish_stall(now)
+    
+    def _finish_stall(self, now: float):
+        """结束当前阻塞记录"""
+        stall = self._current_stall
+        if stall is None:
+            return
+        self._current_stall = None
+        
+        stack, _ = stall['stacks'].most_common(1)[0]
+        self.stalls.append({
+            'started_at': stall['started_at'],
+            'duration': round(now - stall['heartbeat'], 4),
+            'culprit': _frame_label(stack[-1]) if stack else None,
+            'stack': [_frame_label(f) for f in stack]
+        })
+    
+    def build_report(self, top_n: int) -> Dict[str, Any]:
+        """生成报告"""
+        self_counts: Counter = Counter()
+        total_counts: Counter = Counter()
+        total_frames = 0
+        collapsed_lines = []
+        
+        for key, count in self.stacks.most_common():
+            thread_name, stack = key[0], key[1:]
+            collapsed_lines.append(
+                ";".join([thread_name] + [_frame_label(f) for f in stack]) + f" {count}"
+            )
+            if not stack:
+                continue
+            total_frames += count
+            self_counts[stack[-1]] += count
+            for frame in set(stack):
+                total_counts[frame] += count
+        
+        top_functions = []
+        for frame, count in self_counts.most_common(top_n):
+            name, filename, lineno = frame
+            top_functions.append({
+                'function': name,
+                'file': filename,
+                'line': lineno,
+                'self_samples': count,
+                'self_percent': round(count / total_frames * 100, 2) if total_frames else 0,
+                'total_samples': total_counts[frame],
+                'total_percent': round(total_counts[frame] / total_frames * 100, 2) if total_frames else 0
+            })
+        
+        stalls = sorted(self.stalls, key=lambda s: s['duration'], reverse=True)
+        
+        return {
+            'started_at': self._started_at.isoformat() if self._started_at else None,
+            'ended_at': self._ended_at.isoformat() if self._ended_at else None,
+            'interval': self.interval,
+            'samples': self.samples,
+            'threads': len({key[0] for key in self.stacks}),
+            'pid': os.getpid(),
+            'collapsed': "\n".join(collapsed_lines),
+            'top_functions': top_functions,
+            'loop_stalls': stalls,
+            'loop_stall_summary': {
+                'count': len(stalls),
+                'total_blocked': round(sum(s['duration'] for s in stalls), 4),
+                'max_blocked': stalls[0]['duration'] if stalls else 0,
+                'threshold': self.stall_threshold
+            }
+        }
+
+
+# 全局采样分析器实例
+sampling_profiler = SamplingProfiler()
+
+
+# 导出
+__all__ = ['SamplingProfiler', 'sampling_profiler']
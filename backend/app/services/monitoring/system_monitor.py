@@ -8,7 +8,7 @@ from typing import Dict, Any, List
 from datetime import datetime
 from loguru import logger
 
-from app.database import db
+from app.services.monitoring.db_stats import db_stats
 
 
 class SystemMonitor:
@@ -200,33 +200,17 @@ class SystemMonitor:
             数据库信息字典
         """
         try:
-            # 数据库文件大小
-            import os
-            from app.config import DATA_DIR
+            # 文件与页信息（PRAGMA，O(1)）
+            summary = db_stats.get_database_summary()
             
-            db_path = DATA_DIR / "hyperliquid_analyzer.db"
-            db_size = os.path.getsize(db_path) if db_path.exists() else 0
-            
-            # 表统计
-            tables = {}
-            table_names = [
-                'wallets', 'trades', 'positions', 'transfers',
-                'leaderboards', 'system_configs', 'notifications',
-                'ai_analysis_cache', 'users', 'system_logs'
-            ]
-            
-            for table in table_names:
-                try:
-                    result = db.fetch_one(f"SELECT COUNT(*) as count FROM {table}")
-                    tables[table] = result['count'] if result else 0
-                except:
-                    tables[table] = 0
+            # 表行数（触发器维护的计数器，O(1)）
+            tables = db_stats.get_row_counts()
             
             return {
-                'size': db_size,
-                'size_mb': round(db_size / 1024 / 1024, 2),
+                **summary,
                 'tables': tables,
-                'total_records': sum(tables.values())
+                'total_records': sum(tables.values()),
+                'storage': db_stats.get_storage_stats()
             }
         except Exception as e:
             logger.error(f"获取数据库信息失败: {e}")
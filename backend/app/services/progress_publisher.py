@@ -0,0 +1,135 @@
+"""
+进度事件合并推送
+同一任务的进度更新先合并，每个任务最多每秒推送 max_rate 次；每次推送完整的进度计数
+（订阅晚了、重连或丢过消息的客户端收到下一条即可恢复完整状态）。
+
+- 发布方每处理一项都可以调用 publish，只登记取状态的函数，到推送时才计算一次进度
+- 结束时调用 close：立即推送最终状态（不受限速影响），保证订阅方一定能收到
+"""
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+from loguru import logger
+
+from app.config import config
+from app.utils.metrics import registry
+
+# 进度事件指标
+PROGRESS_EVENTS = registry.counter(
+    "progress_events",
+    "进度事件数（published 发布，sent 实际推送，coalesced 被合并）",
+    ["result"]
+)
+
+# 推送函数: (完整状态, 是否最终状态)
+SendFunc = Callable[[Dict[str, Any], bool], Awaitable[Any]]
+SnapshotFunc = Callable[[], Dict[str, Any]]
+
+
+class _Channel:
+    """单个任务的推送状态"""
+    
+    __slots__ = ("snapshot", "send", "sent_at", "timer")
+    
+    def __init__(self, snapshot: SnapshotFunc, send: SendFunc):
+        self.snapshot = snapshot
+        self.send = send
+        self.sent_at = 0.0
+        self.timer: Optional[asyncio.Task] = None
+
+
+class ProgressPublisher:
+    """按任务合并、限速的进度推送"""
+    
+    def __init__(self, max_rate: float = 4.0):
+        """
+        Args:
+            max_rate: 每个任务每秒最多推送次数
+        """
+        self.interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        self._channels: Dict[str, _Channel] = {}
+        self._counts = {"published": 0, "sent": 0, "coalesced": 0}
+    
+    def publish(self, key: str, snapshot: SnapshotFunc, send: SendFunc):
+        """
+        登记一次进度更新（不阻塞，需在事件循环内调用）
+        
+        Args:
+            key: 任务标识
+            snapshot: 推送时调用，返回当前完整状态
+            send: 推送函数
+        """
+        channel = self._channels.get(key)
+        if channel is None:
+            channel = self._channels[key] = _Channel(snapshot, send)
+        channel.snapshot = snapshot
+        channel.send = send
+        self._counts["published"] += 1
+        PROGRESS_EVENTS.labels("published").inc()
+        
+        if channel.timer is not None:
+            # 已有待推送的更新，合并
+            self._counts["coalesced"] += 1
+            PROGRESS_EVENTS.labels("coalesced").inc()
+            return
+        delay = max(0.0, channel.sent_at + self.interval - time.monotonic())
+        channel.timer = asyncio.create_task(self._send_later(channel, delay))
+    
+    async def close(self, key: str, snapshot: SnapshotFunc, send: SendFunc):
+        """
+        立即推送最终状态并结束该任务的推送
+        
+        Args:
+            key: 任务标识
+            snapshot: 返回最终完整状态
+            send: 推送函数
+        """
+        channel = self._channels.pop(key, None)
+        if channel is None:
+            channel = _Channel(snapshot, send)
+        elif channel.timer is not None:
+            channel.timer.cancel()
+            channel.timer = None
+        channel.snapshot = snapshot
+        channel.send = send
+        await self._send(channel, final=True)
+    
+    def discard(self, key: str):
+        """丢弃尚未推送的更新（任务在本进程中断，不推送最终状态）"""
+        channel = self._channels.pop(key, None)
+        if channel is not None and channel.timer is not None:
+            channel.timer.cancel()
+    
+    async def _send_later(self, channel: _Channel, delay: float):
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # 先清除定时器：推送期间的新更新会重新排期，close 也不会取消正在进行的推送
+        channel.timer = None
+        await self._send(channel, final=False)
+    
+    async def _send(self, channel: _Channel, final: bool):
+        try:
+            state = channel.snapshot()
+            channel.sent_at = time.monotonic()
+            self._counts["sent"] += 1
+            PROGRESS_EVENTS.labels("sent").inc()
+            await channel.send(state, final)
+        except Exception as e:
+            logger.error(f"推送进度失败: {e}")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "max_rate": round(1.0 / self.interval, 2) if self.interval else None,
+            "active": len(self._channels),
+            **self._counts
+        }
+
+
+# 全局进度推送实例
+progress_publisher = ProgressPublisher(
+    config.get_config("system").get("import", {}).get("progress_rate", 4)
+)
+
+
+# 导出
+__all__ = ['ProgressPublisher', 'progress_publisher']
@@ -0,0 +1,485 @@
+"""
+钱包刷新派发器
+按每个钱包的下次到期时间（next_due_at）维护最小堆，持续把最逾期的钱包派发出去，
+在途数量不超过并发上限（自适应时使用 hl_limiter），有空闲名额且有到期钱包就立即派发。
+"""
+import time
+import heapq
+import asyncio
+import itertools
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Set, Tuple
+from loguru import logger
+
+from app.database import db
+from app.services.hyperliquid import hl_limiter
+from app.services.activity_model import ActivityTracker
+from app.utils.metrics import registry
+
+# 派发指标
+DISPATCH_TRACKED = registry.gauge(
+    "refresh_dispatcher_tracked",
+    "派发器跟踪的钱包数"
+)
+DISPATCH_BACKLOG = registry.gauge(
+    "refresh_dispatcher_backlog",
+    "已到期但尚未派发的钱包数"
+)
+DISPATCH_OLDEST_LAG = registry.gauge(
+    "refresh_dispatcher_oldest_lag_seconds",
+    "最逾期钱包已超过到期时间的秒数"
+)
+DISPATCH_INFLIGHT = registry.gauge(
+    "refresh_dispatcher_inflight",
+    "正在刷新的钱包数"
+)
+DISPATCH_LAG = registry.histogram(
+    "refresh_dispatcher_lag_seconds",
+    "钱包实际派发时间相对到期时间的延迟",
+    buckets=(1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+)
+DISPATCH_REFRESHES = registry.counter(
+    "refresh_dispatcher_refreshes",
+    "派发器完成的刷新次数",
+    ["status"]
+)
+
+
+class DueQueue:
+    """
+    按到期时间排序的钱包最小堆
+    
+    重新排期或移除时不在堆内查找，只更新地址 -> (到期时间, 序号) 索引，
+    旧堆项在弹出时按索引校验后丢弃（惰性删除）。
+    """
+    
+    def __init__(self):
+        self._heap: List[Tuple[float, int, str]] = []
+        self._entries: Dict[str, Tuple[float, int]] = {}
+        self._seq = itertools.count()
+    
+    def push(self, address: str, due_at: float):
+        """加入或重新排期"""
+        seq = next(self._seq)
+        self._entries[address] = (due_at, seq)
+        heapq.heappush(self._heap, (due_at, seq, address))
+        # 惰性删除的旧项过多时重建堆
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [(due, s, addr) for addr, (due, s) in self._entries.items()]
+            heapq.heapify(self._heap)
+    
+    def remove(self, address: str) -> bool:
+        return self._entries.pop(address, None) is not None
+    
+    def _discard_stale(self):
+        heap = self._heap
+        while heap:
+            due_at, seq, address = heap[0]
+            if self._entries.get(address) == (due_at, seq):
+                return
+            heapq.heappop(heap)
+    
+    def peek(self) -> Optional[Tuple[float, str]]:
+        """最早到期的 (到期时间, 地址)"""
+        self._discard_stale()
+        if not self._heap:
+            return None
+        due_at, _, address = self._heap[0]
+        return due_at, address
+    
+    def pop_due(self, now: float) -> Optional[Tuple[str, float]]:
+        """弹出一个已到期的钱包，没有则返回 None"""
+        head = self.peek()
+        if head is None or head[0] > now:
+            return None
+        due_at, address = head
+        heapq.heappop(self._heap)
+        del self._entries[address]
+        return address, due_at
+    
+    def due_at(self, address: str) -> Optional[float]:
+        entry = self._entries.get(address)
+        return entry[0] if entry else None
+    
+    def due_times(self) -> Iterator[float]:
+        return (due_at for due_at, _ in self._entries.values())
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def __contains__(self, address: str) -> bool:
+        return address in self._entries
+
+
+def _parse_timestamp(value: Any) -> Optional[float]:
+    """数据库时间字段 -> epoch 秒"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        return None
+
+
+class RefreshDispatcher:
+    """
+    到期时间驱动的钱包刷新派发器
+    
+    - 每个钱包的间隔 = wallet_schedule.refresh_interval（单独设置时），
+      否则由活跃度模型按成交到达间隔计算（启用时），否则为 update_frequency 对应的默认间隔
+    - 刷新成功后按间隔重新排期；失败按 retry_delay 指数退避（不超过正常间隔）
+    - 定期与 wallets 表同步：新增钱包入队、已删除钱包出队、频率变化时调整到期时间
+    - 分片采集时只跟踪 owns 返回真值的钱包，分片归属变化后调用 sync 即可增减
+    """
+    
+    def __init__(
+        self,
+        refresh: Callable[[str, Callable[[], None]], Awaitable[Any]],
+        intervals: Dict[str, int],
+        max_concurrent: Optional[int] = None,
+        resync_interval: float = 60,
+        retry_delay: float = 60,
+        metrics_interval: float = 5,
+        activity: Optional[ActivityTracker] = None,
+        owns: Optional[Callable[[str], bool]] = None,
+        guard: Optional[Callable[[], bool]] = None
+    ):
+        """
+        Args:
+            refresh: 刷新单个钱包的协程函数 (地址, 释放并发名额的回调)，返回真值表示成功
+            intervals: update_frequency -> 刷新间隔（秒）
+            max_concurrent: 固定并发数；None 表示使用 hl_limiter 自适应并发
+            resync_interval: 与数据库同步钱包列表的间隔（秒）
+            retry_delay: 刷新失败后的首次重试延迟（秒）
+            metrics_interval: 积压指标采样间隔（秒）
+            activity: 活跃度模型；传入时按成交到达间隔决定刷新间隔
+            owns: 钱包是否归本进程刷新（分片采集时传入），不传表示全部钱包
+            guard: 每次派发前检查本进程是否仍可刷新（选主时传入），返回假值时暂停派发
+        """
+        self.refresh = refresh
+        self.intervals = intervals
+        self.max_concurrent = max_concurrent
+        self.resync_interval = resync_interval
+        self.retry_delay = retry_delay
+        self.metrics_interval = metrics_interval
+        self.activity = activity
+        self.owns = owns
+        self.guard = guard
+        
+        self.queue = DueQueue()
+        # 地址 -> (update_frequency, 单独设置的间隔)
+        self._profiles: Dict[str, Tuple[Optional[str], Optional[float]]] = {}
+        self._intervals: Dict[str, float] = {}
+        self._failures: Dict[str, int] = {}
+        self._inflight: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._loops: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._last_sync: Optional[float] = None
+        self._counts = {"success": 0, "failed": 0}
+        self.is_running = False
+    
+    # ==================== 生命周期 ====================
+    
+    def start(self):
+        """启动派发循环（需在事件循环内调用）"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self._wakeup = asyncio.Event()
+        if self.max_concurrent is not None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        if self.activity is not None:
+            self.activity.load_all()
+        
+        self.sync()
+        self._loops = [
+            asyncio.create_task(self._dispatch_loop()),
+            asyncio.create_task(self._housekeeping_loop())
+        ]
+        logger.info(f"✅ 刷新派发器已启动: 跟踪 {len(self.queue)} 个钱包")
+    
+    def stop(self):
+        """停止派发（正在刷新的钱包一并取消，放回队列，重新启动后立即刷新）"""
+        if not self.is_running:
+            return
+        self.is_running = False
+        for task in self._loops + list(self._tasks):
+            task.cancel()
+        self._loops = []
+        logger.info("刷新派发器已停止")
+    
+    # ==================== 钱包管理 ====================
+    
+    def baseline_interval(self, frequency: Optional[str]) -> float:
+        """update_frequency 对应的默认刷新间隔（秒）"""
+        return float(self.intervals.get(frequency or "normal", self.intervals.get("normal", 1800)))
+    
+    def interval_for(self, address: str) -> float:
+        """钱包当前的刷新间隔（秒）"""
+        frequency, override = self._profiles.get(address, (None, None))
+        if override:
+            return float(override)
+        baseline = self.baseline_interval(frequency)
+        if self.activity is not None:
+            return self.activity.interval_for(address, baseline)
+        return baseline
+    
+    def track(
+        self,
+        address: str,
+        frequency: Optional[str] = None,
+        override: Optional[float] = None,
+        due_at: Optional[float] = None
+    ):
+        """
+        加入或更新一个钱包
+        
+        Args:
+            address: 钱包地址
+            frequency: update_frequency
+            override: 单独设置的刷新间隔（秒）
+            due_at: 下次到期时间；不传时已跟踪的钱包按新间隔平移，新钱包一个间隔后到期
+        """
+        if self.owns is not None and not self.owns(address):
+            return
+        
+        self._profiles[address] = (frequency, override)
+        old_interval = self._intervals.get(address)
+        interval = self.interval_for(address)
+        self._intervals[address] = interval
+        
+        if address in self._inflight:
+            # 刷新完成后按新间隔排期
+            return
+        
+        if due_at is None:
+            current = self.queue.due_at(address)
+            if current is not None and old_interval is not None:
+                due_at = current - old_interval + interval
+            else:
+                due_at = time.time() + interval
+        
+        self.queue.push(address, due_at)
+        self._wake()
+    
+    def untrack(self, address: str):
+        """移除钱包（正在刷新的完成后不再排期）"""
+        self._profiles.pop(address, None)
+        self._intervals.pop(address, None)
+        self._failures.pop(address, None)
+        if self.activity is not None:
+            self.activity.forget(address)
+        self.queue.remove(address)
+    
+    def refresh_now(self, address: str):
+        """让已跟踪的钱包立即到期"""
+        if address in self._profiles and address not in self._inflight:
+            self.queue.push(address, time.time())
+            self._wake()
+    
+    def sync(self):
+        """与 wallets 表同步跟踪列表"""
+        rows = db.fetch_all("""
+            SELECT w.address, w.last_updated, w.update_frequency, s.refresh_interval
+            FROM wallets w
+            LEFT JOIN wallet_schedule s ON s.wallet_address = w.address
+        """)
+        
+        now = time.time()
+        seen = set()
+        added = 0
+        for row in rows:
+            address = row["address"]
+            if self.owns is not None and not self.owns(address):
+                continue
+            seen.add(address)
+            profile = (row["update_frequency"], row["refresh_interval"])
+            
+            if address in self._profiles:
+                if self._profiles[address] != profile:
+                    self.track(address, *profile)
+                elif address not in self._inflight and self.queue.due_at(address) is None:
+                    # 已跟踪但既不在队列中也不在刷新中（如刷新被取消），立即到期
+                    self.queue.push(address, now)
+                    self._wake()
+                continue
+            
+            self._profiles[address] = profile
+            interval = self.interval_for(address)
+            last_updated = _parse_timestamp(row["last_updated"])
+            # 从未刷新过的钱包立即到期
+            due_at = last_updated + interval if last_updated is not None else now
+            self.track(address, *profile, due_at=due_at)
+            added += 1
+        
+        removed = [address for address in self._profiles if address not in seen]
+        for address in removed:
+            self.untrack(address)
+        
+        self._last_sync = now
+        self._sample_metrics()
+        if added or removed:
+            logger.info(f"刷新派发器同步: 新增 {added} 个, 移除 {len(removed)} 个, 共 {len(self.queue) + len(self._inflight)} 个")
+    
+    # ==================== 派发 ====================
+    
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+    
+    async def _acquire(self):
+        if self._semaphore is not None:
+            await self._semaphore.acquire()
+        else:
+            await hl_limiter.acquire()
+    
+    def _release(self):
+        if self._semaphore is not None:
+            self._semaphore.release()
+        else:
+            hl_limiter.release()
+    
+    async def _dispatch_loop(self):
+        """先拿并发名额，再取最逾期的钱包；没有到期钱包时睡到下一个到期时间"""
+        while self.is_running:
+            try:
+                await self._acquire()
+                self._wakeup.clear()
+                item = self.queue.pop_due(time.time())
+                
+                if item is None:
+                    self._release()
+                    head = self.queue.peek()
+                    timeout = None if head is None else max(0.0, head[0] - time.time())
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                
+                address, due_at = item
+                if self.guard is not None and not self.guard():
+                    # 已不是主进程（降级回调将停止派发器）：放回队列，暂不刷新
+                    self.queue.push(address, due_at)
+                    self._release()
+                    await asyncio.sleep(1)
+                    continue
+                
+                self._inflight.add(address)
+                DISPATCH_INFLIGHT.set(len(self._inflight))
+                DISPATCH_LAG.observe(max(0.0, time.time() - due_at))
+                
+                task = asyncio.create_task(self._refresh_one(address))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ 刷新派发异常: {e}")
+                await asyncio.sleep(1)
+    
+    async def _refresh_one(self, address: str):
+        ok = False
+        released = False
+        
+        def release():
+            # 刷新方可以在抓取结束后提前释放并发名额（计算、写库不占用）
+            nonlocal released
+            if not released:
+                released = True
+                self._release()
+        
+        try:
+            ok = bool(await self.refresh(address, release))
+        except asyncio.CancelledError:
+            # 派发器停止：放回队列，重新启动后立即刷新
+            if address in self._profiles:
+                self.queue.push(address, time.time())
+            raise
+        except Exception as e:
+            logger.error(f"❌ 刷新钱包失败 {address}: {e}")
+        finally:
+            release()
+            self._inflight.discard(address)
+            DISPATCH_INFLIGHT.set(len(self._inflight))
+        
+        status = "success" if ok else "failed"
+        self._counts[status] += 1
+        DISPATCH_REFRESHES.labels(status).inc()
+        
+        if address not in self._profiles:
+            # 刷新期间已被移除
+            return
+        
+        interval = self.interval_for(address)
+        self._intervals[address] = interval
+        if ok:
+            self._failures.pop(address, None)
+            delay = interval
+            if self.activity is not None:
+                frequency, override = self._profiles[address]
+                self.activity.account(interval, self.baseline_interval(frequency))
+        else:
+            failures = self._failures.get(address, 0) + 1
+            self._failures[address] = failures
+            delay = min(interval, self.retry_delay * 2 ** (failures - 1))
+        
+        self.queue.push(address, time.time() + delay)
+        self._wake()
+    
+    async def _housekeeping_loop(self):
+        """定期采样积压指标，并按 resync_interval 与数据库同步"""
+        while self.is_running:
+            await asyncio.sleep(self.metrics_interval)
+            try:
+                if time.time() - (self._last_sync or 0) >= self.resync_interval:
+                    self.sync()
+                else:
+                    self._sample_metrics()
+            except Exception as e:
+                logger.error(f"❌ 刷新派发器同步失败: {e}")
+    
+    # ==================== 统计 ====================
+    
+    def _backlog(self, now: float) -> Tuple[int, float]:
+        """(已到期数量, 最大逾期秒数)"""
+        count = 0
+        oldest = None
+        for due_at in self.queue.due_times():
+            if due_at <= now:
+                count += 1
+                if oldest is None or due_at < oldest:
+                    oldest = due_at
+        return count, (now - oldest) if oldest is not None else 0.0
+    
+    def _sample_metrics(self):
+        backlog, oldest_lag = self._backlog(time.time())
+        DISPATCH_TRACKED.set(len(self.queue) + len(self._inflight))
+        DISPATCH_BACKLOG.set(backlog)
+        DISPATCH_OLDEST_LAG.set(oldest_lag)
+        DISPATCH_INFLIGHT.set(len(self._inflight))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """派发器状态"""
+        now = time.time()
+        backlog, oldest_lag = self._backlog(now)
+        head = self.queue.peek()
+        return {
+            "is_running": self.is_running,
+            "tracked": len(self.queue) + len(self._inflight),
+            "inflight": len(self._inflight),
+            "backlog": backlog,
+            "oldest_lag_s": round(oldest_lag, 1),
+            "next_due_in_s": round(max(0.0, head[0] - now), 1) if head else None,
+            "retrying": len(self._failures),
+            "refreshes": dict(self._counts),
+            "activity": self.activity.get_stats() if self.activity else None,
+            "concurrency": "adaptive" if self.max_concurrent is None else self.max_concurrent
+        }
+
+
+# 导出
+__all__ = ['DueQueue', 'RefreshDispatcher']
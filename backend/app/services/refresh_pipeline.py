@@ -0,0 +1,385 @@
+"""
+钱包刷新流水线
+抓取（事件循环内，异步） -> 计算（进程池：数据处理、指标、评分） -> 写库（专用线程和数据库连接，批量提交）
+
+阶段之间用有界队列连接：计算或写库跟不上时，抓取方在入队处等待（背压），
+事件循环上只剩网络 I/O，大钱包的计算和写库不再阻塞 HTTP 接口。
+"""
+import time
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, AsyncContextManager, Callable, Dict, List, Optional, Set, Tuple
+from loguru import logger
+
+from app.database import db
+from app.config import config
+from app.services.hyperliquid import hl_limiter
+from app.utils.metrics import registry
+from app.utils.tracing import tracer
+
+# 流水线指标
+PIPELINE_QUEUE_DEPTH = registry.gauge(
+    "refresh_pipeline_queue_depth",
+    "流水线阶段入口队列长度",
+    ["stage"]
+)
+PIPELINE_UTILIZATION = registry.gauge(
+    "refresh_pipeline_utilization",
+    "流水线阶段利用率（最近一个采样周期内忙碌时间 / 可用时间）",
+    ["stage"]
+)
+PIPELINE_STAGE_SECONDS = registry.histogram(
+    "refresh_pipeline_stage_seconds",
+    "流水线各阶段单个钱包（写库为单批）耗时",
+    ["stage"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+PIPELINE_WRITE_BATCH = registry.histogram(
+    "refresh_pipeline_write_batch_size",
+    "每次提交写入的钱包数",
+    buckets=(1, 2, 5, 10, 20, 50, 100)
+)
+
+DEFAULT_PIPELINE_CONFIG = {
+    "enabled": True,
+    "compute_workers": 2,      # 计算进程数；0 表示在事件循环内计算（不启用进程池）
+    "compute_queue": 16,
+    "write_queue": 64,
+    "write_batch_size": 20,
+    "write_batch_delay": 0.2,  # 凑批最多等待秒数
+    "sample_interval": 5
+}
+
+# 计算进程内的分析器（每个进程创建一次）
+_worker_analyzer = None
+
+
+def _compute_in_worker(address: str, raw: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+    """
+    计算进程入口：处理原始数据并计算指标和评分
+    
+    Returns:
+        (钱包数据, 写入 wallets 表的字段, 分析结果)
+    """
+    global _worker_analyzer
+    if _worker_analyzer is None:
+        from app.services.wallet_analyzer import WalletAnalyzer
+        _worker_analyzer = WalletAnalyzer(use_mock=True)
+    
+    client = _worker_analyzer.hl_client
+    try:
+        wallet_data = client.build_wallet_data(address, raw)
+    except Exception as e:
+        # 与 HyperLiquidClient.get_wallet_data 一致：处理失败回退到 Mock 数据
+        logger.error(f"❌ 处理钱包数据失败 {address}: {e}")
+        wallet_data = client._generate_mock_wallet_data(address)
+    final_data, result = _worker_analyzer.compute_wallet_result(address, wallet_data)
+    return wallet_data, final_data, result
+
+
+class _Stage:
+    """阶段统计"""
+    
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.busy = 0.0
+        self.processed = 0
+        self.errors = 0
+        self.utilization = 0.0
+        self._busy_mark = 0.0
+    
+    def record(self, seconds: float, ok: bool = True):
+        self.busy += seconds
+        self.processed += 1
+        if not ok:
+            self.errors += 1
+        PIPELINE_STAGE_SECONDS.labels(self.name).observe(seconds)
+    
+    def sample(self, elapsed: float, workers: Optional[int] = None):
+        """计算最近一个周期的利用率"""
+        capacity = elapsed * max(1, workers or self.workers)
+        self.utilization = min(1.0, (self.busy - self._busy_mark) / capacity) if capacity > 0 else 0.0
+        self._busy_mark = self.busy
+        PIPELINE_UTILIZATION.labels(self.name).set(round(self.utilization, 4))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "processed": self.processed,
+            "errors": self.errors,
+            "busy_s": round(self.busy, 2),
+            "utilization": round(self.utilization, 4)
+        }
+
+
+class RefreshPipeline:
+    """
+    分阶段的钱包刷新
+    
+    run(address) 在调用方协程内完成抓取，抓取的并发名额只在抓取期间占用（slot / on_fetched），
+    然后把原始数据交给计算阶段，等待写库完成后返回分析结果（失败返回 None）。
+    计算、写库跟不上时在入队处等待，不占用抓取名额。
+    """
+    
+    def __init__(self, settings: Optional[Dict[str, Any]] = None):
+        settings = {**DEFAULT_PIPELINE_CONFIG, **(settings or {})}
+        self.enabled = settings["enabled"]
+        self.compute_workers = max(0, int(settings["compute_workers"]))
+        self.compute_queue_size = settings["compute_queue"]
+        self.write_queue_size = settings["write_queue"]
+        self.write_batch_size = max(1, settings["write_batch_size"])
+        self.write_batch_delay = settings["write_batch_delay"]
+        self.sample_interval = settings["sample_interval"]
+        
+        self.analyzer = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # 写库线程（单线程，使用自己的数据库连接）
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self._compute_queue: Optional[asyncio.Queue] = None
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        # 已交给计算阶段、尚未返回结果的钱包
+        self._pending: Set[asyncio.Future] = set()
+        self._fetching = 0
+        self.is_running = False
+        
+        self.stages = {
+            "fetch": _Stage("fetch", 0),
+            "compute": _Stage("compute", max(1, self.compute_workers)),
+            "write": _Stage("write", 1)
+        }
+    
+    # ==================== 生命周期 ====================
+    
+    def start(self):
+        """启动计算和写库阶段（需在事件循环内调用；run 会按需自动启动）"""
+        if self.is_running:
+            return
+        from app.services.wallet_analyzer import WalletAnalyzer
+        
+        self.analyzer = self.analyzer or WalletAnalyzer(use_mock=False)
+        self._compute_queue = asyncio.Queue(maxsize=self.compute_queue_size)
+        self._write_queue = asyncio.Queue(maxsize=self.write_queue_size)
+        self._pool = self._create_pool()
+        self._writer = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="pipeline-writer",
+            initializer=db.open_thread_connection
+        )
+        self._tasks = [asyncio.create_task(self._compute_loop()) for _ in range(max(1, self.compute_workers))]
+        self._tasks.append(asyncio.create_task(self._write_loop()))
+        self._tasks.append(asyncio.create_task(self._sample_loop()))
+        self.is_running = True
+        logger.info(f"✅ 刷新流水线已启动: 计算进程 {self.compute_workers}, 写库批量 {self.write_batch_size}")
+    
+    def stop(self):
+        """停止流水线（未完成的钱包返回 None）"""
+        if not self.is_running:
+            return
+        self.is_running = False
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        
+        # 队列中和被取消的阶段协程正在处理的钱包都返回 None，调用方不会一直等待
+        for future in self._pending:
+            if not future.done():
+                future.set_result(None)
+        self._pending.clear()
+        for queue in (self._compute_queue, self._write_queue):
+            while queue is not None and not queue.empty():
+                queue.get_nowait()
+        
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        if self._writer is not None:
+            # 正在写的一批写完后关闭写库线程的连接
+            self._writer.submit(db.close_thread_connection)
+            self._writer.shutdown(wait=False)
+            self._writer = None
+        logger.info("刷新流水线已停止")
+    
+    def _create_pool(self) -> Optional[ProcessPoolExecutor]:
+        if self.compute_workers == 0:
+            return None
+        # spawn：子进程不继承事件循环、连接池等线程状态
+        return ProcessPoolExecutor(
+            max_workers=self.compute_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    
+    # ==================== 抓取 ====================
+    
+    async def run(
+        self,
+        address: str,
+        slot: Optional[Callable[[], AsyncContextManager]] = None,
+        on_fetched: Optional[Callable[[], Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        刷新一个钱包
+        
+        Args:
+            address: 钱包地址
+            slot: 抓取并发名额（如 hl_limiter.slot），只在抓取期间占用
+            on_fetched: 抓取结束（成功或失败）时调用，供已提前占用名额的调用方释放名额
+        
+        Returns:
+            分析结果；失败返回 None
+        """
+        if not self.is_running:
+            self.start()
+        
+        with tracer.trace("wallet_refresh", address=address, pipeline=True) as root:
+            self._fetching += 1
+            start = time.perf_counter()
+            ok = False
+            try:
+                with tracer.span("fetch"):
+                    if slot is not None:
+                        async with slot():
+                            raw = await self.analyzer.hl_client.fetch_wallet_raw(address)
+                    else:
+                        raw = await self.analyzer.hl_client.fetch_wallet_raw(address)
+                ok = True
+            except Exception as e:
+                root.error = f"{type(e).__name__}: {e}"
+                logger.error(f"抓取钱包数据失败 {address}: {e}")
+                return None
+            finally:
+                self._fetching -= 1
+                self.stages["fetch"].record(time.perf_counter() - start, ok)
+                if on_fetched is not None:
+                    on_fetched()
+            
+            future = asyncio.get_running_loop().create_future()
+            self._pending.add(future)
+            try:
+                with tracer.span("compute_and_write"):
+                    await self._compute_queue.put((address, raw, future))
+                    result = await future
+            finally:
+                self._pending.discard(future)
+            if result is None:
+                root.error = "compute or write failed"
+            return result
+    
+    # ==================== 计算 ====================
+    
+    async def _compute(self, address: str, raw: Dict[str, Any]):
+        if self._pool is None:
+            return _compute_in_worker(address, raw)
+        
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._pool, _compute_in_worker, address, raw)
+        except BrokenProcessPool:
+            # 计算进程异常退出（如内存不足被杀），重建进程池后重试一次
+            logger.warning("⚠️ 计算进程池已损坏，重建后重试")
+            self._pool = self._create_pool()
+            return await loop.run_in_executor(self._pool, _compute_in_worker, address, raw)
+    
+    async def _compute_loop(self):
+        stage = self.stages["compute"]
+        while True:
+            address, raw, future = await self._compute_queue.get()
+            start = time.perf_counter()
+            try:
+                wallet_data, final_data, result = await self._compute(address, raw)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                stage.record(time.perf_counter() - start, ok=False)
+                logger.error(f"计算钱包指标失败 {address}: {e}")
+                if not future.done():
+                    future.set_result(None)
+                continue
+            stage.record(time.perf_counter() - start)
+            
+            await self._write_queue.put((address, final_data, wallet_data, result, future))
+    
+    # ==================== 写库 ====================
+    
+    async def _write_loop(self):
+        """凑满 write_batch_size 或等待 write_batch_delay 后交给写库线程一次提交"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._write_queue.get()]
+            deadline = loop.time() + self.write_batch_delay
+            while len(batch) < self.write_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._write_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            start = time.perf_counter()
+            results = await loop.run_in_executor(self._writer, self._write_batch, batch)
+            self.stages["write"].record(time.perf_counter() - start, all(r is not None for r in results))
+            PIPELINE_WRITE_BATCH.observe(len(batch))
+            
+            for item, result in zip(batch, results):
+                future = item[-1]
+                if not future.done():
+                    future.set_result(result)
+    
+    def _write_batch(self, batch: List[Tuple]) -> List[Optional[Dict[str, Any]]]:
+        """同一事务内写入一批钱包，单个钱包失败只回滚它自己（保存点）；在写库线程中执行"""
+        results: List[Optional[Dict[str, Any]]] = []
+        try:
+            with db.batch():
+                for i, (address, final_data, wallet_data, result, _) in enumerate(batch):
+                    try:
+                        with db.savepoint(f"wallet_{i}"):
+                            self.analyzer.persist_wallet_result(address, final_data, wallet_data)
+                        results.append(result)
+                        logger.info(f"✅ 钱包分析完成: {address}, 评分: {result['score']}, 等级: {result['grade']}")
+                    except Exception as e:
+                        logger.error(f"保存钱包失败 {address}: {e}")
+                        results.append(None)
+        except Exception as e:
+            logger.error(f"❌ 批量提交失败（{len(batch)} 个钱包）: {e}")
+            return [None] * len(batch)
+        return results
+    
+    # ==================== 统计 ====================
+    
+    async def _sample_loop(self):
+        last = time.perf_counter()
+        while True:
+            await asyncio.sleep(self.sample_interval)
+            now = time.perf_counter()
+            elapsed = now - last
+            last = now
+            # 抓取阶段的并发由 hl_limiter 决定
+            self.stages["fetch"].sample(elapsed, hl_limiter.current_limit)
+            self.stages["compute"].sample(elapsed)
+            self.stages["write"].sample(elapsed)
+            PIPELINE_QUEUE_DEPTH.labels("compute").set(self._compute_queue.qsize())
+            PIPELINE_QUEUE_DEPTH.labels("write").set(self._write_queue.qsize())
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "is_running": self.is_running,
+            "fetching": self._fetching,
+            "queues": {
+                "compute": self._compute_queue.qsize() if self._compute_queue else 0,
+                "write": self._write_queue.qsize() if self._write_queue else 0
+            },
+            "stages": {name: stage.get_stats() for name, stage in self.stages.items()}
+        }
+
+
+# 全局刷新流水线实例
+refresh_pipeline = RefreshPipeline(config.get_config("system").get("collector", {}).get("pipeline"))
+
+
+# 导出
+__all__ = ['RefreshPipeline', 'refresh_pipeline']
@@ -3,16 +3,49 @@
 定时更新钱包数据
 """
 import asyncio
-from typing import List, Dict, Any, Optional
+import time
+import functools
+from typing import List, Dict, Any, Awaitable, Callable, Optional
 from datetime import datetime, timedelta
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.events import (
+    EVENT_JOB_SUBMITTED, EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, EVENT_JOB_MISSED
+)
 from loguru import logger
 
 from app.services.wallet_analyzer import WalletAnalyzer
+from app.services.hyperliquid import hl_limiter
+from app.services.refresh_dispatcher import RefreshDispatcher
+from app.services.activity_model import activity_tracker
+from app.services.change_probe import change_probe
+from app.services.refresh_pipeline import refresh_pipeline
+from app.services.shard_lease import create_shard_lease_manager
+from app.services.address_index import address_index
+from app.services.leader import leader_election
 from app.database import db
 from app.config import config
+from app.services.monitoring.db_stats import db_stats
+from app.utils.metrics import registry
+
+# 调度任务指标
+SCHEDULER_JOB_LAG = registry.histogram(
+    "scheduler_job_lag_seconds",
+    "任务实际开始时间相对计划时间的延迟",
+    ["job"]
+)
+SCHEDULER_JOB_SECONDS = registry.histogram(
+    "scheduler_job_duration_seconds",
+    "调度任务执行耗时",
+    ["job", "status"],
+    buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+)
+SCHEDULER_JOBS_MISSED = registry.counter(
+    "scheduler_jobs_missed",
+    "错过执行时间的调度任务次数",
+    ["job"]
+)
 
 
 class DataScheduler:
@@ -32,8 +65,39 @@ class DataScheduler:
             "inactive": 3600    # 不活跃钱包：1 小时
         })
         
+        # 任务开始时间（用于统计执行耗时）
+        self._job_started: Dict[str, float] = {}
+        self.scheduler.add_listener(
+            self._on_job_event,
+            EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED
+        )
+        
         self.batch_size = scheduler_config.get("batch_size", 10)
         self.max_concurrent = scheduler_config.get("max_concurrent", 5)
+        # 自适应并发（开启时忽略 max_concurrent，由 hl_limiter 按上游状况调整）
+        self.adaptive_concurrency = config.get_config("system").get("collector", {}).get("adaptive_concurrency", True)
+        self.db_stats_interval = scheduler_config.get("db_stats_interval", 3600)
+        
+        # 钱包刷新方式：due（按到期时间持续派发）/ interval（三个固定间隔任务）
+        self.mode = scheduler_config.get("mode", "due")
+        
+        # 分片采集：多个进程按分片租约各自刷新一部分钱包（仅 due 模式）
+        self.shards = create_shard_lease_manager(on_change=self._on_shards_changed)
+        if self.shards.enabled and self.mode == "interval":
+            logger.warning("⚠️ 分片采集只支持 due 刷新方式，interval 模式下忽略分片配置")
+            self.shards.enabled = False
+        
+        self.dispatcher = RefreshDispatcher(
+            self.refresh_wallet,
+            self.update_intervals,
+            max_concurrent=self._batch_concurrency(),
+            resync_interval=scheduler_config.get("resync_interval", 60),
+            retry_delay=scheduler_config.get("retry_delay", 60),
+            activity=activity_tracker if activity_tracker.enabled else None,
+            owns=self.shards.owns if self.shards.enabled else None,
+            # 分片采集时各进程都刷新自己的分片，不按主进程身份暂停派发
+            guard=(lambda: leader_election.is_leader) if leader_election.enabled and not self.shards.enabled else None
+        )
     
     def start(self):
         """启动调度器"""
@@ -47,9 +111,67 @@ class DataScheduler:
         
         # 添加定时任务
         
+        # 1-3. 钱包刷新
+        if self.mode == "interval":
+            self._add_interval_jobs()
+        
+        # 4. 清理过期数据（每天凌晨 3 点）
+        self.scheduler.add_job(
+            self._singleton(self.cleanup_old_data),
+            trigger=CronTrigger(hour=3, minute=0),
+            id="cleanup_old_data",
+            name="清理过期数据",
+            max_instances=1
+        )
+        
+        # 5. 刷新数据库存储统计（每小时）
+        self.scheduler.add_job(
+            self._singleton(self.refresh_db_stats),
+            trigger=IntervalTrigger(seconds=self.db_stats_interval),
+            id="refresh_db_stats",
+            name="刷新数据库统计",
+            max_instances=1,
+            coalesce=True
+        )
+        
+        # 6. 按交易活跃度调整钱包更新频率（每小时）
+        self.scheduler.add_job(
+            self._singleton(self.update_wallet_frequency),
+            trigger=IntervalTrigger(seconds=activity_tracker.frequency_update_interval),
+            id="update_wallet_frequency",
+            name="调整钱包更新频率",
+            max_instances=1,
+            coalesce=True
+        )
+        
+        # 7. 统计报告（每天早上 9 点）
+        self.scheduler.add_job(
+            self._singleton(self.generate_daily_report),
+            trigger=CronTrigger(hour=9, minute=0),
+            id="generate_daily_report",
+            name="生成每日报告",
+            max_instances=1
+        )
+        
+        self.scheduler.start()
+        if self.shards.enabled:
+            self.shards.start()
+        if self.mode != "interval":
+            self.dispatcher.start()
+        self.is_running = True
+        
+        logger.info("✅ 调度器启动成功")
+        logger.info(f"钱包刷新方式: {self.mode}")
+        logger.info(f"活跃钱包更新间隔: {self.update_intervals['active']} 秒")
+        logger.info(f"普通钱包更新间隔: {self.update_intervals['normal']} 秒")
+        logger.info(f"不活跃钱包更新间隔: {self.update_intervals['inactive']} 秒")
+        logger.info("=" * 60)
+    
+    def _add_interval_jobs(self):
+        """按活跃度分三档的固定间隔刷新任务（mode = interval 时使用）"""
         # 1. 活跃钱包更新（每 5 分钟）
         self.scheduler.add_job(
-            self.update_active_wallets,
+            self._singleton(self.update_active_wallets),
             trigger=IntervalTrigger(seconds=self.update_intervals["active"]),
             id="update_active_wallets",
             name="更新活跃钱包",
@@ -59,7 +181,7 @@ class DataScheduler:
         
         # 2. 普通钱包更新（每 30 分钟）
         self.scheduler.add_job(
-            self.update_normal_wallets,
+            self._singleton(self.update_normal_wallets),
             trigger=IntervalTrigger(seconds=self.update_intervals["normal"]),
             id="update_normal_wallets",
             name="更新普通钱包",
@@ -69,40 +191,82 @@ class DataScheduler:
         
         # 3. 不活跃钱包更新（每 1 小时）
         self.scheduler.add_job(
-            self.update_inactive_wallets,
+            self._singleton(self.update_inactive_wallets),
             trigger=IntervalTrigger(seconds=self.update_intervals["inactive"]),
             id="update_inactive_wallets",
             name="更新不活跃钱包",
             max_instances=1,
             coalesce=True
         )
+    
+    def runs_singleton_jobs(self) -> bool:
+        """
+        本进程是否运行全局只需一份的定时任务（清理、统计、调整频率、日报等）
         
-        # 4. 清理过期数据（每天凌晨 3 点）
-        self.scheduler.add_job(
-            self.cleanup_old_data,
-            trigger=CronTrigger(hour=3, minute=0),
-            id="cleanup_old_data",
-            name="清理过期数据",
-            max_instances=1
-        )
+        开启选主时由主进程运行；只开启分片采集时由持有 0 号分片的进程运行；都未开启时本进程运行。
+        """
+        if leader_election.enabled:
+            return leader_election.is_leader
+        if self.shards.enabled:
+            return 0 in self.shards.owned
+        return True
+    
+    def _singleton(self, job: Callable[[], Awaitable[Any]]) -> Callable[[], Awaitable[Any]]:
+        """包装单例定时任务：多个采集进程时只有负责的进程执行，其余跳过本次执行"""
+        if not leader_election.enabled and not self.shards.enabled:
+            return job
         
-        # 5. 统计报告（每天早上 9 点）
-        self.scheduler.add_job(
-            self.generate_daily_report,
-            trigger=CronTrigger(hour=9, minute=0),
-            id="generate_daily_report",
-            name="生成每日报告",
-            max_instances=1
-        )
+        @functools.wraps(job)
+        async def run():
+            if not self.runs_singleton_jobs():
+                logger.debug(f"非单例任务负责进程，跳过任务: {job.__name__}")
+                return None
+            return await job()
+        return run
+    
+    async def refresh_wallet(self, address: str, on_fetched: Optional[Callable[[], Any]] = None) -> bool:
+        """
+        刷新单个钱包（派发器入口）
         
-        self.scheduler.start()
-        self.is_running = True
+        先做变化探测，自上次完整刷新后没有新成交时跳过完整刷新。
         
-        logger.info("✅ 调度器启动成功")
-        logger.info(f"活跃钱包更新间隔: {self.update_intervals['active']} 秒")
-        logger.info(f"普通钱包更新间隔: {self.update_intervals['normal']} 秒")
-        logger.info(f"不活跃钱包更新间隔: {self.update_intervals['inactive']} 秒")
-        logger.info("=" * 60)
+        Args:
+            address: 钱包地址
+            on_fetched: 走流水线时抓取结束即调用（派发器提前释放并发名额）
+        
+        Returns:
+            是否成功（跳过也算成功）
+        """
+        if change_probe.enabled and not self.analyzer.hl_client.use_mock:
+            if await change_probe.unchanged(address, self.analyzer.hl_client):
+                return True
+        
+        if refresh_pipeline.enabled:
+            return bool(await refresh_pipeline.run(address, on_fetched=on_fetched))
+        return bool(await self.analyzer.analyze_wallet(address))
+    
+    def _on_shards_changed(self, owned):
+        """持有的分片变化后重新同步派发器（接管新分片的钱包、放下已交出的钱包）"""
+        if self.dispatcher.is_running:
+            self.dispatcher.sync()
+    
+    def _on_job_event(self, event):
+        """记录任务延迟和耗时指标"""
+        if event.code == EVENT_JOB_SUBMITTED:
+            self._job_started[event.job_id] = time.perf_counter()
+            if event.scheduled_run_times:
+                run_time = event.scheduled_run_times[0]
+                lag = (datetime.now(run_time.tzinfo) - run_time).total_seconds()
+                SCHEDULER_JOB_LAG.labels(event.job_id).observe(max(lag, 0))
+        elif event.code == EVENT_JOB_MISSED:
+            SCHEDULER_JOBS_MISSED.labels(event.job_id).inc()
+        else:
+            started = self._job_started.pop(event.job_id, None)
+            if started is not None:
+                status = "error" if event.code == EVENT_JOB_ERROR else "success"
+                SCHEDULER_JOB_SECONDS.labels(event.job_id, status).observe(
+                    time.perf_counter() - started
+                )
     
     def stop(self):
         """停止调度器"""
@@ -110,6 +274,9 @@ class DataScheduler:
             return
         
         logger.info("停止数据采集调度器...")
+        self.dispatcher.stop()
+        self.shards.stop()
+        refresh_pipeline.stop()
         self.scheduler.shutdown()
         self.is_running = False
         logger.info("✅ 调度器已停止")
@@ -136,14 +303,15 @@ class DataScheduler:
             logger.info(f"准备更新 {len(addresses)} 个活跃钱包")
             
             # 批量更新
-            results = await self.analyzer.batch_analyze_wallets(
+            success_count = 0
+            async for item in self.analyzer.iter_analyze_wallets(
                 addresses,
-                max_concurrent=self.max_concurrent
-            )
-            
-            success_count = len([r for r in results if r])
+                max_concurrent=self._batch_concurrency()
+            ):
+                if item.ok:
+                    success_count += 1
             logger.info(f"✅ 活跃钱包更新完成: {success_count}/{len(addresses)}")
-            
+        
         except Exception as e:
             logger.error(f"❌ 更新活跃钱包失败: {e}")
     
@@ -167,14 +335,15 @@ class DataScheduler:
             addresses = [w["address"] for w in wallets]
             logger.info(f"准备更新 {len(addresses)} 个普通钱包")
             
-            results = await self.analyzer.batch_analyze_wallets(
+            success_count = 0
+            async for item in self.analyzer.iter_analyze_wallets(
                 addresses,
-                max_concurrent=self.max_concurrent
-            )
-            
-            success_count = len([r for r in results if r])
+                max_concurrent=self._batch_concurrency()
+            ):
+                if item.ok:
+                    success_count += 1
             logger.info(f"✅ 普通钱包更新完成: {success_count}/{len(addresses)}")
-            
+        
         except Exception as e:
             logger.error(f"❌ 更新普通钱包失败: {e}")
     
@@ -198,53 +367,47 @@ class DataScheduler:
             addresses = [w["address"] for w in wallets]
             logger.info(f"准备更新 {len(addresses)} 个不活跃钱包")
             
-            results = await self.analyzer.batch_analyze_wallets(
+            success_count = 0
+            async for item in self.analyzer.iter_analyze_wallets(
                 addresses,
-                max_concurrent=self.max_concurrent
-            )
-            
-            success_count = len([r for r in results if r])
+                max_concurrent=self._batch_concurrency()
+            ):
+                if item.ok:
+                    success_count += 1
             logger.info(f"✅ 不活跃钱包更新完成: {success_count}/{len(addresses)}")
-            
+        
         except Exception as e:
             logger.error(f"❌ 更新不活跃钱包失败: {e}")
     
     async def update_wallet_frequency(self):
         """
-        根据钱包活跃度自动调整更新频率
-        - 高评分且最近有交易 -> active
-        - 中等评分或有一定交易 -> normal
-        - 低评分或长时间无交易 -> inactive
+        根据钱包实际交易活跃度调整更新频率（依据 wallet_activity 中的最近成交时间和成交间隔）
+        - 最近 24 小时有成交且平均成交间隔不超过 1 小时 -> active
+        - 最近 7 天有成交 -> normal
+        - 超过 7 天无成交（或从未成交） -> inactive
         """
         try:
             logger.info("🔄 调整钱包更新频率...")
             
-            # 活跃钱包：评分 > 80 且最近 24 小时有交易
-            db.execute("""
-                UPDATE wallets 
-                SET update_frequency = 'active'
-                WHERE smart_money_score >= 80
-                AND (julianday('now') - julianday(last_updated)) < 1
-            """)
+            now = int(time.time())
+            day = 86400
             
-            # 普通钱包：评分 60-80 或最近 7 天有交易
-            db.execute("""
-                UPDATE wallets 
-                SET update_frequency = 'normal'
-                WHERE (smart_money_score >= 60 AND smart_money_score < 80)
-                OR (julianday('now') - julianday(last_updated)) < 7
-            """)
-            
-            # 不活跃钱包：评分 < 60 且超过 7 天无更新
-            db.execute("""
-                UPDATE wallets 
-                SET update_frequency = 'inactive'
-                WHERE smart_money_score < 60
-                AND (julianday('now') - julianday(last_updated)) >= 7
-            """)
-            
-            logger.info("✅ 钱包更新频率调整完成")
+            result = db.execute("""
+                UPDATE wallets
+                SET update_frequency = (
+                    SELECT CASE
+                        WHEN a.last_fill_time >= ? AND a.ewma_gap_seconds <= 3600 THEN 'active'
+                        WHEN a.last_fill_time >= ? THEN 'normal'
+                        ELSE 'inactive'
+                    END
+                    FROM wallet_activity a
+                    WHERE a.wallet_address = wallets.address
+                )
+                WHERE address IN (SELECT wallet_address FROM wallet_activity)
+            """, (now - day, now - 7 * day))
             
+            logger.info(f"✅ 钱包更新频率调整完成: {result.rowcount} 个")
+        
         except Exception as e:
             logger.error(f"❌ 调整更新频率失败: {e}")
     
@@ -267,19 +430,29 @@ class DataScheduler:
             """)
             logger.info(f"清理了 {result.rowcount} 条过期 AI 缓存")
             
-            logger.info("✅ 数据清理完成")
+            # 校正表行数计数器
+            db_stats.reconcile_row_counts()
             
+            logger.info("✅ 数据清理完成")
+        
         except Exception as e:
             logger.error(f"❌ 数据清理失败: {e}")
     
+    async def refresh_db_stats(self):
+        """刷新数据库存储统计（页数、碎片率）"""
+        try:
+            logger.info("📦 刷新数据库存储统计...")
+            await db_stats.refresh_storage_stats()
+        except Exception as e:
+            logger.error(f"❌ 刷新数据库统计失败: {e}")
+    
     async def generate_daily_report(self):
         """生成每日统计报告"""
         try:
             logger.info("📊 生成每日统计报告...")
             
-            # 统计总钱包数
-            total_wallets = db.fetch_one("SELECT COUNT(*) as count FROM wallets")
-            total_count = total_wallets["count"] if total_wallets else 0
+            # 统计总钱包数（计数器，O(1)）
+            total_count = db_stats.get_row_count("wallets")
             
             # 统计各等级钱包数
             grade_stats = db.fetch_all("""
@@ -329,7 +502,7 @@ class DataScheduler:
                 "info",
                 datetime.now().isoformat()
             ))
-            
+        
         except Exception as e:
             logger.error(f"❌ 生成报告失败: {e}")
     
@@ -362,10 +535,11 @@ class DataScheduler:
                     "UPDATE wallets SET update_frequency = ? WHERE address = ?",
                     (frequency, address)
                 )
+                self.dispatcher.track(address, frequency)
                 logger.info(f"✅ 钱包添加成功: {address}, 评分: {result['score']}")
             else:
                 logger.error(f"❌ 钱包分析失败: {address}")
-            
+        
         except Exception as e:
             logger.error(f"❌ 添加钱包失败 {address}: {e}")
     
@@ -373,10 +547,42 @@ class DataScheduler:
         """从监控列表移除钱包"""
         try:
             db.execute("DELETE FROM wallets WHERE address = ?", (address,))
+            address_index.discard(address)
+            self.dispatcher.untrack(address)
             logger.info(f"✅ 钱包已移除: {address}")
         except Exception as e:
             logger.error(f"❌ 移除钱包失败 {address}: {e}")
     
+    def set_wallet_interval(self, address: str, interval: Optional[int]):
+        """
+        设置单个钱包的刷新间隔
+        
+        Args:
+            address: 钱包地址
+            interval: 刷新间隔（秒）；None 表示恢复按 update_frequency
+        """
+        wallet = db.fetch_one(
+            "SELECT update_frequency FROM wallets WHERE address = ?",
+            (address,)
+        )
+        if not wallet:
+            raise ValueError(f"钱包不存在: {address}")
+        
+        db.execute("""
+            INSERT INTO wallet_schedule (wallet_address, refresh_interval, updated_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT(wallet_address) DO UPDATE SET
+                refresh_interval = excluded.refresh_interval,
+                updated_at = excluded.updated_at
+        """, (address, interval, datetime.now().isoformat()))
+        
+        self.dispatcher.track(address, wallet["update_frequency"], interval)
+        logger.info(f"钱包刷新间隔已设置: {address} -> {interval or wallet['update_frequency']}")
+    
+    def _batch_concurrency(self) -> Optional[int]:
+        """批量更新的并发数（None 表示使用自适应并发）"""
+        return None if self.adaptive_concurrency else self.max_concurrent
+    
     def get_scheduler_status(self) -> Dict[str, Any]:
         """获取调度器状态"""
         jobs = []
@@ -391,9 +597,16 @@ class DataScheduler:
         return {
             "is_running": self.is_running,
             "jobs": jobs,
+            "mode": self.mode,
+            "dispatcher": self.dispatcher.get_stats(),
+            "probe": change_probe.get_stats(),
+            "pipeline": refresh_pipeline.get_stats(),
+            "sharding": self.shards.get_stats() if self.shards.enabled else {"enabled": False},
             "update_intervals": self.update_intervals,
             "batch_size": self.batch_size,
-            "max_concurrent": self.max_concurrent
+            "max_concurrent": self.max_concurrent,
+            "adaptive_concurrency": self.adaptive_concurrency,
+            "concurrency": hl_limiter.get_stats()
         }
 
 
@@ -8,6 +8,9 @@ from datetime import datetime, timedelta
 from decimal import Decimal
 import statistics
 
+from app.utils.tracing import tracer
+
+
 class TradingScorer:
     """交易者评分器"""
     
@@ -79,11 +82,12 @@ class TradingScorer:
         # 计算等级
         grade = self._calculate_grade(total_score)
         
-        # 生成标签
-        tags = self._generate_tags(wallet_data, scores)
-        
-        # 识别交易风格
-        style = self._identify_trading_style(wallet_data, trades)
+        with tracer.span("tagging"):
+            # 生成标签
+            tags = self._generate_tags(wallet_data, scores)
+            
+            # 识别交易风格
+            style = self._identify_trading_style(wallet_data, trades)
         
         return {
             "total_score": round(total_score, 2),
@@ -791,6 +795,8 @@ class MetricsCalculator:
         downside_returns = [r for r in returns if r < risk_free_rate]
         if not downside_returns:
             return float('inf') if avg_return > risk_free_rate else 0.0
+        if len(downside_returns) < 2:
+            return 0.0
         
         downside_std = statistics.stdev(downside_returns)
         
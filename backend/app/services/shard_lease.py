@@ -0,0 +1,241 @@
+"""
+采集分片租约
+钱包按地址哈希分到固定数量的分片，多个采集进程（同一台机器或共享数据库文件的多台机器）
+通过 collector_shards 表领取分片租约，各自只刷新自己分片内的钱包。
+
+- 每个进程定期心跳：续约自己的分片，按在线进程数计算应得份额，多退少补
+- 进程退出时主动释放分片；异常退出的进程租约到期后由其他进程接管
+- 领取分片用带条件的 UPDATE（只有空闲或已过期的分片能被领取），多个进程同时领取时只有一个成功
+"""
+import os
+import math
+import time
+import zlib
+import socket
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Set
+from loguru import logger
+
+from app.database import db
+from app.config import config
+from app.utils.metrics import registry
+
+# 分片指标
+SHARDS_OWNED = registry.gauge(
+    "collector_shards_owned",
+    "本进程持有的分片数"
+)
+SHARD_CHANGES = registry.counter(
+    "collector_shard_changes",
+    "分片归属变化次数（claimed 领取，dropped 释放或被接管）",
+    ["action"]
+)
+
+DEFAULT_SHARDING_CONFIG = {
+    "enabled": False,
+    "shards": 32,
+    "lease_seconds": 30,       # 租约时长；超过该时长没有心跳的进程视为离线
+    "heartbeat_interval": 10,
+    "worker_id": None          # 不设置时为 主机名:进程号
+}
+
+
+def shard_of(address: str, shards: int) -> int:
+    """钱包地址所属分片（所有进程计算结果一致）"""
+    return zlib.crc32(address.lower().encode()) % shards
+
+
+class ShardLeaseManager:
+    """分片租约管理"""
+    
+    def __init__(
+        self,
+        settings: Optional[Dict[str, Any]] = None,
+        on_change: Optional[Callable[[Set[int]], Any]] = None
+    ):
+        """
+        Args:
+            settings: 分片配置（collector.sharding）
+            on_change: 持有的分片变化时的回调，参数为当前持有的分片集合
+        """
+        settings = {**DEFAULT_SHARDING_CONFIG, **(settings or {})}
+        self.enabled = settings["enabled"]
+        self.shards = max(1, int(settings["shards"]))
+        self.lease_seconds = float(settings["lease_seconds"])
+        self.heartbeat_interval = float(settings["heartbeat_interval"])
+        self.worker_id = settings["worker_id"] or f"{socket.gethostname()}:{os.getpid()}"
+        self.on_change = on_change
+        
+        self.owned: Set[int] = set()
+        self.live_workers = 0
+        self._task: Optional[asyncio.Task] = None
+        self._started_at = time.time()
+        self._last_heartbeat: Optional[float] = None
+        self.is_running = False
+    
+    # ==================== 生命周期 ====================
+    
+    def start(self):
+        """登记本进程并领取分片，之后定期心跳（需在事件循环内调用）"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self._started_at = time.time()
+        db.execute_many(
+            "INSERT OR IGNORE INTO collector_shards (shard, worker_id, lease_expires) VALUES (?, NULL, 0)",
+            [(shard,) for shard in range(self.shards)]
+        )
+        self.heartbeat()
+        self._task = asyncio.create_task(self._heartbeat_loop())
+        logger.info(f"✅ 分片租约已启动: {self.worker_id}, 持有 {len(self.owned)}/{self.shards} 个分片")
+    
+    def stop(self):
+        """停止心跳并释放全部分片（其他进程下次心跳时接管）"""
+        if not self.is_running:
+            return
+        self.is_running = False
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        
+        try:
+            db.execute(
+                "UPDATE collector_shards SET worker_id = NULL, lease_expires = 0 WHERE worker_id = ?",
+                (self.worker_id,)
+            )
+            db.execute("DELETE FROM collector_workers WHERE worker_id = ?", (self.worker_id,))
+        except Exception as e:
+            logger.error(f"❌ 释放分片失败: {e}")
+        self._set_owned(set())
+        logger.info(f"分片租约已释放: {self.worker_id}")
+    
+    async def _heartbeat_loop(self):
+        while self.is_running:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                self.heartbeat()
+            except Exception as e:
+                logger.error(f"❌ 分片心跳失败: {e}")
+    
+    # ==================== 心跳 ====================
+    
+    def heartbeat(self):
+        """续约、按在线进程数平衡分片"""
+        now = time.time()
+        expires = now + self.lease_seconds
+        
+        db.execute("""
+            INSERT INTO collector_workers (worker_id, hostname, pid, started_at, heartbeat_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(worker_id) DO UPDATE SET heartbeat_at = excluded.heartbeat_at
+        """, (self.worker_id, socket.gethostname(), os.getpid(), self._started_at, now))
+        
+        # 1. 续约仍然有效的租约（已过期的可能已被其他进程接管，按领取处理）
+        db.execute(
+            "UPDATE collector_shards SET lease_expires = ? WHERE worker_id = ? AND lease_expires >= ?",
+            (expires, self.worker_id, now)
+        )
+        rows = db.fetch_all(
+            "SELECT shard FROM collector_shards WHERE worker_id = ? AND lease_expires >= ? ORDER BY shard",
+            (self.worker_id, now)
+        )
+        owned = [row["shard"] for row in rows]
+        
+        # 2. 应得份额 = ceil(分片数 / 在线进程数)
+        row = db.fetch_one(
+            "SELECT COUNT(*) AS live FROM collector_workers WHERE heartbeat_at >= ?",
+            (now - self.lease_seconds,)
+        )
+        self.live_workers = max(1, row["live"] if row else 1)
+        fair_share = math.ceil(self.shards / self.live_workers)
+        
+        # 3. 多退：释放超出份额的分片，由新加入的进程领取
+        if len(owned) > fair_share:
+            released = owned[fair_share:]
+            owned = owned[:fair_share]
+            db.execute_many(
+                "UPDATE collector_shards SET worker_id = NULL, lease_expires = 0 WHERE shard = ? AND worker_id = ?",
+                [(shard, self.worker_id) for shard in released]
+            )
+        
+        # 4. 少补：领取空闲或租约已过期的分片
+        if len(owned) < fair_share:
+            owned.extend(self._claim(fair_share - len(owned), now, expires))
+        
+        # 清理长时间离线的进程记录
+        db.execute(
+            "DELETE FROM collector_workers WHERE heartbeat_at < ?",
+            (now - self.lease_seconds * 10,)
+        )
+        
+        self._last_heartbeat = now
+        self._set_owned(set(owned))
+    
+    def _claim(self, count: int, now: float, expires: float) -> List[int]:
+        """领取最多 count 个空闲分片"""
+        rows = db.fetch_all("""
+            SELECT shard FROM collector_shards
+            WHERE worker_id IS NULL OR lease_expires < ?
+            ORDER BY shard
+            LIMIT ?
+        """, (now, count))
+        
+        claimed = []
+        for row in rows:
+            # 条件更新：同一时刻只有一个进程能领取成功
+            cursor = db.execute("""
+                UPDATE collector_shards
+                SET worker_id = ?, lease_expires = ?
+                WHERE shard = ? AND (worker_id IS NULL OR lease_expires < ?)
+            """, (self.worker_id, expires, row["shard"], now))
+            if cursor.rowcount == 1:
+                claimed.append(row["shard"])
+        if claimed:
+            SHARD_CHANGES.labels("claimed").inc(len(claimed))
+        return claimed
+    
+    def _set_owned(self, owned: Set[int]):
+        changed = owned != self.owned
+        if changed:
+            dropped = self.owned - owned
+            if dropped:
+                SHARD_CHANGES.labels("dropped").inc(len(dropped))
+            logger.info(f"分片归属变化: {self.worker_id} 持有 {len(owned)}/{self.shards} 个分片（在线进程 {self.live_workers}）")
+        self.owned = owned
+        SHARDS_OWNED.set(len(owned))
+        if changed and self.on_change is not None:
+            self.on_change(owned)
+    
+    # ==================== 查询 ====================
+    
+    def owns(self, address: str) -> bool:
+        """钱包是否由本进程负责"""
+        return shard_of(address, self.shards) in self.owned
+    
+    def get_stats(self) -> Dict[str, Any]:
+        workers = db.fetch_all("""
+            SELECT w.worker_id, w.hostname, w.pid, w.heartbeat_at, COUNT(s.shard) AS shards
+            FROM collector_workers w
+            LEFT JOIN collector_shards s ON s.worker_id = w.worker_id AND s.lease_expires >= ?
+            GROUP BY w.worker_id
+            ORDER BY w.worker_id
+        """, (time.time(),))
+        return {
+            "enabled": self.enabled,
+            "worker_id": self.worker_id,
+            "shards": self.shards,
+            "owned": sorted(self.owned),
+            "live_workers": self.live_workers,
+            "last_heartbeat": self._last_heartbeat,
+            "workers": workers
+        }
+
+
+def create_shard_lease_manager(on_change: Optional[Callable[[Set[int]], Any]] = None) -> ShardLeaseManager:
+    """按 collector.sharding 配置创建分片租约管理器"""
+    settings = config.get_config("system").get("collector", {}).get("sharding")
+    return ShardLeaseManager(settings, on_change=on_change)
+
+
+# 导出
+__all__ = ['ShardLeaseManager', 'create_shard_lease_manager', 'shard_of']
@@ -7,6 +7,7 @@ from datetime import datetime
 from loguru import logger
 
 from app.config import config, WALLETS_DIR, DATA_DIR
+from app.models.trade import trades_to_json
 
 
 class StorageService:
@@ -59,13 +60,13 @@ class StorageService:
             
             # 保存钱包文件
             with open(wallet_file, 'w', encoding='utf-8') as f:
-                json.dump(wallet_data, f, indent=2, ensure_ascii=False)
+                json.dump(wallet_data, f, indent=2, ensure_ascii=False, default=trades_to_json)
             
             # 更新索引
             self._update_index(address, wallet_data)
             
             logger.info(f"✅ 保存钱包成功: {address}")
-            
+        
         except Exception as e:
             logger.error(f"保存钱包失败: {e}")
             raise
@@ -167,7 +168,7 @@ class StorageService:
                 "page_size": page_size,
                 "wallets": result_wallets
             }
-            
+        
         except Exception as e:
             logger.error(f"获取钱包列表失败: {e}")
             return {"total": 0, "page": page, "page_size": page_size, "wallets": []}
@@ -196,7 +197,7 @@ class StorageService:
             self._save_index()
             
             logger.info(f"✅ 删除钱包成功: {address}")
-            
+        
         except Exception as e:
             logger.error(f"删除钱包失败: {e}")
             raise
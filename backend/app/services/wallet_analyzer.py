@@ -2,17 +2,47 @@
 钱包分析服务
 整合 API 数据采集、指标计算、评分等功能
 """
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Sequence, Tuple, Iterable, AsyncIterator
 from datetime import datetime, timedelta
 from decimal import Decimal
 import json
+import time
 
-from app.services.hyperliquid import HyperLiquidClient
+from app.services.hyperliquid import HyperLiquidClient, hl_limiter
 from app.services.scoring import TradingScorer, MetricsCalculator
+from app.services.activity_model import activity_tracker
+from app.services.change_probe import change_probe
+from app.services.address_index import address_index
 from app.database import db
+from app.models.trade import trade_column, trade_value_counts, iter_trade_rows
+from app.utils.tracing import tracer
 from loguru import logger
 
 
+# trades 表写入字段（不含 wallet_address）
+TRADE_INSERT_FIELDS = (
+    "timestamp", "symbol", "side", "size", "entry_price", "exit_price",
+    "pnl", "pnl_percentage", "holding_time_minutes", "fees", "hash", "oid", "tid",
+    "direction", "start_position", "closed_pnl", "fee_token"
+)
+
+
+class BatchItemResult:
+    """批量分析中单个钱包的结果"""
+    
+    __slots__ = ("address", "result", "error", "elapsed")
+    
+    def __init__(self, address: str, result: Optional[Dict[str, Any]], error: Optional[str], elapsed: float):
+        self.address = address
+        self.result = result
+        self.error = error
+        self.elapsed = elapsed
+    
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
 class WalletAnalyzer:
     """钱包分析器 - 核心业务逻辑"""
     
@@ -38,78 +68,126 @@ class WalletAnalyzer:
         Args:
             address: 钱包地址
             force_update: 是否强制更新（忽略缓存）
-            
+        
         Returns:
             分析结果字典
         """
-        try:
-            logger.info(f"开始分析钱包: {address}")
-            
-            # 1. 检查数据库中是否已存在
+        with tracer.trace("wallet_refresh", address=address) as root:
+            try:
+                return await self._analyze_wallet(address, force_update, root)
+            except Exception as e:
+                root.error = f"{type(e).__name__}: {e}"
+                logger.error(f"分析钱包失败 {address}: {e}")
+                import traceback
+                traceback.print_exc()
+                return None
+    
+    async def _analyze_wallet(self, address: str, force_update: bool, root) -> Optional[Dict[str, Any]]:
+        """分析钱包（各阶段记录追踪片段）"""
+        logger.info(f"开始分析钱包: {address}")
+        
+        # 1. 检查数据库中是否已存在
+        with tracer.span("load_existing"):
             existing_wallet = db.fetch_one(
                 "SELECT * FROM wallets WHERE address = ?",
                 (address,)
             )
-            
-            # 如果存在且不强制更新，检查更新时间
-            if existing_wallet and not force_update:
-                last_updated = existing_wallet.get("last_updated")
-                if last_updated:
-                    # 如果最近 1 小时内更新过，直接返回
-                    # TODO: 根据 update_frequency 动态调整
-                    pass
-            
-            # 2. 从 HyperLiquid API 获取数据
-            logger.info("获取钱包数据...")
+        
+        # 如果存在且不强制更新，检查更新时间
+        if existing_wallet and not force_update:
+            last_updated = existing_wallet.get("last_updated")
+            if last_updated:
+                # 如果最近 1 小时内更新过，直接返回
+                # TODO: 根据 update_frequency 动态调整
+                pass
+        
+        # 2. 从 HyperLiquid API 获取数据（子请求和解析在客户端内记录）
+        logger.info("获取钱包数据...")
+        with tracer.span("fetch"):
             wallet_data = await self.hl_client.get_wallet_data(address)
-            
-            if not wallet_data:
-                logger.error(f"无法获取钱包数据: {address}")
-                return None
-            
-            # 3. 计算所有指标
-            logger.info("计算交易指标...")
+        
+        if not wallet_data:
+            logger.error(f"无法获取钱包数据: {address}")
+            root.error = "no wallet data"
+            return None
+        
+        root.set(trades=len(wallet_data.get("trades", [])))
+        
+        # 3-5. 计算指标和评分
+        final_data, result = self.compute_wallet_result(address, wallet_data)
+        
+        # 6-7. 存入数据库
+        logger.info("保存到数据库...")
+        with tracer.span("persistence"):
+            self.persist_wallet_result(address, final_data, wallet_data)
+        
+        logger.info(f"✅ 钱包分析完成: {address}, 评分: {result['score']}, 等级: {result['grade']}")
+        
+        return result
+    
+    def compute_wallet_result(self, address: str, wallet_data: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        计算指标和综合评分（纯计算，不访问网络和数据库，可在子进程中执行）
+        
+        Args:
+            address: 钱包地址
+            wallet_data: 钱包数据（get_wallet_data / build_wallet_data 的结果）
+        
+        Returns:
+            (写入 wallets 表的字段, 分析结果)
+        """
+        # 3. 计算所有指标
+        logger.info("计算交易指标...")
+        with tracer.span("metrics"):
             metrics = self._calculate_all_metrics(wallet_data)
-            
-            # 4. 计算综合评分
-            logger.info("计算综合评分...")
+        
+        # 4. 计算综合评分（标签和风格识别在评分器内记录）
+        logger.info("计算综合评分...")
+        with tracer.span("scoring"):
             score_result = self.scorer.calculate_comprehensive_score(
                 metrics,
                 wallet_data.get("trades", []),
                 wallet_data.get("positions", [])
             )
-            
-            # 5. 合并数据
-            final_data = {
-                **metrics,
-                "smart_money_score": score_result["total_score"],
-                "score_grade": score_result["grade"],
-                "tags": json.dumps(score_result["tags"]),
-                "style": score_result["style"],
-                "last_updated": datetime.now().isoformat()
-            }
-            
-            # 6. 存入数据库
-            logger.info("保存到数据库...")
-            self._save_to_database(address, final_data, wallet_data)
-            
-            logger.info(f"✅ 钱包分析完成: {address}, 评分: {score_result['total_score']}, 等级: {score_result['grade']}")
-            
-            return {
-                "address": address,
-                "score": score_result["total_score"],
-                "grade": score_result["grade"],
-                "tags": score_result["tags"],
-                "style": score_result["style"],
-                "metrics": metrics,
-                "dimension_scores": score_result["dimension_scores"]
-            }
-            
-        except Exception as e:
-            logger.error(f"分析钱包失败 {address}: {e}")
-            import traceback
-            traceback.print_exc()
-            return None
+        
+        # 5. 合并数据
+        final_data = {
+            **metrics,
+            "smart_money_score": score_result["total_score"],
+            "score_grade": score_result["grade"],
+            "tags": json.dumps(score_result["tags"]),
+            "style": score_result["style"],
+            "last_updated": datetime.now().isoformat()
+        }
+        
+        result = {
+            "address": address,
+            "score": score_result["total_score"],
+            "grade": score_result["grade"],
+            "tags": score_result["tags"],
+            "style": score_result["style"],
+            "metrics": metrics,
+            "dimension_scores": score_result["dimension_scores"]
+        }
+        return final_data, result
+    
+    def persist_wallet_result(self, address: str, final_data: Dict[str, Any], wallet_data: Dict[str, Any]):
+        """
+        保存分析结果，并更新交易活跃度（决定下次刷新间隔）和变化探测指纹
+        
+        Args:
+            address: 钱包地址
+            final_data: compute_wallet_result 得到的钱包字段
+            wallet_data: 钱包数据（交易、持仓、资金流水）
+        """
+        # 6. 存入数据库
+        self._save_to_database(address, final_data, wallet_data)
+        
+        # 7. 更新交易活跃度和变化探测指纹
+        if activity_tracker.enabled:
+            activity_tracker.observe(address, trade_column(wallet_data.get("trades", []), "timestamp"))
+        if change_probe.enabled:
+            change_probe.remember(address, wallet_data.get("trades", []))
     
     def _calculate_all_metrics(self, wallet_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -117,7 +195,7 @@ class WalletAnalyzer:
         
         Args:
             wallet_data: 从 API 获取的原始钱包数据
-            
+        
         Returns:
             包含所有指标的字典
         """
@@ -148,23 +226,24 @@ class WalletAnalyzer:
             metrics["roi"] = 0
         
         # 胜率和盈亏比
+        pnls = [float(pnl) for pnl in trade_column(trades, "pnl")] if trades else []
         if trades:
-            winning_trades = [t for t in trades if float(t.get("pnl", 0)) > 0]
-            losing_trades = [t for t in trades if float(t.get("pnl", 0)) < 0]
+            winning_pnls = [pnl for pnl in pnls if pnl > 0]
+            losing_pnls = [-pnl for pnl in pnls if pnl < 0]
             
             metrics["win_rate"] = self.metrics_calc.calculate_win_rate(
-                len(winning_trades),
+                len(winning_pnls),
                 len(trades)
             )
             
             # 计算平均盈利和平均亏损
-            if winning_trades:
-                avg_win = sum(float(t.get("pnl", 0)) for t in winning_trades) / len(winning_trades)
+            if winning_pnls:
+                avg_win = sum(winning_pnls) / len(winning_pnls)
             else:
                 avg_win = 0
             
-            if losing_trades:
-                avg_loss = sum(abs(float(t.get("pnl", 0))) for t in losing_trades) / len(losing_trades)
+            if losing_pnls:
+                avg_loss = sum(losing_pnls) / len(losing_pnls)
             else:
                 avg_loss = 0
             
@@ -177,8 +256,15 @@ class WalletAnalyzer:
         
         # 最大回撤
         equity_curve = wallet_data.get("equity_curve", [])
+        if isinstance(equity_curve, dict):
+            # _process_wallet_data 返回按周期分组的 [[时间戳, 账户价值], ...]
+            equity_curve = equity_curve.get("all", [])
         if equity_curve:
-            metrics["max_drawdown"] = self.metrics_calc.calculate_max_drawdown(equity_curve)
+            equity_values = [
+                float(point[1]) if isinstance(point, (list, tuple)) else float(point)
+                for point in equity_curve
+            ]
+            metrics["max_drawdown"] = self.metrics_calc.calculate_max_drawdown(equity_values)
             # 保存不同时间周期的资金曲线
             metrics["equity_curve_all"] = json.dumps(equity_curve[-1000:])  # 最多保存 1000 个点
         else:
@@ -186,7 +272,7 @@ class WalletAnalyzer:
             metrics["equity_curve_all"] = json.dumps([])
         
         # 高级指标
-        returns = self._calculate_returns(trades)
+        returns = self._calculate_returns(pnls)
         if returns:
             metrics["sharpe_ratio"] = self.metrics_calc.calculate_sharpe_ratio(returns)
             metrics["sortino_ratio"] = self.metrics_calc.calculate_sortino_ratio(returns)
@@ -238,9 +324,9 @@ class WalletAnalyzer:
         # 平均持仓时间
         if trades:
             holding_times = [
-                float(t.get("holding_time_minutes", 0)) 
-                for t in trades 
-                if t.get("holding_time_minutes")
+                float(minutes)
+                for minutes in trade_column(trades, "holding_time_minutes")
+                if minutes
             ]
             if holding_times:
                 avg_holding = sum(holding_times) / len(holding_times)
@@ -252,22 +338,23 @@ class WalletAnalyzer:
         
         # 多空偏好
         if trades:
-            long_trades = [t for t in trades if t.get("side", "").lower() in ["buy", "long"]]
-            short_trades = [t for t in trades if t.get("side", "").lower() in ["sell", "short"]]
+            side_counts = trade_value_counts(trades, "side")
+            long_count = sum(n for side, n in side_counts.items() if (side or "").lower() in ["buy", "long"])
+            short_count = sum(n for side, n in side_counts.items() if (side or "").lower() in ["sell", "short"])
             metrics["long_short_preference"] = self.metrics_calc.identify_long_short_preference(
-                len(long_trades),
-                len(short_trades)
+                long_count,
+                short_count
             )
         else:
             metrics["long_short_preference"] = "unknown"
         
         # 偏好币种（交易最多的前 5 个）
         if trades:
-            coin_counts = {}
-            for trade in trades:
-                coin = trade.get("symbol", "")
-                if coin:
-                    coin_counts[coin] = coin_counts.get(coin, 0) + 1
+            coin_counts = {
+                coin: count
+                for coin, count in trade_value_counts(trades, "symbol").items()
+                if coin
+            }
             
             favorite_coins = sorted(coin_counts.items(), key=lambda x: x[1], reverse=True)[:5]
             metrics["favorite_coins"] = json.dumps([coin for coin, _ in favorite_coins])
@@ -287,24 +374,23 @@ class WalletAnalyzer:
         
         return metrics
     
-    def _calculate_returns(self, trades: List[Dict[str, Any]]) -> List[float]:
+    def _calculate_returns(self, pnls: Sequence[float]) -> List[float]:
         """
-        从交易记录计算收益率序列
+        从逐笔盈亏计算收益率序列
         
         Args:
-            trades: 交易记录列表
-            
+            pnls: 按时间排序的每笔交易盈亏
+        
         Returns:
             收益率列表
         """
-        if not trades:
+        if not pnls:
             return []
         
         returns = []
         cumulative_capital = 0
         
-        for trade in trades:
-            pnl = float(trade.get("pnl", 0))
+        for pnl in pnls:
             # 简化计算：假设每笔交易的收益率 = pnl / (累计资金 + 初始资金的一部分)
             # 实际应该基于每笔交易的投入资金
             if cumulative_capital > 0:
@@ -329,6 +415,29 @@ class WalletAnalyzer:
             wallet_data: 原始钱包数据
         """
         # 1. 保存/更新钱包基础信息
+        with tracer.span("persist.wallet"):
+            self._save_wallet_row(address, metrics)
+        
+        # 2. 保存交易记录
+        trades = wallet_data.get("trades", [])
+        if trades:
+            with tracer.span("persist.trades", rows=len(trades)):
+                self._save_trades(address, trades)
+        
+        # 3. 保存持仓
+        positions = wallet_data.get("positions", [])
+        if positions:
+            with tracer.span("persist.positions", rows=len(positions)):
+                self._save_positions(address, positions)
+        
+        # 4. 保存资金流水
+        transfers = wallet_data.get("transfers", [])
+        if transfers:
+            with tracer.span("persist.transfers", rows=len(transfers)):
+                self._save_transfers(address, transfers)
+    
+    def _save_wallet_row(self, address: str, metrics: Dict[str, Any]):
+        """保存/更新钱包基础信息"""
         existing = db.fetch_one("SELECT id FROM wallets WHERE address = ?", (address,))
         
         if existing:
@@ -352,66 +461,28 @@ class WalletAnalyzer:
             
             sql = f"INSERT INTO wallets ({', '.join(fields)}) VALUES ({placeholders})"
             db.execute(sql, tuple(values))
+            address_index.add(address)
             logger.info(f"创建钱包记录: {address}")
-        
-        # 2. 保存交易记录
-        trades = wallet_data.get("trades", [])
-        if trades:
-            self._save_trades(address, trades)
-        
-        # 3. 保存持仓
-        positions = wallet_data.get("positions", [])
-        if positions:
-            self._save_positions(address, positions)
-        
-        # 4. 保存资金流水
-        transfers = wallet_data.get("transfers", [])
-        if transfers:
-            self._save_transfers(address, transfers)
     
     def _save_trades(self, address: str, trades: List[Dict[str, Any]]):
-        """保存交易记录"""
-        # 清空旧记录（或者只保存新的）
-        # db.execute("DELETE FROM trades WHERE wallet_address = ?", (address,))
-        
-        for trade in trades:
-            # 检查是否已存在（基于 hash 或 tid）
-            trade_hash = trade.get("hash")
-            if trade_hash:
-                existing = db.fetch_one(
-                    "SELECT id FROM trades WHERE wallet_address = ? AND hash = ?",
-                    (address, trade_hash)
-                )
-                if existing:
-                    continue  # 跳过已存在的
-            
-            # 插入新交易
-            db.execute("""
-                INSERT INTO trades 
-                (wallet_address, timestamp, symbol, side, size, entry_price, exit_price, 
-                 pnl, pnl_percentage, holding_time_minutes, fees, hash, oid, tid, 
-                 direction, start_position, closed_pnl, fee_token)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                address,
-                trade.get("timestamp"),
-                trade.get("symbol"),
-                trade.get("side"),
-                trade.get("size"),
-                trade.get("entry_price"),
-                trade.get("exit_price"),
-                trade.get("pnl"),
-                trade.get("pnl_percentage"),
-                trade.get("holding_time_minutes"),
-                trade.get("fees"),
-                trade.get("hash"),
-                trade.get("oid"),
-                trade.get("tid"),
-                trade.get("direction"),
-                trade.get("start_position"),
-                trade.get("closed_pnl"),
-                trade.get("fee_token")
-            ))
+        """
+        保存交易记录（trades 可以是 TradeBatch 或交易字典列表）
+        
+        已存在的成交由 (wallet_address, hash) 唯一索引跳过，整批一条 executemany。
+        """
+        hash_index = TRADE_INSERT_FIELDS.index("hash")
+        rows = []
+        for row in iter_trade_rows(trades, TRADE_INSERT_FIELDS):
+            # 空哈希按 NULL 写入（不参与去重）
+            rows.append((address, *row[:hash_index], row[hash_index] or None, *row[hash_index + 1:]))
+        
+        db.execute_many("""
+            INSERT OR IGNORE INTO trades 
+            (wallet_address, timestamp, symbol, side, size, entry_price, exit_price, 
+             pnl, pnl_percentage, holding_time_minutes, fees, hash, oid, tid, 
+             direction, start_position, closed_pnl, fee_token)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
     
     def _save_positions(self, address: str, positions: List[Dict[str, Any]]):
         """保存持仓"""
@@ -468,35 +539,93 @@ class WalletAnalyzer:
                 transfer.get("fee", 0)
             ))
     
+    async def iter_analyze_wallets(
+        self,
+        addresses: Iterable[str],
+        max_concurrent: Optional[int] = None,
+        window: Optional[int] = None
+    ) -> AsyncIterator["BatchItemResult"]:
+        """
+        批量分析钱包，按完成顺序逐个产出结果
+        
+        同时在途的钱包不超过 window 个，一个完成后才从 addresses 取下一个，
+        内存占用与并发数成正比而不是与批量大小成正比。
+        
+        Args:
+            addresses: 钱包地址（可以是惰性的迭代器）
+            max_concurrent: 固定并发数；不传时使用自适应并发（hl_limiter，随上游延迟/429 调整并带熔断）
+            window: 在途钱包上限；默认并发上限的 2 倍（等待并发名额的钱包也计入）
+        
+        Yields:
+            BatchItemResult（失败的钱包也会产出，带错误信息）
+        """
+        import asyncio
+        from app.services.refresh_pipeline import refresh_pipeline
+        
+        if max_concurrent is None:
+            slot = hl_limiter.slot
+            window = window or hl_limiter.max_limit * 2
+        else:
+            semaphore = asyncio.Semaphore(max_concurrent)
+            slot = lambda: semaphore
+            window = window or max_concurrent * 2
+        use_pipeline = refresh_pipeline.enabled and not self.hl_client.use_mock
+        
+        async def analyze_one(addr: str) -> BatchItemResult:
+            start = time.perf_counter()
+            try:
+                if use_pipeline:
+                    # 只在抓取期间占用并发名额；计算交给进程池，写库批量提交
+                    result = await refresh_pipeline.run(addr, slot=slot)
+                else:
+                    async with slot():
+                        result = await self.analyze_wallet(addr)
+            except Exception as e:
+                return BatchItemResult(addr, None, f"{type(e).__name__}: {e}", time.perf_counter() - start)
+            error = None if result else "分析失败"
+            return BatchItemResult(addr, result or None, error, time.perf_counter() - start)
+        
+        source = iter(addresses)
+        pending = set()
+        
+        def fill():
+            while len(pending) < window:
+                addr = next(source, None)
+                if addr is None:
+                    return
+                pending.add(asyncio.create_task(analyze_one(addr)))
+        
+        fill()
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                fill()
+                for task in done:
+                    yield task.result()
+        finally:
+            # 调用方提前退出（取消导入等）时取消在途的钱包
+            for task in pending:
+                task.cancel()
+    
     async def batch_analyze_wallets(
         self, 
         addresses: List[str],
-        max_concurrent: int = 5
+        max_concurrent: Optional[int] = None
     ) -> List[Dict[str, Any]]:
         """
         批量分析钱包
         
         Args:
             addresses: 钱包地址列表
-            max_concurrent: 最大并发数
-            
+            max_concurrent: 固定并发数；不传时使用自适应并发（hl_limiter，随上游延迟/429 调整并带熔断）
+        
         Returns:
-            分析结果列表
+            分析结果列表（只含成功的钱包）
         """
-        import asyncio
-        
-        results = []
-        semaphore = asyncio.Semaphore(max_concurrent)
-        
-        async def analyze_with_semaphore(addr):
-            async with semaphore:
-                return await self.analyze_wallet(addr)
-        
-        tasks = [analyze_with_semaphore(addr) for addr in addresses]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        # 过滤掉异常
-        valid_results = [r for r in results if r and not isinstance(r, Exception)]
+        valid_results = []
+        async for item in self.iter_analyze_wallets(addresses, max_concurrent=max_concurrent):
+            if item.ok:
+                valid_results.append(item.result)
         
         logger.info(f"批量分析完成: {len(valid_results)}/{len(addresses)} 成功")
         
@@ -538,7 +667,7 @@ class WalletAnalyzer:
             limit: 返回数量
             sort_by: 排序字段
             filters: 筛选条件
-            
+        
         Returns:
             钱包列表
         """
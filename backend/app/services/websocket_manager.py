@@ -1,21 +1,89 @@
 """
 WebSocket 管理器
 处理实时通信、进度推送、通知推送等
+
+广播/发布时消息只序列化一次，放入每个客户端自己的有界发送队列，由该连接的写协程发送；
+一个客户端发送慢不会拖慢其他客户端。队列满（慢客户端）时按 slow_consumer 策略断开或丢弃。
 """
-from typing import Dict, Set, List, Optional
+from typing import Dict, Iterable, Set, List, Optional
 from fastapi import WebSocket, WebSocketDisconnect
 from loguru import logger
 import json
+import time
 import asyncio
 from datetime import datetime
 
+from app.config import config
+from app.utils.metrics import registry
+
+# 扇出耗时（序列化并放入所有客户端发送队列的耗时）
+WS_FANOUT_SECONDS = registry.histogram(
+    "websocket_fanout_duration_seconds",
+    "WebSocket 消息扇出耗时",
+    ["kind"]
+)
+# 送达延迟（消息入队到该客户端发送完成）
+WS_DELIVERY_SECONDS = registry.histogram(
+    "websocket_delivery_latency_seconds",
+    "WebSocket 消息入队到发送完成的延迟",
+    ["kind"]
+)
+WS_MESSAGES_SENT = registry.counter(
+    "websocket_messages_sent",
+    "WebSocket 发送的消息数",
+    ["kind"]
+)
+WS_MESSAGES_DROPPED = registry.counter(
+    "websocket_messages_dropped",
+    "发送队列已满而未发送的消息数",
+    ["kind"]
+)
+WS_SLOW_CONSUMERS = registry.counter(
+    "websocket_slow_consumers",
+    "因发送队列已满或发送超时被断开的客户端数"
+)
+WS_CONNECTIONS = registry.gauge(
+    "websocket_active_connections",
+    "当前 WebSocket 活跃连接数"
+)
+
+DEFAULT_WEBSOCKET_CONFIG = {
+    "send_queue_size": 256,         # 每个客户端待发送消息上限
+    "slow_consumer": "disconnect",  # 队列满时: disconnect 断开该客户端（客户端重连后重新订阅），drop 丢弃这条消息
+    "send_timeout": 10              # 单条消息发送超过该时长（秒）仍未完成时，下次入队按慢客户端断开
+}
+
+# 断开慢客户端的关闭码（1013: Try Again Later）
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+class ClientConnection:
+    """单个 WebSocket 连接：有界发送队列 + 写协程"""
+    
+    __slots__ = ("client_id", "websocket", "queue", "writer", "busy_since", "sent", "dropped")
+    
+    def __init__(self, client_id: str, websocket: WebSocket, queue_size: int):
+        self.client_id = client_id
+        self.websocket = websocket
+        # 队列元素: (已序列化的消息, 消息类型, 入队时间)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.writer: Optional[asyncio.Task] = None
+        self.busy_since: Optional[float] = None  # 正在发送的消息开始发送的时间
+        self.sent = 0
+        self.dropped = 0
+
 
 class ConnectionManager:
     """WebSocket 连接管理器"""
     
     def __init__(self):
-        # 存储所有活跃连接: {client_id: WebSocket}
-        self.active_connections: Dict[str, WebSocket] = {}
+        settings = {**DEFAULT_WEBSOCKET_CONFIG, **config.get_config("system").get("websocket", {})}
+        self.send_queue_size = max(1, int(settings["send_queue_size"]))
+        self.slow_consumer = settings["slow_consumer"]
+        self.send_timeout = float(settings["send_timeout"])
+        
+        # 存储所有活跃连接: {client_id: ClientConnection}
+        self.active_connections: Dict[str, ClientConnection] = {}
         
         # 订阅管理: {topic: Set[client_id]}
         self.subscriptions: Dict[str, Set[str]] = {}
@@ -23,6 +91,9 @@ class ConnectionManager:
         # 用户连接映射: {username: Set[client_id]}
         self.user_connections: Dict[str, Set[str]] = {}
         
+        # 因慢被断开的客户端数
+        self.evicted = 0
+        
         logger.info("WebSocket 连接管理器初始化完成")
     
     async def connect(self, websocket: WebSocket, client_id: str, username: Optional[str] = None):
@@ -35,7 +106,17 @@ class ConnectionManager:
             username: 用户名（可选）
         """
         await websocket.accept()
-        self.active_connections[client_id] = websocket
+        
+        # 同一 client_id 重连：关闭旧连接（订阅保留）
+        old = self.active_connections.get(client_id)
+        if old is not None:
+            old.writer.cancel()
+            asyncio.create_task(self._close(old.websocket, code=1000))
+        
+        client = ClientConnection(client_id, websocket, self.send_queue_size)
+        client.writer = asyncio.create_task(self._writer(client))
+        self.active_connections[client_id] = client
+        WS_CONNECTIONS.set(len(self.active_connections))
         
         # 记录用户连接
         if username:
@@ -54,16 +135,23 @@ class ConnectionManager:
             "timestamp": datetime.now().isoformat()
         })
     
-    def disconnect(self, client_id: str):
+    def disconnect(self, client_id: str, websocket: Optional[WebSocket] = None):
         """
         断开连接
         
         Args:
             client_id: 客户端唯一标识
+            websocket: 已断开的连接对象；传入时只在它仍是当前连接时才清理（已被替换或已断开则忽略）
         """
-        # 移除连接
-        if client_id in self.active_connections:
-            del self.active_connections[client_id]
+        client = self.active_connections.get(client_id)
+        if client is None or (websocket is not None and client.websocket is not websocket):
+            return
+        
+        # 移除连接并停止写协程（未发送的消息丢弃）
+        del self.active_connections[client_id]
+        WS_CONNECTIONS.set(len(self.active_connections))
+        if client.writer is not None:
+            client.writer.cancel()
         
         # 移除所有订阅
         for topic in self.subscriptions:
@@ -86,13 +174,7 @@ class ConnectionManager:
             client_id: 客户端唯一标识
             message: 消息内容（字典）
         """
-        if client_id in self.active_connections:
-            try:
-                websocket = self.active_connections[client_id]
-                await websocket.send_json(message)
-            except Exception as e:
-                logger.error(f"发送消息失败 ({client_id}): {e}")
-                self.disconnect(client_id)
+        self._fanout([client_id], message, "personal")
     
     async def send_to_user(self, username: str, message: dict):
         """
@@ -103,9 +185,7 @@ class ConnectionManager:
             message: 消息内容（字典）
         """
         if username in self.user_connections:
-            client_ids = list(self.user_connections[username])
-            for client_id in client_ids:
-                await self.send_personal_message(client_id, message)
+            self._fanout(list(self.user_connections[username]), message, "user")
     
     async def broadcast(self, message: dict, exclude: Optional[Set[str]] = None):
         """
@@ -116,19 +196,83 @@ class ConnectionManager:
             exclude: 排除的客户端 ID 集合
         """
         exclude = exclude or set()
-        disconnected = []
-        
-        for client_id, websocket in self.active_connections.items():
-            if client_id not in exclude:
-                try:
-                    await websocket.send_json(message)
-                except Exception as e:
-                    logger.error(f"广播消息失败 ({client_id}): {e}")
-                    disconnected.append(client_id)
-        
-        # 清理断开的连接
-        for client_id in disconnected:
-            self.disconnect(client_id)
+        client_ids = [client_id for client_id in self.active_connections if client_id not in exclude]
+        self._fanout(client_ids, message, "broadcast")
+    
+    # ==================== 扇出 ====================
+    
+    def _fanout(self, client_ids: Iterable[str], message: dict, kind: str) -> int:
+        """
+        序列化一次，放入各客户端的发送队列（不等待发送）
+        
+        Args:
+            client_ids: 目标客户端
+            message: 消息内容
+            kind: 消息类型（指标标签）
+        
+        Returns:
+            成功入队的客户端数
+        """
+        start = time.perf_counter()
+        text = json.dumps(message, ensure_ascii=False, separators=(",", ":"), default=str)
+        
+        queued = 0
+        for client_id in client_ids:
+            client = self.active_connections.get(client_id)
+            if client is not None and self._enqueue(client, text, kind, start):
+                queued += 1
+        
+        WS_FANOUT_SECONDS.labels(kind).observe(time.perf_counter() - start)
+        return queued
+    
+    def _enqueue(self, client: ClientConnection, text: str, kind: str, enqueued_at: float) -> bool:
+        """放入客户端发送队列；队列已满时按慢客户端策略处理"""
+        if client.busy_since is not None and enqueued_at - client.busy_since > self.send_timeout:
+            # 一条消息发送了太久（连接卡住），不再等待
+            self._evict(client, f"发送超时 ({self.send_timeout:g}s)")
+            return False
+        try:
+            client.queue.put_nowait((text, kind, enqueued_at))
+            return True
+        except asyncio.QueueFull:
+            client.dropped += 1
+            WS_MESSAGES_DROPPED.labels(kind).inc()
+            if self.slow_consumer == "disconnect":
+                self._evict(client, f"发送队列已满 ({self.send_queue_size})")
+            return False
+    
+    async def _writer(self, client: ClientConnection):
+        """按顺序发送该客户端队列中的消息"""
+        while True:
+            text, kind, enqueued_at = await client.queue.get()
+            client.busy_since = time.perf_counter()
+            try:
+                await client.websocket.send_text(text)
+            except Exception as e:
+                logger.error(f"发送消息失败 ({client.client_id}): {e}")
+                self.disconnect(client.client_id, client.websocket)
+                return
+            client.busy_since = None
+            client.sent += 1
+            WS_MESSAGES_SENT.labels(kind).inc()
+            WS_DELIVERY_SECONDS.labels(kind).observe(time.perf_counter() - enqueued_at)
+    
+    def _evict(self, client: ClientConnection, reason: str):
+        """断开慢客户端（关闭连接，客户端重连后重新订阅）"""
+        if self.active_connections.get(client.client_id) is not client:
+            return
+        self.evicted += 1
+        WS_SLOW_CONSUMERS.inc()
+        logger.warning(f"断开慢客户端: {client.client_id}, {reason}, 已丢弃 {client.dropped} 条消息")
+        self.disconnect(client.client_id, client.websocket)
+        asyncio.create_task(self._close(client.websocket, code=SLOW_CONSUMER_CLOSE_CODE))
+    
+    @staticmethod
+    async def _close(websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
     
     def subscribe(self, client_id: str, topic: str):
         """
@@ -171,23 +315,24 @@ class ConnectionManager:
             message["topic"] = topic
             message["timestamp"] = datetime.now().isoformat()
             
-            for client_id in client_ids:
-                await self.send_personal_message(client_id, message)
+            self._fanout(client_ids, message, "publish")
             
             logger.debug(f"发布消息到主题 {topic}: {len(client_ids)} 个订阅者")
     
-    async def send_import_progress(self, task_id: str, progress: dict):
+    async def send_import_progress(self, task_id: str, progress: dict, final: bool = False):
         """
         发送导入进度更新
         
         Args:
             task_id: 任务 ID
             progress: 进度信息
+            final: 是否为最终状态
         """
         message = {
             "type": "import_progress",
             "task_id": task_id,
             "data": progress,
+            "final": final,
             "timestamp": datetime.now().isoformat()
         }
         
@@ -227,9 +372,11 @@ class ConnectionManager:
         }
         
         if target_users:
-            # 发送给指定用户
+            # 发送给指定用户（所有连接只序列化一次）
+            client_ids = set()
             for username in target_users:
-                await self.send_to_user(username, message)
+                client_ids.update(self.user_connections.get(username, ()))
+            self._fanout(client_ids, message, "user")
         else:
             # 广播给所有用户
             await self.broadcast(message)
@@ -257,12 +404,21 @@ class ConnectionManager:
         Returns:
             统计信息字典
         """
+        clients = list(self.active_connections.values())
         return {
             "total_connections": len(self.active_connections),
             "total_users": len(self.user_connections),
             "total_subscriptions": sum(len(subs) for subs in self.subscriptions.values()),
             "topics": list(self.subscriptions.keys()),
-            "users": list(self.user_connections.keys())
+            "users": list(self.user_connections.keys()),
+            "send_queue": {
+                "size": self.send_queue_size,
+                "slow_consumer": self.slow_consumer,
+                "queued": sum(client.queue.qsize() for client in clients),
+                "max_depth": max((client.queue.qsize() for client in clients), default=0),
+                "dropped": sum(client.dropped for client in clients),
+                "evicted": self.evicted
+            }
         }
 
 
@@ -0,0 +1,547 @@
+"""
+HyperLiquid WebSocket 推送采集
+订阅被跟踪钱包的 userFills 推送，把新成交增量写入 trades / positions，
+只对真正有新成交的钱包触发重新评分。定时轮询（DataScheduler）保留，作为对账兜底。
+
+注意：HyperLiquid 对每个 IP 的用户类订阅限制为 10 个不同地址，
+因此推送只覆盖优先级最高的一部分钱包（活跃钱包优先，其次按评分），其余钱包仍靠轮询。
+"""
+import json
+import time
+import random
+import asyncio
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Set
+
+from loguru import logger
+
+from app.config import config
+from app.database import db
+from app.models.trade import TradeBatch
+from app.utils.metrics import registry
+from app.services.websocket_manager import ws_manager
+
+try:
+    import websockets
+    WEBSOCKETS_AVAILABLE = True
+except ImportError:
+    WEBSOCKETS_AVAILABLE = False
+
+# 推送采集指标
+HL_WS_MESSAGES = registry.counter(
+    "hl_ws_messages",
+    "HyperLiquid WebSocket 收到的消息数",
+    ["channel"]
+)
+HL_WS_FILLS = registry.counter(
+    "hl_ws_fills",
+    "推送成交的处理结果",
+    ["result"]
+)
+HL_WS_RECONNECTS = registry.counter(
+    "hl_ws_reconnects",
+    "HyperLiquid WebSocket 重连次数"
+)
+HL_WS_SUBSCRIPTIONS = registry.gauge(
+    "hl_ws_subscriptions",
+    "当前通过推送跟踪的钱包数"
+)
+HL_WS_RESCORES = registry.counter(
+    "hl_ws_rescores",
+    "推送触发的重新评分次数",
+    ["status"]
+)
+
+# 默认配置（可在 system.json 的 ws_ingest 段覆盖）
+DEFAULT_WS_INGEST_CONFIG = {
+    "enabled": False,
+    "url": "wss://api.hyperliquid.xyz/ws",
+    "max_connections": 2,
+    "max_users": 10,
+    "ping_interval": 50,
+    "reconnect_max_delay": 60,
+    "resync_interval": 300,
+    "rescore_delay": 10,
+    "rescore_concurrency": 2
+}
+
+# 按地址批量查询已有成交哈希时每次的参数个数
+_HASH_QUERY_CHUNK = 500
+
+
+class FeedConnection:
+    """单条 WebSocket 连接（负责一组地址的订阅，断线自动重连并重新订阅）"""
+    
+    def __init__(self, service: "WsIngestService", conn_id: int):
+        self.service = service
+        self.conn_id = conn_id
+        self.addresses: Set[str] = set()
+        self.connected = False
+        self.reconnects = 0
+        self.messages = 0
+        self.last_message_at: Optional[float] = None
+        self._ws = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+    
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name=f"hl-ws-{self.conn_id}")
+    
+    async def stop(self):
+        self._closing = True
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+    
+    async def subscribe(self, address: str):
+        self.addresses.add(address)
+        await self._send_subscription("subscribe", address)
+    
+    async def unsubscribe(self, address: str):
+        self.addresses.discard(address)
+        await self._send_subscription("unsubscribe", address)
+    
+    async def _send_subscription(self, method: str, address: str):
+        """发送订阅/退订（未连接时只记录，连上后统一订阅）"""
+        if self._ws is None:
+            return
+        try:
+            await self._ws.send(json.dumps({
+                "method": method,
+                "subscription": {"type": "userFills", "user": address}
+            }))
+        except Exception as e:
+            logger.warning(f"WebSocket {method} 失败 ({address}): {e}")
+    
+    async def _ping_loop(self, ws):
+        """应用层心跳（HyperLiquid 60 秒无消息会断开连接）"""
+        interval = self.service.settings["ping_interval"]
+        while True:
+            await asyncio.sleep(interval)
+            await ws.send(json.dumps({"method": "ping"}))
+    
+    async def _run(self):
+        """连接循环（指数退避重连）"""
+        settings = self.service.settings
+        delay = 1.0
+        
+        while not self._closing:
+            try:
+                async with websockets.connect(settings["url"], ping_interval=None, max_size=None) as ws:
+                    self._ws = ws
+                    self.connected = True
+                    delay = 1.0
+                    logger.info(f"🔗 HyperLiquid WebSocket 已连接 (#{self.conn_id}, {len(self.addresses)} 个地址)")
+                    
+                    for address in list(self.addresses):
+                        await self._send_subscription("subscribe", address)
+                    
+                    pinger = asyncio.create_task(self._ping_loop(ws))
+                    try:
+                        async for raw in ws:
+                            self.messages += 1
+                            self.last_message_at = time.time()
+                            await self.service.handle_message(raw)
+                    finally:
+                        pinger.cancel()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"HyperLiquid WebSocket 连接异常 (#{self.conn_id}): {e}")
+            finally:
+                self._ws = None
+                self.connected = False
+            
+            if self._closing:
+                break
+            
+            self.reconnects += 1
+            HL_WS_RECONNECTS.inc()
+            await asyncio.sleep(delay + random.uniform(0, delay / 2))
+            delay = min(delay * 2, settings["reconnect_max_delay"])
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'id': self.conn_id,
+            'connected': self.connected,
+            'addresses': len(self.addresses),
+            'messages': self.messages,
+            'reconnects': self.reconnects,
+            'last_message_at': datetime.fromtimestamp(self.last_message_at).isoformat() if self.last_message_at else None
+        }
+
+
+class WsIngestService:
+    """推送采集服务"""
+    
+    def __init__(self):
+        self.settings: Dict[str, Any] = dict(DEFAULT_WS_INGEST_CONFIG)
+        self.connections: List[FeedConnection] = []
+        self.is_running = False
+        
+        # 小写地址 -> 数据库中的地址；地址 -> 所在连接
+        self._tracked: Dict[str, str] = {}
+        self._assignment: Dict[str, FeedConnection] = {}
+        
+        # 待重新评分的钱包: {address: 首次变更时间}
+        self._dirty: Dict[str, float] = {}
+        self._rescoring: Set[str] = set()
+        self._rescore_tasks: Set[asyncio.Task] = set()
+        self._tasks: List[asyncio.Task] = []
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._analyzer = None
+        
+        self.stats = {
+            'fills_received': 0,
+            'fills_new': 0,
+            'fills_duplicate': 0,
+            'position_updates': 0,
+            'rescored': 0,
+            'rescore_failed': 0
+        }
+    
+    def _load_settings(self) -> Dict[str, Any]:
+        settings = dict(DEFAULT_WS_INGEST_CONFIG)
+        settings.update(config.get_config("system").get("ws_ingest", {}))
+        return settings
+    
+    def is_enabled(self) -> bool:
+        return bool(self._load_settings().get("enabled"))
+    
+    @property
+    def analyzer(self):
+        """钱包分析器（延迟创建，避免导入时循环依赖）"""
+        if self._analyzer is None:
+            from app.services.wallet_analyzer import WalletAnalyzer
+            self._analyzer = WalletAnalyzer(use_mock=False)
+        return self._analyzer
+    
+    async def start(self):
+        """启动推送采集"""
+        if self.is_running:
+            return
+        if not WEBSOCKETS_AVAILABLE:
+            logger.error("未安装 websockets，无法启用推送采集")
+            return
+        
+        self.settings = self._load_settings()
+        self._semaphore = asyncio.Semaphore(self.settings["rescore_concurrency"])
+        self.connections = [
+            FeedConnection(self, i) for i in range(max(1, self.settings["max_connections"]))
+        ]
+        
+        await self.resync()
+        for connection in self.connections:
+            connection.start()
+        
+        self._tasks = [
+            asyncio.create_task(self._rescore_loop(), name="hl-ws-rescore"),
+            asyncio.create_task(self._resync_loop(), name="hl-ws-resync")
+        ]
+        self.is_running = True
+        logger.info(
+            f"📡 推送采集已启动: {self.settings['url']}，"
+            f"{len(self.connections)} 条连接，跟踪 {len(self._tracked)} 个钱包"
+        )
+    
+    async def stop(self):
+        """停止推送采集"""
+        if not self.is_running:
+            return
+        
+        tasks = self._tasks + list(self._rescore_tasks)
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._tasks = []
+        
+        for connection in self.connections:
+            await connection.stop()
+        
+        self.connections = []
+        self._tracked.clear()
+        self._assignment.clear()
+        HL_WS_SUBSCRIPTIONS.set(0)
+        self.is_running = False
+        logger.info("✅ 推送采集已停止")
+    
+    def _select_addresses(self) -> List[str]:
+        """选出需要推送跟踪的钱包（活跃优先，其次按评分）"""
+        rows = db.fetch_all("""
+            SELECT address FROM wallets
+            ORDER BY CASE update_frequency
+                WHEN 'active' THEN 0 WHEN 'normal' THEN 1 ELSE 2 END,
+                smart_money_score DESC
+            LIMIT ?
+        """, (self.settings["max_users"],))
+        return [row["address"] for row in rows]
+    
+    async def resync(self):
+        """按当前钱包列表调整订阅（新增的订阅、移除的退订）"""
+        wanted = {address.lower(): address for address in self._select_addresses()}
+        
+        for key in list(self._tracked):
+            if key not in wanted:
+                address = self._tracked.pop(key)
+                connection = self._assignment.pop(address, None)
+                if connection:
+                    await connection.unsubscribe(address)
+        
+        for key, address in wanted.items():
+            if key in self._tracked:
+                continue
+            # 分配到订阅最少的连接
+            connection = min(self.connections, key=lambda c: len(c.addresses))
+            self._tracked[key] = address
+            self._assignment[address] = connection
+            await connection.subscribe(address)
+        
+        HL_WS_SUBSCRIPTIONS.set(len(self._tracked))
+    
+    async def track(self, address: str):
+        """立即开始跟踪指定钱包（超出上限时忽略）"""
+        if not self.is_running or address.lower() in self._tracked:
+            return
+        if len(self._tracked) >= self.settings["max_users"]:
+            logger.info(f"推送订阅已达上限 ({self.settings['max_users']})，{address} 继续使用轮询")
+            return
+        connection = min(self.connections, key=lambda c: len(c.addresses))
+        self._tracked[address.lower()] = address
+        self._assignment[address] = connection
+        await connection.subscribe(address)
+        HL_WS_SUBSCRIPTIONS.set(len(self._tracked))
+    
+    async def _resync_loop(self):
+        while True:
+            await asyncio.sleep(self.settings["resync_interval"])
+            try:
+                await self.resync()
+            except Exception as e:
+                logger.error(f"同步推送订阅失败: {e}")
+    
+    async def handle_message(self, raw: str):
+        """处理一条推送消息"""
+        try:
+            message = json.loads(raw)
+        except (TypeError, ValueError):
+            HL_WS_MESSAGES.labels("invalid").inc()
+            return
+        
+        channel = message.get("channel", "unknown")
+        HL_WS_MESSAGES.labels(channel).inc()
+        
+        if channel == "userFills":
+            data = message.get("data") or {}
+            address = self._tracked.get((data.get("user") or "").lower())
+            fills = data.get("fills") or []
+            if address and fills:
+                await self._on_fills(address, fills, bool(data.get("isSnapshot")))
+        elif channel == "error":
+            logger.warning(f"HyperLiquid WebSocket 错误: {message.get('data')}")
+    
+    async def _on_fills(self, address: str, fills: List[Dict[str, Any]], is_snapshot: bool):
+        """写入新成交，有变化时标记待评分并通知前端"""
+        self.stats['fills_received'] += len(fills)
+        try:
+            new_count = self._apply_fills(address, fills, is_snapshot)
+        except Exception as e:
+            logger.error(f"处理推送成交失败 {address}: {e}")
+            return
+        
+        if new_count == 0:
+            return
+        
+        self._dirty.setdefault(address, time.monotonic())
+        await ws_manager.send_wallet_update(address, {
+            "source": "push",
+            "new_trades": new_count,
+            "snapshot": is_snapshot
+        })
+    
+    def _existing_hashes(self, address: str, hashes: List[str]) -> Set[str]:
+        """查询已入库的成交哈希"""
+        existing = set()
+        for i in range(0, len(hashes), _HASH_QUERY_CHUNK):
+            chunk = hashes[i:i + _HASH_QUERY_CHUNK]
+            placeholders = ", ".join("?" for _ in chunk)
+            rows = db.fetch_all(
+                f"SELECT hash FROM trades WHERE wallet_address = ? AND hash IN ({placeholders})",
+                (address, *chunk)
+            )
+            existing.update(row["hash"] for row in rows)
+        return existing
+    
+    def _apply_fills(self, address: str, fills: List[Dict[str, Any]], is_snapshot: bool) -> int:
+        """
+        增量写入成交
+        
+        Args:
+            address: 钱包地址
+            fills: 推送的成交（HyperLiquid 原始格式）
+            is_snapshot: 是否为订阅时的快照（快照里的成交可能早于已入库的成交，不据此改持仓）
+        
+        Returns:
+            新成交数
+        """
+        hashes = [f.get("hash") for f in fills if f.get("hash")]
+        existing = self._existing_hashes(address, hashes) if hashes else set()
+        
+        new_fills = []
+        seen = set()
+        for fill in fills:
+            fill_hash = fill.get("hash")
+            if fill_hash and (fill_hash in existing or fill_hash in seen):
+                continue
+            seen.add(fill_hash)
+            new_fills.append(fill)
+        
+        HL_WS_FILLS.labels("duplicate").inc(len(fills) - len(new_fills))
+        self.stats['fills_duplicate'] += len(fills) - len(new_fills)
+        if not new_fills:
+            return 0
+        
+        new_fills.sort(key=lambda f: f.get("time", 0))
+        client = self.analyzer.hl_client
+        batch = TradeBatch()
+        for fill in new_fills:
+            client._append_fill(batch, fill)
+        self.analyzer._save_trades(address, batch)
+        
+        # 实时成交按时间顺序更新持仓；快照缺口交给重新评分时的全量持仓刷新
+        if not is_snapshot:
+            for fill in new_fills:
+                self._apply_position_delta(address, fill)
+        
+        HL_WS_FILLS.labels("new").inc(len(new_fills))
+        self.stats['fills_new'] += len(new_fills)
+        return len(new_fills)
+    
+    def _apply_position_delta(self, address: str, fill: Dict[str, Any]):
+        """
+        根据单笔成交更新持仓
+        
+        成交带有成交前的仓位 startPosition（带符号），成交后仓位 = startPosition ± sz（B 为买入）。
+        """
+        symbol = fill.get("coin", "")
+        if not symbol:
+            return
+        
+        size = float(fill.get("sz", 0))
+        price = float(fill.get("px", 0))
+        start_position = float(fill.get("startPosition", 0))
+        new_position = start_position + size if fill.get("side") == "B" else start_position - size
+        
+        previous = db.fetch_one(
+            "SELECT * FROM positions WHERE wallet_address = ? AND symbol = ?",
+            (address, symbol)
+        )
+        db.execute(
+            "DELETE FROM positions WHERE wallet_address = ? AND symbol = ?",
+            (address, symbol)
+        )
+        self.stats['position_updates'] += 1
+        
+        if abs(new_position) < 1e-12:
+            return
+        
+        side = "long" if new_position > 0 else "short"
+        entry_price = price
+        leverage, margin_used, liquidation_price = 1, None, None
+        if previous and previous["side"] == side:
+            leverage = previous["leverage"] or 1
+            margin_used = previous["margin_used"]
+            liquidation_price = previous["liquidation_price"]
+            previous_size = abs(start_position)
+            if abs(new_position) > previous_size and previous["entry_price"]:
+                # 加仓：按数量加权平均开仓价
+                entry_price = (float(previous["entry_price"]) * previous_size + price * size) / abs(new_position)
+            else:
+                entry_price = float(previous["entry_price"] or price)
+        
+        unrealized_pnl = (price - entry_price) * new_position
+        db.execute("""
+            INSERT INTO positions
+            (wallet_address, symbol, side, size, entry_price, mark_price,
+             unrealized_pnl, leverage, margin_used, liquidation_price,
+             position_value, return_on_equity, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            address,
+            symbol,
+            side,
+            abs(new_position),
+            entry_price,
+            price,
+            unrealized_pnl,
+            leverage,
+            margin_used,
+            liquidation_price,
+            abs(new_position) * price,
+            None,
+            datetime.now().isoformat()
+        ))
+    
+    async def _rescore_loop(self):
+        """对有新成交的钱包做去抖后的重新评分"""
+        while True:
+            await asyncio.sleep(1)
+            now = time.monotonic()
+            due = [
+                address for address, since in self._dirty.items()
+                if now - since >= self.settings["rescore_delay"] and address not in self._rescoring
+            ]
+            for address in due:
+                del self._dirty[address]
+                self._rescoring.add(address)
+                task = asyncio.create_task(self._rescore(address))
+                self._rescore_tasks.add(task)
+                task.add_done_callback(self._rescore_tasks.discard)
+    
+    async def _rescore(self, address: str):
+        """重新评分（全量刷新指标和持仓）"""
+        try:
+            async with self._semaphore:
+                result = await self.analyzer.analyze_wallet(address, force_update=True)
+            status = "success" if result else "failed"
+        except asyncio.CancelledError:
+            # 推送采集停止：保留待评分标记，重新启动后再评分
+            self._dirty.setdefault(address, time.monotonic())
+            raise
+        except Exception as e:
+            logger.error(f"推送触发的重新评分失败 {address}: {e}")
+            status = "failed"
+        finally:
+            self._rescoring.discard(address)
+        
+        HL_WS_RESCORES.labels(status).inc()
+        self.stats['rescored' if status == "success" else 'rescore_failed'] += 1
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """推送采集状态"""
+        return {
+            'enabled': self.is_enabled(),
+            'running': self.is_running,
+            'url': self.settings["url"],
+            'tracked_wallets': len(self._tracked),
+            'max_users': self.settings["max_users"],
+            'pending_rescores': len(self._dirty),
+            'rescoring': len(self._rescoring),
+            'connections': [connection.get_stats() for connection in self.connections],
+            **self.stats
+        }
+
+
+# 全局推送采集实例
+ws_ingest = WsIngestService()
+
+
+# 导出
+__all__ = ['ws_ingest', 'WsIngestService', 'FeedConnection', 'WEBSOCKETS_AVAILABLE']
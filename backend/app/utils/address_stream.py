@@ -0,0 +1,92 @@
+"""
+增量地址提取
+从字节流（CSV、TXT 或其他工具导出的任意文本）中逐块提取钱包地址，不需要先把整个文件读入内存。
+
+- 直接在字节上用预编译的正则匹配，不解码、不按行/单元格切分
+- 每块末尾保留不超过一个地址长度的字节，跨块的地址也能完整匹配
+- 地址前后不能紧挨字母或数字（排除 64 位交易哈希等更长的十六进制串）
+"""
+import re
+from typing import AsyncIterator, List, Optional
+
+ADDRESS_RE = re.compile(rb"(?<![0-9a-zA-Z])0x[0-9a-fA-F]{40}(?![0-9a-zA-Z])")
+
+# 匹配一个地址需要看到的字节数：地址本身 42 字节 + 后面一个字节（判断地址是否结束）
+_SPAN = 43
+
+
+class AddressScanner:
+    """逐块提取地址（地址统一转小写）"""
+    
+    def __init__(self):
+        self._tail = b""
+        self._pos = 0  # 下次从 _tail 的该位置开始匹配（之前的一个字节只用于判断地址边界）
+        self.bytes_read = 0
+        self.found = 0
+    
+    def feed(self, chunk: bytes) -> List[str]:
+        """
+        读入一块数据
+        
+        Returns:
+            本块可以确定的地址（末尾不完整的部分留到下一块或 close 时处理）
+        """
+        self.bytes_read += len(chunk)
+        buf = self._tail + chunk
+        pos = self._pos
+        cut = len(buf) - _SPAN + 1
+        
+        addresses = []
+        if cut > pos:
+            for match in ADDRESS_RE.finditer(buf, pos):
+                if match.start() >= cut:
+                    break
+                addresses.append(match.group().decode().lower())
+            pos = cut
+        
+        keep = max(pos - 1, 0)
+        self._tail = buf[keep:]
+        self._pos = pos - keep
+        self.found += len(addresses)
+        return addresses
+    
+    def close(self) -> List[str]:
+        """数据结束，返回缓冲区中剩下的地址"""
+        addresses = [
+            match.group().decode().lower()
+            for match in ADDRESS_RE.finditer(self._tail, self._pos)
+        ]
+        self._tail = b""
+        self._pos = 0
+        self.found += len(addresses)
+        return addresses
+
+
+async def iter_addresses(chunks: AsyncIterator[bytes], scanner: Optional[AddressScanner] = None) -> AsyncIterator[List[str]]:
+    """
+    逐块产出字节流中的地址
+    
+    Args:
+        chunks: 字节块异步迭代器（如 Request.stream()）
+        scanner: 使用的 AddressScanner（需要读取统计信息时传入）
+    
+    Yields:
+        每块数据中提取到的地址列表（可能包含重复地址，不产出空列表）
+    """
+    scanner = scanner or AddressScanner()
+    async for chunk in chunks:
+        addresses = scanner.feed(chunk)
+        if addresses:
+            yield addresses
+    addresses = scanner.close()
+    if addresses:
+        yield addresses
+
+
+def find_addresses(content: bytes) -> List[str]:
+    """一次性提取整段数据中的地址"""
+    return [match.group().decode().lower() for match in ADDRESS_RE.finditer(content)]
+
+
+# 导出
+__all__ = ['ADDRESS_RE', 'AddressScanner', 'find_addresses', 'iter_addresses']
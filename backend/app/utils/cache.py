@@ -0,0 +1,127 @@
+"""
+进程内缓存工具
+- TTLCache: 带过期时间的 LRU 缓存（条目数有上限）
+- SingleFlight: 合并并发的相同请求，只执行一次
+"""
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+# 缓存未命中标记
+MISSING = object()
+
+
+class TTLCache:
+    """带 TTL 的 LRU 缓存（单线程事件循环内使用）"""
+    
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+    
+    def get(self, key: Hashable) -> Any:
+        """
+        读取缓存
+        
+        Returns:
+            缓存值，不存在或已过期时返回 MISSING
+        """
+        item = self._data.get(key)
+        if item is None:
+            return MISSING
+        
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return MISSING
+        
+        self._data.move_to_end(key)
+        return value
+    
+    def set(self, key: Hashable, value: Any, ttl: float):
+        """写入缓存（超出上限时淘汰最久未使用的条目）"""
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+    
+    def invalidate(self, key: Optional[Hashable] = None):
+        """删除单个条目，不传 key 时清空"""
+        if key is None:
+            self._data.clear()
+        else:
+            self._data.pop(key, None)
+    
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SingleFlight:
+    """并发请求合并：同一 key 同时只有一个执行中的调用，其余调用等待其结果"""
+    
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        # 每个执行中调用的等待者数量
+        self._waiters: Dict[Hashable, int] = {}
+    
+    def is_inflight(self, key: Hashable) -> bool:
+        return key in self._inflight
+    
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        执行或加入已有调用
+        
+        调用在 SingleFlight 自己的任务中执行，所有调用方（包括发起者）都通过 shield 等待：
+        任何一个调用方被取消都不会取消调用本身，也不影响其他调用方；
+        最后一个调用方离开时才取消调用（没有人等待的请求不再重试）。
+        
+        Args:
+            key: 请求标识
+            func: 无参协程函数
+        
+        Returns:
+            调用结果（异常会传递给所有等待者）
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(func())
+            self._inflight[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda done: self._finish(key, done))
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if self._inflight.get(key) is task:
+                self._waiters[key] -= 1
+                if self._waiters[key] == 0 and not task.done():
+                    task.cancel()
+    
+    async def cancel_all(self) -> int:
+        """
+        取消所有执行中的调用并等待其结束（关闭时调用）
+        
+        Returns:
+            取消的调用数
+        """
+        tasks = list(self._inflight.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return len(tasks)
+    
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            self._waiters.pop(key, None)
+        # 所有调用方都已取消时避免 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+
+# 导出
+__all__ = ['TTLCache', 'SingleFlight', 'MISSING']
@@ -0,0 +1,298 @@
+"""
+自适应并发控制
+- AdaptiveLimiter: AIMD 并发上限（健康时每轮 +1，429 / 超时时乘性减半）
+- CircuitBreaker: 上游持续失败时熔断，暂停派发，冷却后放行少量探测请求
+"""
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from app.utils.metrics import registry
+
+# 并发控制指标
+CONCURRENCY_LIMIT = registry.gauge(
+    "adaptive_concurrency_limit",
+    "自适应并发当前上限",
+    ["name"]
+)
+CONCURRENCY_INFLIGHT = registry.gauge(
+    "adaptive_concurrency_inflight",
+    "自适应并发当前在途数",
+    ["name"]
+)
+CONCURRENCY_DECREASES = registry.counter(
+    "adaptive_concurrency_decreases",
+    "自适应并发下调次数",
+    ["name", "reason"]
+)
+CIRCUIT_STATE = registry.gauge(
+    "circuit_breaker_state",
+    "熔断器状态（0 关闭 / 1 半开 / 2 打开）",
+    ["name"]
+)
+CIRCUIT_OPENS = registry.counter(
+    "circuit_breaker_opens",
+    "熔断器打开次数",
+    ["name"]
+)
+
+# 请求结果
+SUCCESS = "success"
+RATE_LIMITED = "rate_limited"
+TIMEOUT = "timeout"
+ERROR = "error"
+
+
+class CircuitBreaker:
+    """
+    滑动窗口熔断器
+    
+    窗口内请求数达到 min_requests 且失败率达到 failure_rate 时打开；
+    打开 open_seconds 后进入半开，只放行少量请求，成功则关闭，失败则再次打开（冷却时间翻倍，有上限）。
+    """
+    
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+    
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+    
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        min_requests: int = 20,
+        window_seconds: float = 30,
+        open_seconds: float = 30,
+        max_open_seconds: float = 300
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        
+        self.state = self.CLOSED
+        self.opened_at: Optional[float] = None
+        self.open_until = 0.0
+        self._current_open_seconds = open_seconds
+        self._events: Deque[Tuple[float, bool]] = deque()
+        CIRCUIT_STATE.labels(name).set(0)
+    
+    def _set_state(self, state: str):
+        self.state = state
+        CIRCUIT_STATE.labels(self.name).set(self._STATE_VALUES[state])
+    
+    def _trim(self, now: float):
+        cutoff = now - self.window_seconds
+        while self._events and self._events[0][0] < cutoff:
+            self._events.popleft()
+    
+    def _open(self, now: float):
+        self._set_state(self.OPEN)
+        self.opened_at = now
+        self.open_until = now + self._current_open_seconds
+        self._events.clear()
+        CIRCUIT_OPENS.labels(self.name).inc()
+    
+    def _refresh(self, now: float):
+        """打开状态冷却结束后转为半开"""
+        if self.state == self.OPEN and now >= self.open_until:
+            self._set_state(self.HALF_OPEN)
+    
+    def record(self, ok: bool):
+        """记录一次请求结果"""
+        now = time.monotonic()
+        self._refresh(now)
+        
+        if self.state == self.HALF_OPEN:
+            if ok:
+                self._set_state(self.CLOSED)
+                self._current_open_seconds = self.open_seconds
+                self._events.clear()
+            else:
+                self._current_open_seconds = min(self._current_open_seconds * 2, self.max_open_seconds)
+                self._open(now)
+            return
+        
+        if self.state == self.OPEN:
+            return
+        
+        self._events.append((now, ok))
+        self._trim(now)
+        total = len(self._events)
+        if total >= self.min_requests:
+            failures = sum(1 for _, success in self._events if not success)
+            if failures / total >= self.failure_rate:
+                self._open(now)
+    
+    def current_state(self) -> str:
+        self._refresh(time.monotonic())
+        return self.state
+    
+    async def wait_ready(self):
+        """熔断打开时等待冷却结束"""
+        while True:
+            now = time.monotonic()
+            self._refresh(now)
+            if self.state != self.OPEN:
+                return
+            await asyncio.sleep(max(0.05, self.open_until - now))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        self._refresh(now)
+        self._trim(now)
+        total = len(self._events)
+        failures = sum(1 for _, ok in self._events if not ok)
+        return {
+            'state': self.state,
+            'window_requests': total,
+            'window_failure_rate': round(failures / total, 4) if total else 0,
+            'reopens_in_s': round(max(0.0, self.open_until - now), 2) if self.state == self.OPEN else 0
+        }
+
+
+class AdaptiveLimiter:
+    """
+    AIMD 自适应并发限制
+    
+    - 成功且耗时不超过 latency_target：上限 += increase_step / 上限（约每轮 +increase_step）
+    - 成功但耗时超标：保持不变
+    - 429 / 超时：上限 *= decrease_factor（decrease_cooldown 秒内只下调一次，避免同一波失败连续砍半）
+    - 熔断器打开时 acquire 阻塞；半开时只允许 1 个在途
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int = 5,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        latency_target: float = 2.0,
+        increase_step: float = 1.0,
+        decrease_factor: float = 0.5,
+        decrease_cooldown: float = 2.0,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.latency_target = latency_target
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+        self.breaker = breaker
+        
+        self.limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self.inflight = 0
+        self._last_decrease = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._counts = {SUCCESS: 0, RATE_LIMITED: 0, TIMEOUT: 0, ERROR: 0}
+        self._update_gauges()
+    
+    @property
+    def current_limit(self) -> int:
+        return max(self.min_limit, int(self.limit))
+    
+    def _capacity(self) -> int:
+        if self.breaker is not None and self.breaker.current_state() == CircuitBreaker.HALF_OPEN:
+            return 1
+        return self.current_limit
+    
+    def _update_gauges(self):
+        CONCURRENCY_LIMIT.labels(self.name).set(self.current_limit)
+        CONCURRENCY_INFLIGHT.labels(self.name).set(self.inflight)
+    
+    def _wake(self):
+        """唤醒等待者（被唤醒后会重新检查容量）"""
+        free = self._capacity() - self.inflight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+    
+    async def acquire(self):
+        """获取一个并发名额"""
+        while True:
+            if self.breaker is not None:
+                await self.breaker.wait_ready()
+            
+            if self.inflight < self._capacity():
+                self.inflight += 1
+                self._update_gauges()
+                return
+            
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                # 超时后重新检查（熔断状态可能随时间变化）
+                await asyncio.wait_for(waiter, timeout=1.0)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                if not waiter.done():
+                    waiter.cancel()
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+    
+    def release(self):
+        """归还并发名额"""
+        self.inflight = max(0, self.inflight - 1)
+        self._update_gauges()
+        self._wake()
+    
+    @asynccontextmanager
+    async def slot(self):
+        """async with limiter.slot(): ..."""
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+    
+    def record(self, outcome: str, latency: float = 0.0):
+        """
+        记录一次上游请求结果
+        
+        Args:
+            outcome: success / rate_limited / timeout / error
+            latency: 请求耗时（秒）
+        """
+        self._counts[outcome] = self._counts.get(outcome, 0) + 1
+        if self.breaker is not None:
+            self.breaker.record(outcome == SUCCESS)
+        
+        if outcome in (RATE_LIMITED, TIMEOUT):
+            now = time.monotonic()
+            if now - self._last_decrease >= self.decrease_cooldown:
+                self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+                self._last_decrease = now
+                CONCURRENCY_DECREASES.labels(self.name, outcome).inc()
+        elif outcome == SUCCESS and latency <= self.latency_target:
+            self.limit = min(float(self.max_limit), self.limit + self.increase_step / max(self.limit, 1.0))
+        
+        self._update_gauges()
+        self._wake()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'limit': self.current_limit,
+            'limit_raw': round(self.limit, 3),
+            'min_limit': self.min_limit,
+            'max_limit': self.max_limit,
+            'inflight': self.inflight,
+            'waiting': len(self._waiters),
+            'outcomes': dict(self._counts),
+            'breaker': self.breaker.get_stats() if self.breaker else None
+        }
+
+
+# 导出
+__all__ = ['AdaptiveLimiter', 'CircuitBreaker', 'SUCCESS', 'RATE_LIMITED', 'TIMEOUT', 'ERROR']
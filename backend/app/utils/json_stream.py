@@ -0,0 +1,103 @@
+"""
+增量 JSON 解析
+从字节流中逐个解出顶层数组的元素，不需要先把整个响应读入内存再 json.loads。
+"""
+import json
+import codecs
+from typing import Any, AsyncIterator
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+def _skip(buf: str, pos: int, chars: str) -> int:
+    """跳过指定字符"""
+    length = len(buf)
+    while pos < length and buf[pos] in chars:
+        pos += 1
+    return pos
+
+
+async def iter_json_array(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """
+    逐个产出顶层 JSON 数组中的元素
+    
+    Args:
+        chunks: 字节块异步迭代器（如 httpx.Response.aiter_bytes()）
+    
+    Yields:
+        数组元素；如果顶层不是数组，则把整体解析后按列表处理（非列表时不产出）
+    """
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    pos = 0
+    started = False
+    finished = False
+    
+    async for chunk in chunks:
+        if finished:
+            continue
+        buf = buf[pos:] + text_decoder.decode(chunk)
+        pos = 0
+        
+        if not started:
+            pos = _skip(buf, pos, _WHITESPACE)
+            if pos >= len(buf):
+                continue
+            if buf[pos] != "[":
+                # 顶层不是数组：退化为整体解析
+                rest = [buf[pos:]]
+                async for more in chunks:
+                    rest.append(text_decoder.decode(more))
+                rest.append(text_decoder.decode(b"", final=True))
+                value = json.loads("".join(rest))
+                if isinstance(value, list):
+                    for item in value:
+                        yield item
+                return
+            started = True
+            pos += 1
+        
+        while True:
+            pos = _skip(buf, pos, _WHITESPACE + ",")
+            if pos >= len(buf):
+                break
+            if buf[pos] == "]":
+                finished = True
+                break
+            try:
+                item, end = _decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break  # 元素不完整，等待更多数据
+            # 元素后必须紧跟分隔符，否则可能是被截断的数字（如 "-1500." 被解析成 -1500），等待更多数据
+            delimiter = _skip(buf, end, _WHITESPACE)
+            if delimiter >= len(buf) or buf[delimiter] not in ",]":
+                break
+            yield item
+            pos = end
+    
+    if finished:
+        return
+    
+    # 流结束：处理缓冲区中剩下的最后一个元素
+    buf = buf[pos:] + text_decoder.decode(b"", final=True)
+    pos = _skip(buf, 0, _WHITESPACE + ",")
+    if not started:
+        if pos < len(buf):
+            value = json.loads(buf[pos:])
+            if isinstance(value, list):
+                for item in value:
+                    yield item
+        return
+    
+    while pos < len(buf) and buf[pos] != "]":
+        item, pos = _decoder.raw_decode(buf, pos)
+        yield item
+        pos = _skip(buf, pos, _WHITESPACE + ",")
+    
+    if pos >= len(buf):
+        raise ValueError("JSON 数组不完整")
+
+
+# 导出
+__all__ = ['iter_json_array']
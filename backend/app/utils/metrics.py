@@ -0,0 +1,288 @@
+"""
+进程内指标注册表
+提供 Counter / Gauge / Histogram，并以 Prometheus 文本格式导出（/metrics）
+
+热路径上的记录操作不加锁：只在首次创建某组标签的子指标时加锁，
+之后的 inc/observe 只是对 Python 数值做累加（在 GIL 下足够用于统计）。
+"""
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Tuple, Optional, Sequence
+
+# 默认延迟直方图分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Prometheus 文本格式 Content-Type
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4"
+
+
+def _escape(value: str) -> str:
+    """转义标签值"""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    """格式化标签 {a="1",b="2"}"""
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    """格式化数值"""
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    """指标基类（按标签值缓存子指标）"""
+    
+    type_name = "untyped"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        
+        # 无标签指标直接持有一个默认子指标
+        if not self.labelnames:
+            self._default = self._new_child()
+            self._children[()] = self._default
+    
+    def _new_child(self):
+        raise NotImplementedError
+    
+    def labels(self, *values, **kwargs):
+        """
+        获取指定标签值的子指标
+        
+        Args:
+            values: 按顺序的标签值
+            kwargs: 按名称的标签值
+        """
+        if kwargs:
+            values = tuple(str(kwargs[n]) for n in self.labelnames)
+        else:
+            values = tuple(str(v) for v in values)
+        
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}")
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._new_child()
+                    self._children[values] = child
+        return child
+    
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+    
+    def render(self) -> str:
+        """导出为 Prometheus 文本格式"""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}"
+        ]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+    
+    def __init__(self):
+        self.value = 0.0
+    
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+    
+    type_name = "counter"
+    
+    def _new_child(self):
+        return _CounterChild()
+    
+    def inc(self, amount: float = 1.0):
+        """无标签计数器累加"""
+        self._default.inc(amount)
+    
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}_total{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+            for values, child in list(self._children.items())
+        ]
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+    
+    def __init__(self):
+        self.value = 0.0
+    
+    def set(self, value: float):
+        self.value = float(value)
+    
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+    
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值"""
+    
+    type_name = "gauge"
+    
+    def _new_child(self):
+        return _GaugeChild()
+    
+    def set(self, value: float):
+        self._default.set(value)
+    
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+    
+    def dec(self, amount: float = 1.0):
+        self._default.dec(amount)
+    
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+            for values, child in list(self._children.items())
+        ]
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count")
+    
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个是 +Inf
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+    
+    @contextmanager
+    def time(self):
+        """计时上下文"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(_Metric):
+    """分桶直方图"""
+    
+    type_name = "histogram"
+    
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+    
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+    
+    def observe(self, value: float):
+        self._default.observe(value)
+    
+    def time(self):
+        return self._default.time()
+    
+    def _samples(self) -> List[str]:
+        lines = []
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}"
+                )
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表"""
+    
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+    
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # 重复注册（如模块重载）时返回已有指标
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+    
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """注册计数器"""
+        return self._register(Counter(name, documentation, labelnames))
+    
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        """注册瞬时值"""
+        return self._register(Gauge(name, documentation, labelnames))
+    
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        """注册直方图"""
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+    
+    def get(self, name: str) -> Optional[_Metric]:
+        """按名称获取指标"""
+        return self._metrics.get(name)
+    
+    def render(self) -> str:
+        """导出所有指标（Prometheus 文本格式）"""
+        return "\n".join(m.render() for m in list(self._metrics.values())) + "\n"
+
+
+# 全局指标注册表
+registry = MetricsRegistry()
+
+
+# 导出
+__all__ = [
+    'registry',
+    'MetricsRegistry',
+    'Counter',
+    'Gauge',
+    'Histogram',
+    'CONTENT_TYPE_LATEST'
+]
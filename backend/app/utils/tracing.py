@@ -0,0 +1,249 @@
+"""
+轻量级链路追踪
+为一次钱包刷新记录各阶段耗时（网络 / CPU / SQLite），保存在有界内存中供查询
+
+用法：
+    with tracer.trace("wallet_refresh", address=addr):
+        with tracer.span("fetch"):
+            ...
+
+没有活动 trace 时 span() 直接返回空上下文，几乎没有开销。
+"""
+import time
+import uuid
+import heapq
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional
+from datetime import datetime
+
+
+class Span:
+    """追踪片段"""
+    
+    __slots__ = ("span_id", "parent_id", "name", "start", "end", "attrs", "error")
+    
+    def __init__(self, span_id: int, parent_id: Optional[int], name: str, attrs: Dict[str, Any]):
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.attrs = attrs
+        self.error: Optional[str] = None
+    
+    def set(self, **attrs):
+        """追加属性"""
+        self.attrs.update(attrs)
+    
+    @property
+    def duration(self) -> float:
+        """耗时（秒）"""
+        return ((self.end or time.perf_counter()) - self.start)
+
+
+class Trace:
+    """一次完整的追踪"""
+    
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.started_at = datetime.now()
+        self.spans: List[Span] = []
+        self.root = self._new_span(None, name, attrs)
+    
+    def _new_span(self, parent_id: Optional[int], name: str, attrs: Dict[str, Any]) -> Span:
+        span = Span(len(self.spans), parent_id, name, attrs)
+        self.spans.append(span)
+        return span
+    
+    @property
+    def duration(self) -> float:
+        return self.root.duration
+    
+    def to_dict(self, include_spans: bool = True) -> Dict[str, Any]:
+        """转换为字典"""
+        data = {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'started_at': self.started_at.isoformat(),
+            'duration_ms': round(self.duration * 1000, 3),
+            'attrs': self.root.attrs,
+            'error': self.root.error,
+            'stages': self.stage_durations()
+        }
+        if include_spans:
+            data['spans'] = [
+                {
+                    'span_id': span.span_id,
+                    'parent_id': span.parent_id,
+                    'name': span.name,
+                    'offset_ms': round((span.start - self.root.start) * 1000, 3),
+                    'duration_ms': round(span.duration * 1000, 3),
+                    'attrs': span.attrs,
+                    'error': span.error
+                }
+                for span in self.spans[1:]
+            ]
+        return data
+    
+    def stage_durations(self) -> Dict[str, float]:
+        """根节点下一级各阶段耗时（毫秒，同名累加）"""
+        stages: Dict[str, float] = {}
+        for span in self.spans[1:]:
+            if span.parent_id == self.root.span_id:
+                stages[span.name] = round(stages.get(span.name, 0) + span.duration * 1000, 3)
+        return stages
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """追踪器（保存最近 N 条和最慢 N 条 trace）"""
+    
+    def __init__(self, max_recent: int = 500, max_slowest: int = 50):
+        self.max_slowest = max_slowest
+        self.recent: deque = deque(maxlen=max_recent)
+        self._slowest: List = []  # 最小堆 [(duration, seq, trace)]
+        self._seq = 0
+        self._lock = threading.Lock()
+    
+    @contextmanager
+    def trace(self, name: str, **attrs):
+        """开始一条新 trace（嵌套调用时退化为 span）"""
+        if _current_trace.get() is not None:
+            with self.span(name, **attrs) as span:
+                yield span
+            return
+        
+        trace = Trace(name, attrs)
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(trace.root)
+        try:
+            yield trace.root
+        except BaseException as e:
+            trace.root.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            trace.root.end = time.perf_counter()
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            self._record(trace)
+    
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """在当前 trace 下记录一个片段"""
+        trace = _current_trace.get()
+        if trace is None:
+            yield None
+            return
+        
+        parent = _current_span.get()
+        span = trace._new_span(parent.span_id if parent else None, name, attrs)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.end = time.perf_counter()
+            _current_span.reset(token)
+    
+    def current_span(self) -> Optional[Span]:
+        """获取当前片段"""
+        return _current_span.get()
+    
+    def _record(self, trace: Trace):
+        """保存完成的 trace"""
+        with self._lock:
+            self.recent.append(trace)
+            self._seq += 1
+            item = (trace.duration, self._seq, trace)
+            if len(self._slowest) < self.max_slowest:
+                heapq.heappush(self._slowest, item)
+            elif item[0] > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, item)
+    
+    def get_recent(
+        self,
+        limit: int = 50,
+        min_duration_ms: float = 0,
+        name: Optional[str] = None,
+        address: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """查询最近的 trace（新 -> 旧）"""
+        result = []
+        for trace in reversed(list(self.recent)):
+            if name and trace.name != name:
+                continue
+            if address and trace.root.attrs.get("address") != address:
+                continue
+            if trace.duration * 1000 < min_duration_ms:
+                continue
+            result.append(trace.to_dict(include_spans=False))
+            if len(result) >= limit:
+                break
+        return result
+    
+    def get_slowest(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """查询最慢的 trace"""
+        with self._lock:
+            items = sorted(self._slowest, key=lambda x: x[0], reverse=True)
+        return [trace.to_dict(include_spans=False) for _, _, trace in items[:limit]]
+    
+    def get_trace(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        """按 ID 查询 trace（含全部 span）"""
+        with self._lock:
+            candidates = list(self.recent) + [t for _, _, t in self._slowest]
+        for trace in candidates:
+            if trace.trace_id == trace_id:
+                return trace.to_dict()
+        return None
+    
+    def get_stage_summary(self, name: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+        """
+        汇总最近 trace 中各片段的耗时分布（找出热点阶段）
+        
+        Returns:
+            {片段名: {count, avg_ms, p50_ms, p95_ms, max_ms, total_ms}}
+        """
+        durations: Dict[str, List[float]] = {}
+        for trace in list(self.recent):
+            if name and trace.name != name:
+                continue
+            for span in trace.spans:
+                durations.setdefault(span.name, []).append(span.duration * 1000)
+        
+        summary = {}
+        for span_name, values in durations.items():
+            values.sort()
+            count = len(values)
+            summary[span_name] = {
+                'count': count,
+                'avg_ms': round(sum(values) / count, 3),
+                'p50_ms': round(values[int(count * 0.5)], 3),
+                'p95_ms': round(values[min(count - 1, int(count * 0.95))], 3),
+                'max_ms': round(values[-1], 3),
+                'total_ms': round(sum(values), 3)
+            }
+        
+        return dict(sorted(summary.items(), key=lambda x: x[1]['total_ms'], reverse=True))
+    
+    def clear(self):
+        """清空已保存的 trace"""
+        with self._lock:
+            self.recent.clear()
+            self._slowest = []
+
+
+# 全局追踪器
+tracer = Tracer()
+
+
+# 导出
+__all__ = ['tracer', 'Tracer', 'Trace', 'Span']
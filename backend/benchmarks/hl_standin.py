@@ -0,0 +1,392 @@
+"""
+HyperLiquid /info 本地替身服务
+在本地提供采集器用到的 info 请求类型，用合成数据或录制的响应应答，
+可配置延迟、分页大小、响应体积以及 429 / 5xx 注入，用于离线压测采集吞吐和退避逻辑。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.hl_standin --port 8081 --wallets 1000 --fills 1000000 \\
+        --latency-ms 80 --jitter-ms 40 --rate-limit 20 --error-rate 0.02
+
+然后在 data/config/system.json 中把 api.base_url 指向 http://127.0.0.1:8081/info
+并把 api.use_mock 设为 false。
+
+支持的请求类型：
+- userFills                   最近 page_size 条成交（新 -> 旧）
+- userFillsByTime             startTime / endTime 区间内的成交（旧 -> 新，每页 page_size 条）
+- portfolio
+- clearinghouseState
+- frontendOpenOrders
+- userNonFundingLedgerUpdates 支持 startTime / endTime
+
+WebSocket 推送（/ws，对应 wss://api.hyperliquid.xyz/ws）：
+- {"method": "subscribe", "subscription": {"type": "userFills", "user": ...}}
+  回复 subscriptionResponse 和最近 --ws-snapshot-size 条成交的快照（isSnapshot: true），
+  之后按 --ws-fill-rate 为已订阅地址随机生成新成交推送（同时追加到 /info 的数据中）
+- {"method": "unsubscribe", ...} / {"method": "ping"}（回复 pong）
+- --ws-max-users 限制每条连接的订阅地址数，--ws-disconnect-after 定时断开连接（测试重连）
+
+录制数据（--fixtures 目录）：每个钱包一个 <address>.json，键为请求类型，
+userFillsByTime 可省略（与 userFills 共用同一份成交）。目录中没有的地址回退到合成数据。
+"""
+import sys
+import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+from pathlib import Path
+from collections import Counter, OrderedDict
+from typing import Dict, Any, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, JSONResponse
+from loguru import logger
+
+from benchmarks.synthetic import SyntheticDataGenerator
+
+SUPPORTED_TYPES = {
+    "userFills",
+    "userFillsByTime",
+    "portfolio",
+    "clearinghouseState",
+    "frontendOpenOrders",
+    "userNonFundingLedgerUpdates",
+}
+
+
+class TokenBucket:
+    """令牌桶限流（超出时返回 429）"""
+    
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+    
+    def take(self) -> bool:
+        """尝试取一个令牌"""
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class FixtureStore:
+    """响应数据源（录制数据优先，其次合成数据）"""
+    
+    def __init__(
+        self,
+        generator: SyntheticDataGenerator,
+        fixtures_dir: Optional[Path] = None,
+        cache_size: int = 256
+    ):
+        self.generator = generator
+        self.fixtures_dir = fixtures_dir
+        self.cache_size = cache_size
+        self._cache: OrderedDict = OrderedDict()
+    
+    def _index(self, address: str) -> int:
+        """地址 -> 合成数据序号（未知地址按哈希映射，任意地址都有数据）"""
+        index = self.generator.index_of(address)
+        if index < 0:
+            digest = hashlib.sha1(address.lower().encode()).hexdigest()
+            index = int(digest, 16) % self.generator.wallets
+        return index
+    
+    def _load(self, address: str) -> Dict[str, Any]:
+        """加载单个钱包的全部响应"""
+        if self.fixtures_dir:
+            path = self.fixtures_dir / f"{address.lower()}.json"
+            if path.exists():
+                data = json.loads(path.read_text(encoding="utf-8"))
+                fills = data.get("userFills") or data.get("userFillsByTime") or []
+                data["userFills"] = sorted(fills, key=lambda f: f.get("time", 0))
+                return data
+        
+        index = self._index(address)
+        return {
+            "userFills": self.generator.fills(index),
+            "portfolio": self.generator.portfolio(index),
+            "clearinghouseState": self.generator.clearinghouse_state(index),
+            "frontendOpenOrders": self.generator.open_orders(index),
+            "userNonFundingLedgerUpdates": self.generator.ledger_updates(index),
+        }
+    
+    def get(self, address: str) -> Dict[str, Any]:
+        """获取钱包数据（LRU 缓存，避免重复生成大批成交）"""
+        key = address.lower()
+        data = self._cache.get(key)
+        if data is None:
+            data = self._load(key)
+            self._cache[key] = data
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(key)
+        return data
+
+
+def _time_window(items: List[Dict[str, Any]], start: Optional[int], end: Optional[int]) -> List[Dict[str, Any]]:
+    """按 time 字段筛选区间"""
+    return [
+        item for item in items
+        if (start is None or item.get("time", 0) >= start)
+        and (end is None or item.get("time", 0) <= end)
+    ]
+
+
+def _next_fill(address: str, fills: List[Dict[str, Any]], rng: random.Random) -> Dict[str, Any]:
+    """在已有成交之后生成一笔新成交（仓位和 startPosition 与历史衔接）"""
+    positions: Dict[str, float] = {}
+    prices: Dict[str, float] = {}
+    for fill in fills[-200:]:
+        size = float(fill["sz"])
+        start = float(fill["startPosition"])
+        positions[fill["coin"]] = start + size if fill["side"] == "B" else start - size
+        prices[fill["coin"]] = float(fill["px"])
+    
+    coin = rng.choice(list(prices)) if prices else "BTC"
+    price = prices.get(coin, 40000.0) * (1 + rng.gauss(0, 0.005))
+    position = positions.get(coin, 0.0)
+    size = round(rng.uniform(0.01, 2.0) * (1000 / max(price, 1e-9)) ** 0.5, 4) or 0.0001
+    
+    if position != 0 and rng.random() < 0.5:
+        size = min(size, abs(position))
+        is_long = position > 0
+        direction = "Close Long" if is_long else "Close Short"
+        side = "A" if is_long else "B"
+        closed_pnl = rng.gauss(0, price * size * 0.01)
+    else:
+        is_long = position > 0 or (position == 0 and rng.random() < 0.55)
+        direction = "Open Long" if is_long else "Open Short"
+        side = "B" if is_long else "A"
+        closed_pnl = 0.0
+    
+    now = max(int(time.time() * 1000), (fills[-1]["time"] + 1) if fills else 0)
+    n = len(fills)
+    return {
+        "coin": coin,
+        "px": f"{price:.6g}",
+        "sz": f"{size:.4f}",
+        "side": side,
+        "time": now,
+        "startPosition": f"{position:.4f}",
+        "dir": direction,
+        "closedPnl": f"{closed_pnl:.6f}",
+        "hash": "0x" + hashlib.sha256(f"{address}:live:{n}:{now}".encode()).hexdigest(),
+        "oid": now,
+        "crossed": True,
+        "fee": f"{price * size * 0.00035:.6f}",
+        "tid": now,
+        "feeToken": "USDC"
+    }
+
+
+def create_app(args: argparse.Namespace) -> FastAPI:
+    """
+    创建替身服务应用
+    
+    Args:
+        args: 命令行参数
+    
+    Returns:
+        FastAPI 应用
+    """
+    app = FastAPI(title="HyperLiquid info stand-in")
+    
+    store = FixtureStore(
+        SyntheticDataGenerator(wallets=args.wallets, fills=args.fills, seed=args.seed),
+        Path(args.fixtures) if args.fixtures else None,
+        cache_size=args.cache_size
+    )
+    bucket = TokenBucket(args.rate_limit, args.burst or max(1, int(args.rate_limit)))
+    rng = random.Random(args.seed)
+    stats: Counter = Counter()
+    started = time.monotonic()
+    padding = "x" * args.pad_bytes if args.pad_bytes > 0 else None
+    
+    def build_payload(body: Dict[str, Any]) -> Any:
+        """按请求类型生成响应"""
+        request_type = body.get("type")
+        data = store.get(body["user"])
+        start, end = body.get("startTime"), body.get("endTime")
+        
+        if request_type == "userFills":
+            return list(reversed(data["userFills"][-args.page_size:]))
+        
+        if request_type == "userFillsByTime":
+            return _time_window(data["userFills"], start, end)[:args.page_size]
+        
+        if request_type == "userNonFundingLedgerUpdates":
+            return _time_window(data.get(request_type, []), start, end)
+        
+        return data.get(request_type, [] if request_type == "frontendOpenOrders" else {})
+    
+    async def delay(size: int):
+        """模拟网络延迟（基础 + 抖动 + 按体积）"""
+        latency = args.latency_ms + rng.uniform(0, args.jitter_ms) + args.latency_per_kb_ms * size / 1024
+        if latency > 0:
+            await asyncio.sleep(latency / 1000)
+    
+    @app.post("/info")
+    async def info(request: Request):
+        body = await request.json()
+        request_type = body.get("type", "unknown")
+        stats[f"requests.{request_type}"] += 1
+        
+        if request_type not in SUPPORTED_TYPES or not body.get("user"):
+            stats["status.422"] += 1
+            return JSONResponse({"error": f"unsupported request: {request_type}"}, status_code=422)
+        
+        # 限流：真实令牌桶 + 随机注入
+        if not bucket.take() or rng.random() < args.rate_limit_error_rate:
+            stats["status.429"] += 1
+            await delay(0)
+            return JSONResponse({"error": "rate limited"}, status_code=429)
+        
+        if rng.random() < args.error_rate:
+            status = rng.choice([500, 502, 503])
+            stats[f"status.{status}"] += 1
+            await delay(0)
+            return JSONResponse({"error": "injected failure"}, status_code=status)
+        
+        payload = build_payload(body)
+        if padding is not None and isinstance(payload, list):
+            payload = [dict(item, _pad=padding) if isinstance(item, dict) else item for item in payload]
+        content = json.dumps(payload, separators=(",", ":")).encode()
+        
+        stats["status.200"] += 1
+        stats["bytes"] += len(content)
+        await delay(len(content))
+        return Response(content, media_type="application/json")
+    
+    @app.websocket("/ws")
+    async def ws_feed(websocket: WebSocket):
+        """userFills 推送"""
+        await websocket.accept()
+        stats["ws.connections"] += 1
+        subscribed: Dict[str, str] = {}
+        connected_at = time.monotonic()
+        
+        async def send(message: Dict[str, Any]):
+            stats["ws.sent"] += 1
+            await websocket.send_text(json.dumps(message, separators=(",", ":")))
+        
+        async def push_loop():
+            # 按 --ws-fill-rate（每秒，整个连接合计）随机挑一个已订阅地址推送新成交
+            while True:
+                await asyncio.sleep(rng.expovariate(args.ws_fill_rate) if args.ws_fill_rate > 0 else 3600)
+                if args.ws_disconnect_after and time.monotonic() - connected_at > args.ws_disconnect_after:
+                    stats["ws.disconnects"] += 1
+                    await websocket.close(code=1012)
+                    return
+                if not subscribed:
+                    continue
+                user = rng.choice(list(subscribed.values()))
+                data = store.get(user)
+                fill = _next_fill(user.lower(), data["userFills"], rng)
+                data["userFills"].append(fill)
+                stats["ws.fills"] += 1
+                await send({"channel": "userFills", "data": {"user": user, "fills": [fill]}})
+        
+        pusher = asyncio.create_task(push_loop())
+        try:
+            while True:
+                message = json.loads(await websocket.receive_text())
+                method = message.get("method")
+                subscription = message.get("subscription") or {}
+                user = subscription.get("user") or ""
+                
+                if method == "ping":
+                    await send({"channel": "pong"})
+                elif method in ("subscribe", "unsubscribe") and subscription.get("type") == "userFills" and user:
+                    if method == "subscribe":
+                        if user.lower() not in subscribed and len(subscribed) >= args.ws_max_users:
+                            await send({"channel": "error", "data": f"Cannot track more than {args.ws_max_users} total users."})
+                            continue
+                        subscribed[user.lower()] = user
+                    else:
+                        subscribed.pop(user.lower(), None)
+                    stats[f"ws.{method}"] += 1
+                    await send({"channel": "subscriptionResponse", "data": message})
+                    
+                    if method == "subscribe" and args.ws_snapshot_size > 0:
+                        fills = store.get(user)["userFills"][-args.ws_snapshot_size:]
+                        await send({"channel": "userFills", "data": {"isSnapshot": True, "user": user, "fills": fills}})
+                else:
+                    await send({"channel": "error", "data": f"Unsupported message: {json.dumps(message)}"})
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+        finally:
+            pusher.cancel()
+            stats["ws.closed"] += 1
+    
+    @app.get("/stats")
+    async def get_stats():
+        """请求统计（压测时观察采集器的请求分布和退避效果）"""
+        elapsed = time.monotonic() - started
+        total = sum(v for k, v in stats.items() if k.startswith("requests."))
+        return {
+            "uptime_s": round(elapsed, 2),
+            "requests": total,
+            "requests_per_s": round(total / elapsed, 2) if elapsed > 0 else 0,
+            "counters": dict(stats)
+        }
+    
+    @app.post("/stats/reset")
+    async def reset_stats():
+        nonlocal started
+        stats.clear()
+        started = time.monotonic()
+        return {"success": True}
+    
+    return app
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="HyperLiquid /info 本地替身服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--wallets", type=int, default=1000, help="合成钱包数")
+    parser.add_argument("--fills", type=int, default=1_000_000, help="合成成交总笔数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子（数据和故障注入）")
+    parser.add_argument("--fixtures", help="录制数据目录（<address>.json）")
+    parser.add_argument("--cache-size", type=int, default=256, help="缓存的钱包数据数量")
+    parser.add_argument("--page-size", type=int, default=2000, help="成交分页大小（HyperLiquid 为 2000）")
+    parser.add_argument("--pad-bytes", type=int, default=0, help="列表响应每项附加的填充字节（放大响应体积）")
+    parser.add_argument("--latency-ms", type=float, default=0, help="基础延迟（毫秒）")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="随机抖动上限（毫秒）")
+    parser.add_argument("--latency-per-kb-ms", type=float, default=0, help="每 KB 响应额外延迟（毫秒）")
+    parser.add_argument("--rate-limit", type=float, default=0, help="每秒请求上限，超出返回 429（0 为不限）")
+    parser.add_argument("--burst", type=int, default=0, help="令牌桶容量（默认等于 --rate-limit）")
+    parser.add_argument("--rate-limit-error-rate", type=float, default=0, help="随机注入 429 的概率")
+    parser.add_argument("--error-rate", type=float, default=0, help="随机注入 5xx 的概率")
+    parser.add_argument("--ws-fill-rate", type=float, default=1.0, help="每条 WebSocket 连接每秒推送的新成交数")
+    parser.add_argument("--ws-snapshot-size", type=int, default=100, help="订阅时快照包含的最近成交数")
+    parser.add_argument("--ws-max-users", type=int, default=10, help="每条连接最多订阅的地址数")
+    parser.add_argument("--ws-disconnect-after", type=float, default=0, help="连接存活秒数，到时服务端主动断开（0 为不断开）")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    import uvicorn
+    
+    args = parse_args(argv)
+    logger.info(
+        f"HyperLiquid 替身服务: http://{args.host}:{args.port}/info ws://{args.host}:{args.port}/ws "
+        f"({args.wallets} 钱包 / {args.fills} 笔成交, 延迟 {args.latency_ms}±{args.jitter_ms} ms, "
+        f"限流 {args.rate_limit or '无'} req/s, 429 注入 {args.rate_limit_error_rate}, 5xx 注入 {args.error_rate})"
+    )
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,469 @@
+"""
+分析流水线性能基准
+用确定性合成数据跑完整流水线，输出 JSON 报告用于回归对比
+
+用法（在 backend 目录下）：
+    python -m benchmarks.run --scale small
+    python -m benchmarks.run --wallets 10000 --fills 10000000 --output bench.json
+    python -m benchmarks.run --scale small --compare bench.json --tolerance 0.2
+
+测试项：
+- process_wallet_data   HyperLiquidClient._process_wallet_data（原始响应 -> 标准格式）
+- decode_buffered       成交响应整体 json.loads 后再转换为交易记录（始终统计峰值内存）
+- decode_streamed       成交响应边读边解码为交易记录（iter_json_array，始终统计峰值内存）
+- trades_as_dicts       一页交易以字典列表表示时的分配量（对照）
+- trades_as_batch       一页交易以 TradeBatch 列式容器表示时的分配量
+- calculate_all_metrics WalletAnalyzer._calculate_all_metrics
+- comprehensive_score   TradingScorer.calculate_comprehensive_score
+- persistence           WalletAnalyzer._save_to_database（临时 SQLite 库）
+- query_wallets         POST /api/wallet-management/query
+- tag_search            POST /api/tags/search
+- stats_summary         GET  /api/wallet-management/stats/summary
+- dashboard_*           GET  /api/dashboard/*（JSON 存储，写入前 N 个钱包）
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from loguru import logger
+
+from benchmarks.synthetic import SyntheticDataGenerator
+
+# 预设规模：(钱包数, 成交总数)
+SCALES = {
+    "tiny": (20, 20_000),
+    "small": (200, 200_000),
+    "medium": (1000, 1_000_000),
+    "full": (10000, 10_000_000),
+}
+
+
+def _peak_rss_mb() -> float:
+    """进程峰值常驻内存（MB）"""
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return round(peak / 1024 / (1024 if sys.platform == "darwin" else 1), 2)
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    """最近秩百分位"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+class Stage:
+    """单个测试项的计时与内存统计"""
+    
+    def __init__(self, name: str, unit: str, trace_memory: bool = False):
+        self.name = name
+        self.unit = unit
+        self.trace_memory = trace_memory
+        self.latencies: List[float] = []
+        self.items = 0
+        self.peak_alloc = 0
+    
+    def run(self, func: Callable, *args, items: int = 1):
+        """执行一次并记录耗时"""
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        
+        start = time.perf_counter()
+        result = func(*args)
+        self.latencies.append(time.perf_counter() - start)
+        self.items += items
+        
+        if self.trace_memory:
+            self.peak_alloc = max(self.peak_alloc, tracemalloc.get_traced_memory()[1] - base)
+        return result
+    
+    def report(self) -> Dict[str, Any]:
+        """生成统计结果"""
+        values = sorted(self.latencies)
+        total = sum(values)
+        data = {
+            'calls': len(values),
+            'items': self.items,
+            'unit': self.unit,
+            'total_s': round(total, 4),
+            'throughput': round(self.items / total, 2) if total > 0 else 0,
+            'mean_ms': round(total / len(values) * 1000, 4) if values else 0,
+            'p50_ms': round(_percentile(values, 50) * 1000, 4),
+            'p99_ms': round(_percentile(values, 99) * 1000, 4),
+            'max_ms': round(values[-1] * 1000, 4) if values else 0,
+            'peak_rss_mb': _peak_rss_mb()
+        }
+        if self.trace_memory:
+            data['peak_alloc_mb'] = round(self.peak_alloc / 1024 / 1024, 3)
+        return data
+
+
+class PipelineBenchmark:
+    """流水线基准测试"""
+    
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.generator = SyntheticDataGenerator(wallets=args.wallets, fills=args.fills, seed=args.seed)
+        self.stages: Dict[str, Stage] = {}
+        self.workdir = Path(args.workdir or tempfile.mkdtemp(prefix="hl-bench-"))
+        self.workdir.mkdir(parents=True, exist_ok=True)
+    
+    def stage(self, name: str, unit: str, trace_memory: bool = False) -> Stage:
+        if name not in self.stages:
+            self.stages[name] = Stage(name, unit, self.args.tracemalloc or trace_memory)
+        return self.stages[name]
+    
+    def _setup_database(self):
+        """把全局数据库连接切换到临时库"""
+        from app.database import db
+        
+        db.close()
+        db.db_path = self.workdir / "bench.db"
+        if db.db_path.exists():
+            db.db_path.unlink()
+        db._init_database()
+        db.create_tables()
+    
+    def _setup_storage(self):
+        """把看板使用的 JSON 存储切换到临时目录"""
+        from app.api import dashboard
+        
+        storage = dashboard.storage
+        storage.wallets_dir = self.workdir / "wallets"
+        storage.index_file = storage.wallets_dir / "index.json"
+        storage.wallets_dir.mkdir(parents=True, exist_ok=True)
+        storage.index = {"wallets": []}
+    
+    def run_pipeline(self):
+        """逐钱包跑 解析 -> 指标 -> 评分 -> 入库"""
+        from app.services.wallet_analyzer import WalletAnalyzer
+        from app.api import dashboard
+        
+        analyzer = WalletAnalyzer(use_mock=True)
+        client = analyzer.hl_client
+        
+        process = self.stage("process_wallet_data", "fills")
+        metrics_stage = self.stage("calculate_all_metrics", "wallets")
+        scoring = self.stage("comprehensive_score", "wallets")
+        persistence = self.stage("persistence", "fills")
+        generate = self.stage("generate", "fills")
+        
+        progress_every = max(1, self.args.wallets // 20)
+        
+        for index in range(self.generator.wallets):
+            raw = generate.run(self.generator.raw_wallet, index, items=self.generator.fill_counts[index])
+            address = raw["address"]
+            fill_count = len(raw["fills"])
+            
+            wallet_data = process.run(
+                client._process_wallet_data,
+                address,
+                raw["fills"],
+                raw["portfolio"],
+                raw["open_orders"],
+                raw["clearinghouse_state"],
+                raw["transfers"],
+                items=fill_count
+            )
+            del raw
+            
+            metrics = metrics_stage.run(analyzer._calculate_all_metrics, wallet_data)
+            score_result = scoring.run(
+                analyzer.scorer.calculate_comprehensive_score,
+                metrics,
+                wallet_data.get("trades", []),
+                wallet_data.get("positions", [])
+            )
+            
+            if not self.args.skip_persist:
+                final_data = {
+                    **metrics,
+                    "smart_money_score": score_result["total_score"],
+                    "score_grade": score_result["grade"],
+                    "tags": json.dumps(score_result["tags"]),
+                    "style": score_result["style"],
+                    "last_updated": datetime.now().isoformat()
+                }
+                persistence.run(analyzer._save_to_database, address, final_data, wallet_data, items=fill_count)
+            
+            if index < self.args.dashboard_wallets:
+                wallet_data["metrics"].update({
+                    "smart_money_score": score_result["total_score"],
+                    "max_drawdown": metrics.get("max_drawdown", 0)
+                })
+                dashboard.storage.save_wallet(address, wallet_data)
+            
+            if (index + 1) % progress_every == 0:
+                print(f"  [{index + 1}/{self.generator.wallets}] 钱包已处理", file=sys.stderr)
+    
+    def run_decode(self):
+        """成交响应解码：整体解析 vs 流式解析（取成交最多的钱包，按 API 每页 2000 条切分）"""
+        from app.services.hyperliquid import HyperLiquidClient
+        from app.models.trade import TradeBatch
+        
+        client = HyperLiquidClient(use_mock=True)
+        page_size = 2000
+        chunk_size = 64 * 1024
+        
+        largest = sorted(range(self.generator.wallets), key=lambda i: self.generator.fill_counts[i], reverse=True)
+        pages = []
+        for index in largest[:self.args.decode_wallets]:
+            fills = self.generator.fills(index)
+            for offset in range(0, len(fills), page_size):
+                page = fills[offset:offset + page_size]
+                pages.append((json.dumps(page).encode(), len(page)))
+            del fills
+        
+        def buffered(body: bytes):
+            trades = TradeBatch()
+            for fill in json.loads(body):
+                client._append_fill(trades, fill)
+            return trades
+        
+        async def chunks(body: bytes):
+            for offset in range(0, len(body), chunk_size):
+                yield body[offset:offset + chunk_size]
+        
+        loop = asyncio.new_event_loop()
+        streamed = lambda body: loop.run_until_complete(client._decode_fills(chunks(body)))[0]
+        
+        started = tracemalloc.is_tracing()
+        if not started:
+            tracemalloc.start()
+        
+        buffered_stage = self.stage("decode_buffered", "fills", trace_memory=True)
+        streamed_stage = self.stage("decode_streamed", "fills", trace_memory=True)
+        dicts_stage = self.stage("trades_as_dicts", "fills", trace_memory=True)
+        batch_stage = self.stage("trades_as_batch", "fills", trace_memory=True)
+        for body, count in pages:
+            buffered_stage.run(buffered, body, items=count)
+            trades = streamed_stage.run(streamed, body, items=count)
+            
+            # 同一页交易分别以字典列表和列式容器常驻时的内存
+            dicts_stage.run(trades.to_dicts, items=count)
+            batch_stage.run(TradeBatch.from_trades, trades.to_dicts(), items=count)
+        
+        if not started:
+            tracemalloc.stop()
+        loop.close()
+    
+    def run_queries(self):
+        """查询类接口（直接调用路由函数，不经过 HTTP 栈）"""
+        from app.api.wallet_management import query_wallets, get_stats_summary, WalletQueryRequest
+        from app.api.tag_api import search_by_tags, SearchByTagsRequest
+        from app.api import dashboard
+        
+        iterations = self.args.query_iterations
+        loop = asyncio.new_event_loop()
+        call = lambda coro_func, *a: loop.run_until_complete(coro_func(*a))
+        
+        sorts = ["smart_money_score", "roi", "win_rate", "total_pnl", "max_drawdown"]
+        filters = [
+            None,
+            {"smart_money_score": {"min": 60}},
+            {"roi": {"min": 0, "max": 500}},
+            {"score_grade": "A"},
+        ]
+        tag_queries = [
+            (["高胜率"], False),
+            (["高胜率", "低回撤"], True),
+            (["顶级交易者", "优秀交易者", "资深交易者"], False),
+        ]
+        
+        query = self.stage("query_wallets", "requests")
+        for n in range(iterations):
+            request = WalletQueryRequest(
+                page=1 + n % 5,
+                page_size=20,
+                sort_by=sorts[n % len(sorts)],
+                sort_order="DESC" if n % 2 == 0 else "ASC",
+                filters=filters[n % len(filters)]
+            )
+            query.run(call, query_wallets, request)
+        
+        tag_search = self.stage("tag_search", "requests")
+        for n in range(iterations):
+            tags, match_all = tag_queries[n % len(tag_queries)]
+            tag_search.run(call, search_by_tags, SearchByTagsRequest(tags=tags, match_all=match_all))
+        
+        summary = self.stage("stats_summary", "requests")
+        for _ in range(iterations):
+            summary.run(call, get_stats_summary)
+        
+        dashboard_iterations = max(1, iterations // 20)
+        for name, endpoint in [
+            ("dashboard_stats", dashboard.get_dashboard_stats),
+            ("dashboard_long_short_ratio", dashboard.get_long_short_ratio),
+            ("dashboard_anomalies", dashboard.get_anomalies),
+            ("dashboard_rankings", dashboard.get_rankings),
+        ]:
+            stage = self.stage(name, "requests")
+            for _ in range(dashboard_iterations):
+                stage.run(call, endpoint)
+        
+        loop.close()
+    
+    def run(self) -> Dict[str, Any]:
+        """执行全部测试项"""
+        started_at = datetime.now()
+        if self.args.tracemalloc:
+            tracemalloc.start()
+        
+        self._setup_database()
+        self._setup_storage()
+        
+        start = time.perf_counter()
+        print(f"▶ 流水线: {self.generator.wallets} 钱包 / {self.generator.total_fills} 笔成交", file=sys.stderr)
+        self.run_pipeline()
+        print("▶ 成交解码", file=sys.stderr)
+        self.run_decode()
+        print("▶ 查询接口", file=sys.stderr)
+        self.run_queries()
+        elapsed = time.perf_counter() - start
+        
+        if self.args.tracemalloc:
+            tracemalloc.stop()
+        
+        return {
+            'meta': {
+                'seed': self.args.seed,
+                'wallets': self.generator.wallets,
+                'fills': self.generator.total_fills,
+                'max_fills_per_wallet': max(self.generator.fill_counts, default=0),
+                'query_iterations': self.args.query_iterations,
+                'dashboard_wallets': min(self.args.dashboard_wallets, self.generator.wallets),
+                'persist': not self.args.skip_persist,
+                'tracemalloc': self.args.tracemalloc,
+                'started_at': started_at.isoformat(),
+                'duration_s': round(elapsed, 2),
+                'peak_rss_mb': _peak_rss_mb(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'commit': _git_commit()
+            },
+            'results': {name: stage.report() for name, stage in self.stages.items()}
+        }
+
+
+def _git_commit() -> Optional[str]:
+    """当前代码版本"""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent,
+            stderr=subprocess.DEVNULL,
+            text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def compare_reports(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    与基线报告对比
+    
+    Args:
+        current: 本次报告
+        baseline: 基线报告
+        tolerance: 允许的相对退化比例（0.2 = 20%）
+    
+    Returns:
+        退化描述列表（为空表示无退化）
+    """
+    regressions = []
+    
+    for name, result in current['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            continue
+        
+        for key in ('p50_ms', 'p99_ms'):
+            if base.get(key) and result[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{name}.{key}: {base[key]} -> {result[key]} (+{(result[key] / base[key] - 1) * 100:.1f}%)")
+        
+        if base.get('throughput') and result['throughput'] < base['throughput'] * (1 - tolerance):
+            regressions.append(
+                f"{name}.throughput: {base['throughput']} -> {result['throughput']} "
+                f"({(result['throughput'] / base['throughput'] - 1) * 100:.1f}%)"
+            )
+        
+        if base.get('peak_alloc_mb') and result.get('peak_alloc_mb', 0) > base['peak_alloc_mb'] * (1 + tolerance):
+            regressions.append(f"{name}.peak_alloc_mb: {base['peak_alloc_mb']} -> {result['peak_alloc_mb']}")
+    
+    return regressions
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="分析流水线性能基准")
+    parser.add_argument("--scale", choices=SCALES.keys(), default="small", help="预设规模")
+    parser.add_argument("--wallets", type=int, help="钱包数（覆盖 --scale）")
+    parser.add_argument("--fills", type=int, help="成交总笔数（覆盖 --scale）")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--query-iterations", type=int, default=200, help="每个查询接口的调用次数")
+    parser.add_argument("--dashboard-wallets", type=int, default=1000, help="写入看板 JSON 存储的钱包数")
+    parser.add_argument("--decode-wallets", type=int, default=5, help="解码测试使用的钱包数（取成交最多的）")
+    parser.add_argument("--skip-persist", action="store_true", help="跳过入库测试")
+    parser.add_argument("--tracemalloc", action="store_true", help="统计每项的峰值内存分配（会降低速度）")
+    parser.add_argument("--workdir", help="临时库和 JSON 存储目录（默认新建临时目录）")
+    parser.add_argument("--output", help="报告输出文件（默认输出到 stdout）")
+    parser.add_argument("--compare", help="基线报告文件，有退化时退出码为 1")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="对比时允许的退化比例")
+    args = parser.parse_args(argv)
+    
+    default_wallets, default_fills = SCALES[args.scale]
+    args.wallets = args.wallets or default_wallets
+    args.fills = args.fills or default_fills
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    
+    # 基准测试期间只输出警告以上日志
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    
+    report = PipelineBenchmark(args).run()
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+        print(f"✅ 报告已写入 {args.output}", file=sys.stderr)
+    else:
+        print(output)
+    
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressions = compare_reports(report, baseline, args.tolerance)
+        if regressions:
+            print(f"❌ 发现 {len(regressions)} 项性能退化:", file=sys.stderr)
+            for line in regressions:
+                print(f"  - {line}", file=sys.stderr)
+            return 1
+        print("✅ 与基线相比无性能退化", file=sys.stderr)
+    
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,291 @@
+"""
+确定性合成数据生成器
+按 HyperLiquid /info 原始响应格式生成钱包数据（userFillsByTime / portfolio /
+clearinghouseState / frontendOpenOrders / userNonFundingLedgerUpdates），
+可直接喂给 HyperLiquidClient._process_wallet_data。
+
+与 _generate_mock_wallet_data 不同：
+- 同一 seed 下每次生成的数据完全一致（不依赖全局 random 状态和当前时间）
+- 成交笔数按重尾分布分配到各钱包，总量可扩展到 1 万钱包 / 1000 万笔成交
+- 按钱包逐个生成，不需要一次性把全部成交放进内存
+"""
+import random
+import hashlib
+from typing import Dict, Any, List, Iterator, Tuple
+
+# 固定基准时间（2024-01-01 00:00:00 UTC，毫秒），保证输出与运行时间无关
+BASE_TIME_MS = 1704067200000
+
+# 币种及初始价格、选择权重
+COINS = [
+    ("BTC", 42000.0, 30),
+    ("ETH", 2300.0, 25),
+    ("SOL", 100.0, 15),
+    ("ARB", 1.8, 6),
+    ("OP", 3.5, 5),
+    ("DOGE", 0.09, 5),
+    ("AVAX", 38.0, 4),
+    ("LINK", 15.0, 4),
+    ("WIF", 2.5, 3),
+    ("PEPE", 0.000012, 3),
+]
+
+
+class SyntheticDataGenerator:
+    """合成钱包数据生成器"""
+    
+    def __init__(self, wallets: int = 10000, fills: int = 10_000_000, seed: int = 42):
+        """
+        初始化生成器
+        
+        Args:
+            wallets: 钱包数量
+            fills: 成交总笔数
+            seed: 随机种子
+        """
+        self.wallets = wallets
+        self.total_fills = fills
+        self.seed = seed
+        self.fill_counts = self._allocate_fills()
+    
+    def _allocate_fills(self) -> List[int]:
+        """按帕累托分布把成交总数分配给各钱包（少数钱包贡献大部分成交）"""
+        if self.wallets <= 0:
+            return []
+        
+        rng = random.Random(f"{self.seed}:allocation")
+        # 截断单个钱包的权重，避免小规模时一个钱包占据绝大部分成交
+        weights = [min(rng.paretovariate(1.3), 500.0) for _ in range(self.wallets)]
+        total_weight = sum(weights)
+        counts = [max(1, int(self.total_fills * w / total_weight)) for w in weights]
+        
+        # 把取整误差补到最大的钱包上，保证总数精确
+        diff = self.total_fills - sum(counts)
+        largest = max(range(self.wallets), key=lambda i: counts[i])
+        counts[largest] = max(1, counts[largest] + diff)
+        return counts
+    
+    def _rng(self, index: int, kind: str) -> random.Random:
+        """每个钱包、每类数据独立的随机源（生成顺序不影响结果）"""
+        return random.Random(f"{self.seed}:{index}:{kind}")
+    
+    def address(self, index: int) -> str:
+        """第 index 个钱包的地址"""
+        return "0x" + hashlib.sha1(f"{self.seed}:{index}".encode()).hexdigest()
+    
+    def index_of(self, address: str) -> int:
+        """
+        由地址反查钱包序号（供本地替身服务按地址生成数据）
+        
+        Returns:
+            序号，不存在返回 -1
+        """
+        if not hasattr(self, "_address_index"):
+            self._address_index = {self.address(i): i for i in range(self.wallets)}
+        return self._address_index.get(address.lower(), -1)
+    
+    def fills(self, index: int) -> List[Dict[str, Any]]:
+        """
+        生成成交记录（userFillsByTime 格式，按时间升序）
+        
+        Args:
+            index: 钱包序号
+        
+        Returns:
+            成交列表
+        """
+        rng = self._rng(index, "fills")
+        count = self.fill_counts[index]
+        address = self.address(index)
+        
+        # 每个钱包偏好 1-4 个币种
+        coin_pool = rng.choices(COINS, weights=[c[2] for c in COINS], k=rng.randint(1, 4))
+        prices = {coin: price for coin, price, _ in coin_pool}
+        positions = {coin: 0.0 for coin, _, _ in coin_pool}
+        entry = {coin: 0.0 for coin, _, _ in coin_pool}
+        
+        # 成交时间分布在 1-365 天内，活跃度越高间隔越短
+        span_ms = rng.randint(1, 365) * 86400000
+        avg_gap = max(1000, span_ms // max(count, 1))
+        now = BASE_TIME_MS - span_ms
+        skill = rng.gauss(0.0, 0.002)  # 钱包"能力"，决定平仓盈亏的偏向
+        
+        result = []
+        for n in range(count):
+            now += int(rng.expovariate(1.0 / avg_gap)) + 1
+            coin, _, _ = coin_pool[rng.randrange(len(coin_pool))]
+            
+            # 价格随机游走
+            price = prices[coin] * (1 + rng.gauss(skill, 0.01))
+            prices[coin] = price
+            
+            position = positions[coin]
+            size = round(rng.uniform(0.01, 5.0) * (1000 / max(price, 1e-9)) ** 0.5, 4) or 0.0001
+            closed_pnl = 0.0
+            
+            if position != 0 and rng.random() < 0.5:
+                # 平仓（部分或全部）
+                size = min(size, abs(position))
+                is_long = position > 0
+                direction = "Close Long" if is_long else "Close Short"
+                side = "A" if is_long else "B"
+                closed_pnl = (price - entry[coin]) * size * (1 if is_long else -1)
+                positions[coin] = position - size if is_long else position + size
+            else:
+                # 开仓 / 加仓
+                is_long = position > 0 or (position == 0 and rng.random() < 0.55)
+                direction = "Open Long" if is_long else "Open Short"
+                side = "B" if is_long else "A"
+                new_position = position + size if is_long else position - size
+                entry[coin] = (entry[coin] * abs(position) + price * size) / abs(new_position)
+                positions[coin] = new_position
+            
+            fee = price * size * 0.00035
+            result.append({
+                "coin": coin,
+                "px": f"{price:.6g}",
+                "sz": f"{size:.4f}",
+                "side": side,
+                "time": now,
+                "startPosition": f"{position:.4f}",
+                "dir": direction,
+                "closedPnl": f"{closed_pnl:.6f}",
+                "hash": "0x" + hashlib.sha256(f"{address}:{n}".encode()).hexdigest(),
+                "oid": index * 10_000_000 + n,
+                "crossed": rng.random() < 0.7,
+                "fee": f"{fee:.6f}",
+                "tid": index * 10_000_000 + n,
+                "feeToken": "USDC"
+            })
+        
+        return result
+    
+    def ledger_updates(self, index: int) -> List[Dict[str, Any]]:
+        """生成存取款记录（userNonFundingLedgerUpdates 格式）"""
+        rng = self._rng(index, "ledger")
+        first_time = BASE_TIME_MS - 366 * 86400000
+        updates = []
+        
+        for n in range(rng.randint(1, 6)):
+            is_deposit = n == 0 or rng.random() < 0.6
+            amount = rng.uniform(500, 50000) if is_deposit else -rng.uniform(100, 5000)
+            updates.append({
+                "time": first_time + n * rng.randint(1, 30) * 86400000,
+                "hash": "0x" + hashlib.sha256(f"{self.address(index)}:ledger:{n}".encode()).hexdigest(),
+                "delta": f"{amount:.2f}"
+            })
+        
+        return updates
+    
+    def portfolio(self, index: int) -> List[List[Any]]:
+        """生成账户价值历史（portfolio 格式）"""
+        rng = self._rng(index, "portfolio")
+        value = rng.uniform(1000, 100000)
+        periods = [("day", 24, 3600000), ("week", 42, 4 * 3600000), ("month", 30, 86400000), ("allTime", 100, 3 * 86400000)]
+        portfolio = []
+        
+        for name, points, step in periods:
+            history = []
+            pnl_history = []
+            v = value
+            for n in range(points):
+                ts = BASE_TIME_MS - (points - n) * step
+                v = max(1.0, v * (1 + rng.gauss(0.0005, 0.02)))
+                history.append([ts, f"{v:.2f}"])
+                pnl_history.append([ts, f"{v - value:.2f}"])
+            portfolio.append([name, {
+                "accountValueHistory": history,
+                "pnlHistory": pnl_history,
+                "vlm": f"{rng.uniform(0, 1e7):.2f}"
+            }])
+        
+        return portfolio
+    
+    def clearinghouse_state(self, index: int) -> Dict[str, Any]:
+        """生成清算所状态（clearinghouseState 格式）"""
+        rng = self._rng(index, "clearinghouse")
+        account_value = rng.uniform(1000, 100000)
+        asset_positions = []
+        margin_used = 0.0
+        notional = 0.0
+        
+        for coin, price, _ in rng.sample(COINS, rng.randint(0, 3)):
+            szi = rng.uniform(-10, 10) * (1000 / price) ** 0.5
+            leverage = rng.choice([1, 2, 3, 5, 10, 20])
+            position_value = abs(szi) * price
+            margin = position_value / leverage
+            margin_used += margin
+            notional += position_value
+            asset_positions.append({
+                "type": "oneWay",
+                "position": {
+                    "coin": coin,
+                    "szi": f"{szi:.4f}",
+                    "entryPx": f"{price:.6g}",
+                    "positionValue": f"{position_value:.2f}",
+                    "unrealizedPnl": f"{rng.gauss(0, position_value * 0.05):.2f}",
+                    "returnOnEquity": f"{rng.gauss(0, 0.2):.4f}",
+                    "liquidationPx": f"{price * (1 - 0.9 / leverage):.6g}",
+                    "marginUsed": f"{margin:.2f}",
+                    "leverage": {"type": "cross", "value": leverage},
+                    "cumFunding": {"allTime": "0.0", "sinceOpen": "0.0", "sinceChange": "0.0"}
+                }
+            })
+        
+        return {
+            "marginSummary": {
+                "accountValue": f"{account_value:.2f}",
+                "totalNtlPos": f"{notional:.2f}",
+                "totalRawUsd": f"{account_value:.2f}",
+                "totalMarginUsed": f"{margin_used:.2f}"
+            },
+            "crossMaintenanceMarginUsed": f"{margin_used * 0.5:.2f}",
+            "withdrawable": f"{max(0.0, account_value - margin_used):.2f}",
+            "assetPositions": asset_positions,
+            "time": BASE_TIME_MS
+        }
+    
+    def open_orders(self, index: int) -> List[Dict[str, Any]]:
+        """生成当前挂单（frontendOpenOrders 格式）"""
+        rng = self._rng(index, "orders")
+        orders = []
+        
+        for n in range(rng.randint(0, 5)):
+            coin, price, _ = rng.choice(COINS)
+            orders.append({
+                "coin": coin,
+                "side": rng.choice(["B", "A"]),
+                "limitPx": f"{price * rng.uniform(0.9, 1.1):.6g}",
+                "sz": f"{rng.uniform(0.01, 5):.4f}",
+                "oid": index * 1000 + n,
+                "timestamp": BASE_TIME_MS - rng.randint(0, 86400000),
+                "orderType": "Limit",
+                "reduceOnly": False
+            })
+        
+        return orders
+    
+    def raw_wallet(self, index: int) -> Dict[str, Any]:
+        """
+        生成单个钱包的全部原始响应
+        
+        Returns:
+            与 _process_wallet_data 参数同名的字典
+        """
+        return {
+            "address": self.address(index),
+            "fills": self.fills(index),
+            "portfolio": self.portfolio(index),
+            "open_orders": self.open_orders(index),
+            "clearinghouse_state": self.clearinghouse_state(index),
+            "transfers": self.ledger_updates(index)
+        }
+    
+    def iter_wallets(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """逐个生成钱包原始数据"""
+        for index in range(self.wallets):
+            yield index, self.raw_wallet(index)
+
+
+# 导出
+__all__ = ['SyntheticDataGenerator', 'BASE_TIME_MS', 'COINS']
@@ -0,0 +1,163 @@
+"""
+测试增量地址提取
+"""
+import asyncio
+import random
+import sys
+import os
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.utils.address_stream import AddressScanner, find_addresses, iter_addresses
+
+
+ADDR_A = "0x" + "ab" * 20
+ADDR_B = "0x" + "12" * 20
+ADDR_C = "0x" + "Cd" * 20
+TX_HASH = "0x" + "ef" * 32
+
+SAMPLE = (
+    f"address,note\n{ADDR_A},first\n"
+    f"\"{ADDR_B}\",tx {TX_HASH}\n"
+    f"{ADDR_C}\n"
+    f"x{ADDR_A}\n"
+    f"{ADDR_B}"
+).encode()
+
+EXPECTED = [ADDR_A, ADDR_B, ADDR_C.lower(), ADDR_B]
+
+
+def _scan(content: bytes, sizes) -> list:
+    """按给定块大小依次喂入"""
+    scanner = AddressScanner()
+    addresses = []
+    pos = 0
+    for size in sizes:
+        addresses += scanner.feed(content[pos:pos + size])
+        pos += size
+    addresses += scanner.feed(content[pos:])
+    addresses += scanner.close()
+    assert scanner.bytes_read == len(content)
+    assert scanner.found == len(addresses)
+    return addresses
+
+
+def test_find_addresses():
+    """测试一次性提取"""
+    print("\n" + "="*60)
+    print("测试 1: 一次性提取")
+    print("="*60)
+
+    try:
+        addresses = find_addresses(SAMPLE)
+        assert addresses == EXPECTED, addresses
+        print(f"✓ 提取到 {len(addresses)} 个地址")
+        print("✓ 64 位交易哈希和前面紧挨字母的地址被排除")
+        print("✓ 大写地址转为小写")
+        return True
+
+    except Exception as e:
+        print(f"✗ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_chunk_boundaries():
+    """测试地址跨块切分"""
+    print("\n" + "="*60)
+    print("测试 2: 跨块边界")
+    print("="*60)
+
+    try:
+        # 逐字节喂入
+        assert _scan(SAMPLE, [1] * len(SAMPLE)) == EXPECTED
+        print("✓ 逐字节喂入结果一致")
+
+        # 在每个位置切成两块
+        for cut in range(len(SAMPLE) + 1):
+            assert _scan(SAMPLE, [cut]) == EXPECTED, cut
+        print(f"✓ 任意位置切成两块结果一致（{len(SAMPLE) + 1} 种切法）")
+
+        # 随机块大小
+        rng = random.Random(42)
+        for _ in range(200):
+            sizes = [rng.randint(0, 50) for _ in range(20)]
+            assert _scan(SAMPLE, sizes) == EXPECTED, sizes
+        print("✓ 随机块大小结果一致")
+
+        # 交易哈希在地址长度处被切开，不能误判为地址
+        content = TX_HASH.encode()
+        for cut in range(len(content) + 1):
+            assert _scan(content, [cut]) == [], cut
+        print("✓ 跨块的交易哈希不被截成地址")
+
+        # 地址恰好位于数据末尾，由 close() 产出
+        scanner = AddressScanner()
+        assert scanner.feed(ADDR_A.encode()) == []
+        assert scanner.close() == [ADDR_A]
+        print("✓ 末尾地址在 close() 时产出")
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+async def test_iter_addresses():
+    """测试异步逐块产出"""
+    print("\n" + "="*60)
+    print("测试 3: iter_addresses")
+    print("="*60)
+
+    try:
+        async def chunks():
+            for i in range(0, len(SAMPLE), 7):
+                yield SAMPLE[i:i + 7]
+
+        scanner = AddressScanner()
+        batches = [batch async for batch in iter_addresses(chunks(), scanner)]
+        assert all(batches)
+        assert [address for batch in batches for address in batch] == EXPECTED
+        assert scanner.bytes_read == len(SAMPLE)
+        print(f"✓ 分 {len(batches)} 批产出，不产出空列表")
+        return True
+
+    except Exception as e:
+        print(f"✗ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+async def main():
+    """运行所有测试"""
+    print("="*60)
+    print("地址提取测试")
+    print("="*60)
+
+    results = [
+        ("一次性提取", test_find_addresses()),
+        ("跨块边界", test_chunk_boundaries()),
+        ("iter_addresses", await test_iter_addresses()),
+    ]
+
+    # 汇总结果
+    print("\n" + "="*60)
+    print("测试结果汇总")
+    print("="*60)
+
+    for name, result in results:
+        status = "✓ 通过" if result else "✗ 失败"
+        print(f"{name}: {status}")
+
+    return all(result for _, result in results)
+
+
+if __name__ == "__main__":
+    success = asyncio.run(main())
+    sys.exit(0 if success else 1)
@@ -0,0 +1,220 @@
+"""
+测试自适应并发与熔断器
+"""
+import asyncio
+import sys
+import os
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.utils.concurrency import (
+    AdaptiveLimiter, CircuitBreaker, SUCCESS, RATE_LIMITED, TIMEOUT, ERROR
+)
+
+
+async def test_aimd():
+    """测试 AIMD 上调与下调"""
+    print("\n" + "="*60)
+    print("测试 1: AIMD 并发上限")
+    print("="*60)
+
+    try:
+        limiter = AdaptiveLimiter("test-aimd", initial_limit=4, min_limit=1, max_limit=6,
+                                  latency_target=1.0, decrease_cooldown=60)
+
+        # 每轮（约 limit 次成功）+1
+        for _ in range(4):
+            limiter.record(SUCCESS, 0.1)
+        assert limiter.current_limit == 4 and limiter.limit > 4.9
+        limiter.record(SUCCESS, 0.1)
+        assert limiter.current_limit == 5
+        print(f"✓ 健康请求线性上调: {limiter.limit:.3f}")
+
+        # 耗时超标不上调
+        before = limiter.limit
+        limiter.record(SUCCESS, 5.0)
+        assert limiter.limit == before
+        print("✓ 耗时超标时保持不变")
+
+        # 不超过上限
+        for _ in range(100):
+            limiter.record(SUCCESS, 0.1)
+        assert limiter.current_limit == 6
+        print("✓ 不超过 max_limit")
+
+        # 429 减半，冷却期内不重复下调
+        limiter.record(RATE_LIMITED)
+        assert limiter.limit == 3.0
+        limiter.record(TIMEOUT)
+        assert limiter.limit == 3.0
+        print("✓ 429 减半，冷却期内只下调一次")
+
+        # 冷却结束后继续下调，不低于 min_limit
+        for _ in range(5):
+            limiter._last_decrease = 0.0
+            limiter.record(TIMEOUT)
+        assert limiter.current_limit == 1 and limiter.limit == 1.0
+        print("✓ 不低于 min_limit")
+
+        # 普通错误不影响上限
+        limiter.record(ERROR)
+        assert limiter.limit == 1.0
+        assert limiter.get_stats()["outcomes"][ERROR] == 1
+        print("✓ 普通错误不调整上限")
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+async def test_acquire_release():
+    """测试名额用尽时等待、归还后唤醒"""
+    print("\n" + "="*60)
+    print("测试 2: 名额等待与唤醒")
+    print("="*60)
+
+    try:
+        limiter = AdaptiveLimiter("test-slots", initial_limit=2, max_limit=2)
+        await limiter.acquire()
+        await limiter.acquire()
+        assert limiter.inflight == 2
+
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        assert limiter.get_stats()["waiting"] == 1
+        print("✓ 名额用尽时等待")
+
+        limiter.release()
+        await asyncio.wait_for(waiter, timeout=0.5)
+        assert limiter.inflight == 2
+        assert limiter.get_stats()["waiting"] == 0
+        print("✓ 归还名额后立即唤醒等待者")
+
+        # 被取消的等待者不占名额
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        limiter.release()
+        limiter.release()
+        assert limiter.inflight == 0 and limiter.get_stats()["waiting"] == 0
+        print("✓ 取消等待后不泄漏名额")
+
+        async with limiter.slot():
+            assert limiter.inflight == 1
+        assert limiter.inflight == 0
+        print("✓ slot() 退出后归还名额")
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+async def test_circuit_breaker():
+    """测试熔断器打开、半开与关闭"""
+    print("\n" + "="*60)
+    print("测试 3: 熔断器")
+    print("="*60)
+
+    try:
+        breaker = CircuitBreaker("test-breaker", failure_rate=0.5, min_requests=4,
+                                 window_seconds=30, open_seconds=0.1, max_open_seconds=0.3)
+
+        # 请求数不足时不打开
+        for _ in range(3):
+            breaker.record(False)
+        assert breaker.current_state() == CircuitBreaker.CLOSED
+        print("✓ 窗口请求数不足时保持关闭")
+
+        breaker.record(False)
+        assert breaker.current_state() == CircuitBreaker.OPEN
+        print("✓ 失败率达到阈值后打开")
+
+        # 打开期间 acquire 阻塞，冷却后进入半开
+        limiter = AdaptiveLimiter("test-breaker", initial_limit=4, breaker=breaker)
+        acquire = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.03)
+        assert not acquire.done()
+        await asyncio.wait_for(acquire, timeout=1)
+        assert breaker.current_state() == CircuitBreaker.HALF_OPEN
+        print("✓ 打开期间阻塞，冷却后放行")
+
+        # 半开时只允许 1 个在途
+        second = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.05)
+        assert not second.done()
+        print("✓ 半开时只放行 1 个探测请求")
+
+        # 探测失败：再次打开，冷却时间翻倍
+        limiter.record(ERROR)
+        limiter.release()
+        assert breaker.current_state() == CircuitBreaker.OPEN
+        assert abs((breaker.open_until - breaker.opened_at) - 0.2) < 1e-6
+        print("✓ 探测失败后再次打开，冷却时间翻倍")
+
+        await asyncio.wait_for(second, timeout=1)
+        assert breaker.current_state() == CircuitBreaker.HALF_OPEN
+
+        # 探测成功：关闭，冷却时间复位
+        limiter.record(SUCCESS, 0.1)
+        limiter.release()
+        assert breaker.current_state() == CircuitBreaker.CLOSED
+        assert breaker._current_open_seconds == 0.1
+        assert breaker.get_stats()["window_requests"] == 0
+        print("✓ 探测成功后关闭并复位冷却时间")
+
+        # 连续探测失败，冷却时间不超过上限
+        for _ in range(4):
+            breaker.record(False)
+        for _ in range(5):
+            breaker.open_until = 0.0
+            breaker.record(False)
+        assert breaker._current_open_seconds == 0.3
+        print("✓ 冷却时间不超过 max_open_seconds")
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+async def main():
+    """运行所有测试"""
+    print("="*60)
+    print("自适应并发测试")
+    print("="*60)
+
+    results = [
+        ("AIMD", await test_aimd()),
+        ("名额等待", await test_acquire_release()),
+        ("熔断器", await test_circuit_breaker()),
+    ]
+
+    # 汇总结果
+    print("\n" + "="*60)
+    print("测试结果汇总")
+    print("="*60)
+
+    for name, result in results:
+        status = "✓ 通过" if result else "✗ 失败"
+        print(f"{name}: {status}")
+
+    return all(result for _, result in results)
+
+
+if __name__ == "__main__":
+    success = asyncio.run(main())
+    sys.exit(0 if success else 1)
@@ -0,0 +1,208 @@
+"""
+测试钱包刷新派发器
+"""
+import asyncio
+import sys
+import os
+import time
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.refresh_dispatcher import DueQueue, RefreshDispatcher
+
+
+def _make_dispatcher(refresh, **kwargs) -> RefreshDispatcher:
+    """不经过 start()（不读数据库）直接准备好派发器状态"""
+    dispatcher = RefreshDispatcher(refresh, {"normal": 60}, max_concurrent=1, **kwargs)
+    dispatcher.is_running = True
+    dispatcher._wakeup = asyncio.Event()
+    dispatcher._semaphore = asyncio.Semaphore(1)
+    return dispatcher
+
+
+def test_due_queue():
+    """测试到期队列的惰性删除与堆重建"""
+    print("\n" + "="*60)
+    print("测试 1: DueQueue 惰性删除与堆重建")
+    print("="*60)
+
+    try:
+        queue = DueQueue()
+        queue.push("a", 30)
+        queue.push("b", 10)
+        queue.push("c", 20)
+
+        # 重新排期：旧堆项保留在堆里，弹出时丢弃
+        queue.push("b", 40)
+        assert len(queue) == 3
+        assert queue.due_at("b") == 40
+        assert queue.peek() == (20, "c")
+        print("✓ 重新排期后按新到期时间排序")
+
+        # 移除：只删索引，堆项在弹出时丢弃
+        assert queue.remove("c")
+        assert not queue.remove("c")
+        assert "c" not in queue
+        assert queue.peek() == (30, "a")
+        print("✓ 移除的钱包不再弹出")
+
+        # 未到期不弹出
+        assert queue.pop_due(29) is None
+        assert queue.pop_due(35) == ("a", 30)
+        assert queue.pop_due(35) is None
+        assert queue.pop_due(40) == ("b", 40)
+        assert queue.peek() is None and len(queue) == 0
+        print("✓ 只弹出已到期的钱包，旧堆项全部丢弃")
+
+        # 反复重新排期同一批钱包，堆大小保持有界
+        for i in range(10):
+            queue.push(f"w{i}", 1000)
+        for round_ in range(500):
+            queue.push(f"w{round_ % 10}", 1000 - round_)
+            assert len(queue._heap) <= 2 * len(queue) + 64
+        assert len(queue) == 10
+        print(f"✓ 堆重建生效: 500 次重新排期后堆大小 {len(queue._heap)}")
+
+        # 重建后顺序仍正确
+        popped = []
+        while True:
+            item = queue.pop_due(float("inf"))
+            if item is None:
+                break
+            popped.append(item[1])
+        assert popped == sorted(popped) and len(popped) == 10
+        print("✓ 重建后按到期时间依次弹出")
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+async def test_requeue_after_stop():
+    """测试停止后正在刷新的钱包放回队列"""
+    print("\n" + "="*60)
+    print("测试 2: stop() 后重新入队")
+    print("="*60)
+
+    try:
+        started = asyncio.Event()
+
+        async def refresh(address, release):
+            started.set()
+            await asyncio.sleep(3600)
+            return True
+
+        dispatcher = _make_dispatcher(refresh)
+        address = "0x" + "1" * 40
+        dispatcher.track(address, "normal", due_at=time.time())
+        dispatcher._loops = [asyncio.create_task(dispatcher._dispatch_loop())]
+
+        await asyncio.wait_for(started.wait(), timeout=5)
+        assert address in dispatcher._inflight
+        assert address not in dispatcher.queue
+        print("✓ 到期钱包已派发")
+
+        tasks = list(dispatcher._tasks)
+        before = time.time()
+        dispatcher.stop()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        assert address not in dispatcher._inflight
+        assert address in dispatcher.queue
+        assert before <= dispatcher.queue.due_at(address) <= time.time()
+        print("✓ 被取消的钱包放回队列并立即到期")
+
+        assert dispatcher._semaphore._value == 1
+        print("✓ 并发名额已释放")
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+async def test_failure_backoff():
+    """测试失败退避不超过正常间隔"""
+    print("\n" + "="*60)
+    print("测试 3: 失败退避上限")
+    print("="*60)
+
+    try:
+        result = {"ok": False}
+
+        async def refresh(address, release):
+            return result["ok"]
+
+        dispatcher = _make_dispatcher(refresh, retry_delay=10)
+        address = "0x" + "2" * 40
+        dispatcher.track(address, "normal", due_at=time.time())
+
+        delays = []
+        for _ in range(5):
+            dispatcher.queue.remove(address)
+            await dispatcher._semaphore.acquire()
+            dispatcher._inflight.add(address)
+            await dispatcher._refresh_one(address)
+            delays.append(round(dispatcher.queue.due_at(address) - time.time()))
+
+        assert delays == [10, 20, 40, 60, 60], delays
+        assert dispatcher._failures[address] == 5
+        print(f"✓ 失败延迟: {delays}（不超过间隔 60 秒）")
+
+        result["ok"] = True
+        dispatcher.queue.remove(address)
+        await dispatcher._semaphore.acquire()
+        dispatcher._inflight.add(address)
+        await dispatcher._refresh_one(address)
+        assert address not in dispatcher._failures
+        assert round(dispatcher.queue.due_at(address) - time.time()) == 60
+        print("✓ 成功后清除失败计数，按正常间隔排期")
+
+        assert dispatcher._counts == {"success": 1, "failed": 5}
+        assert dispatcher._semaphore._value == 1
+        print("✓ 刷新计数正确，并发名额已释放")
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+async def main():
+    """运行所有测试"""
+    print("="*60)
+    print("刷新派发器测试")
+    print("="*60)
+
+    results = [
+        ("DueQueue", test_due_queue()),
+        ("stop() 重新入队", await test_requeue_after_stop()),
+        ("失败退避", await test_failure_backoff()),
+    ]
+
+    # 汇总结果
+    print("\n" + "="*60)
+    print("测试结果汇总")
+    print("="*60)
+
+    for name, result in results:
+        status = "✓ 通过" if result else "✗ 失败"
+        print(f"{name}: {status}")
+
+    return all(result for _, result in results)
+
+
+if __name__ == "__main__":
+    success = asyncio.run(main())
+    sys.exit(0 if success else 1)
@@ -199,6 +199,14 @@ class WebSocketClient {
     // 启动心跳
     this._startHeartbeat()
     
+    // 重连后重新订阅（服务端按新连接处理，之前的订阅已清除）
+    this.topicHandlers.forEach((handlers, topic) => {
+      this.send({
+        type: 'subscribe',
+        topic: topic
+      })
+    })
+    
     // 触发回调
     this.onConnectCallbacks.forEach(callback => {
       try {